@@ -0,0 +1,105 @@
+"""
+Measure the per-call overhead of building entity-extraction chains.
+
+Compares the previous behaviour, a new PromptTemplate, OpenAI LLM (with
+its own HTTP client) and LLMChain on every call, with the cached chains in
+DocumentService. It then runs both against a local stub of the completions
+endpoint and counts the TCP connections each one opens. No OpenAI account or
+network access is needed.
+
+Usage:
+    python benchmarks/bench_extraction_overhead.py [calls]
+"""
+import json
+import os
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+CALLS = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+
+# Must be set before estimator_agent modules read their configuration
+os.environ.setdefault("VECTOR_DB_PROVIDER", "local")
+os.environ.setdefault("EMBEDDING_CACHE_ENABLED", "false")
+os.environ.setdefault("LEXICAL_INDEX_PATH", "")
+
+from langchain.chains import LLMChain  # noqa: E402
+from langchain.prompts import PromptTemplate  # noqa: E402
+from langchain_openai import OpenAI  # noqa: E402
+
+from estimator_agent.models import DocumentType  # noqa: E402
+from estimator_agent.services.document_service import (  # noqa: E402
+    DEFAULT_EXTRACTION_TEMPLATE, EXTRACTION_TEMPLATES, DocumentService
+)
+
+API_KEY = "sk-benchmark"
+COMPLETION = json.dumps({
+    "id": "cmpl-bench", "object": "text_completion", "created": 0, "model": "gpt-4o",
+    "choices": [{"text": '{"system_types": ["Fire Alarm"]}', "index": 0, "logprobs": None, "finish_reason": "stop"}],
+    "usage": {"prompt_tokens": 100, "completion_tokens": 10, "total_tokens": 110},
+}).encode()
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    connections = set()
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        StubHandler.connections.add(self.client_address)
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(COMPLETION)))
+        self.end_headers()
+        self.wfile.write(COMPLETION)
+
+    def log_message(self, *args):
+        pass
+
+
+def build_per_call(document_type: DocumentType) -> LLMChain:
+    """The previous extract_entities setup, repeated on every call."""
+    template = EXTRACTION_TEMPLATES.get(document_type, DEFAULT_EXTRACTION_TEMPLATE)
+    prompt = PromptTemplate(template=template, input_variables=["text"])
+    llm = OpenAI(temperature=0, model_name="gpt-4o", openai_api_key=API_KEY)
+    return LLMChain(llm=llm, prompt=prompt)
+
+
+def time_setup(label: str, build) -> None:
+    types = list(DocumentType)
+    for document_type in types:
+        build(document_type)  # first use builds the cached chains
+    start = time.perf_counter()
+    for i in range(CALLS):
+        build(types[i % len(types)])
+    elapsed = (time.perf_counter() - start) / CALLS
+    print(f"  {label:22s} {elapsed * 1e6:10.1f} us per call")
+
+
+def time_calls(label: str, build) -> None:
+    StubHandler.connections = set()
+    start = time.perf_counter()
+    for _ in range(CALLS):
+        build(DocumentType.SPECIFICATION).run("Provide addressable smoke detectors per NFPA 72.")
+    elapsed = (time.perf_counter() - start) / CALLS
+    print(f"  {label:22s} {elapsed * 1000:10.3f} ms per call, {len(StubHandler.connections)} TCP connections")
+
+
+def main() -> None:
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    os.environ["OPENAI_BASE_URL"] = f"http://127.0.0.1:{server.server_address[1]}/v1"
+
+    service = DocumentService(openai_api_key=API_KEY)
+    print(f"Chain setup ({CALLS} calls)")
+    time_setup("rebuilt per call", build_per_call)
+    time_setup("cached", service._extraction_chain)
+    print(f"\nSetup plus completion against a local stub ({CALLS} calls)")
+    time_calls("rebuilt per call", build_per_call)
+    time_calls("cached, pooled client", service._extraction_chain)
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+"""
+Measure per-request logging overhead on the calling thread.
+
+Compares the previous api.py setup against estimator_agent.logging_config.
+The previous setup logged at DEBUG through a RotatingFileHandler, a console
+handler and a duplicate FileHandler, with f-string messages and the full
+project payload on every create. The new setup uses a queue listener with
+lazy %-formatting, no payload logging and optional access-log sampling.
+
+Usage:
+    python benchmarks/bench_logging.py [requests]
+"""
+import logging
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime
+from logging.handlers import RotatingFileHandler
+
+from estimator_agent.logging_config import ACCESS_LOGGER_NAME, configure_logging, stop_logging
+
+PROJECT = {
+    "id": "bench",
+    "projectName": "Bench Project",
+    "clientName": "Bench Client",
+    "requirements": {"systems": ["Fire Alarm", "CCTV"], "notes": "x" * 2000},
+    "history": [{"status": "draft", "timestamp": datetime.now().isoformat(), "reason": "Project created"}] * 20,
+}
+
+
+def reset_root() -> None:
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+        handler.close()
+
+
+def legacy_setup(log_file: str) -> None:
+    reset_root()
+    formatter = logging.Formatter("%(asctime)s [%(levelname)s] %(name)s: %(message)s")
+    handlers = [
+        RotatingFileHandler(log_file, maxBytes=5 * 1024 * 1024, backupCount=3),
+        logging.StreamHandler(open(os.devnull, "w")),  # console output, discarded
+        logging.FileHandler(log_file),
+    ]
+    for handler in handlers:
+        handler.setFormatter(formatter)
+        logging.getLogger().addHandler(handler)
+    logging.getLogger().setLevel(logging.DEBUG)
+
+
+def legacy_request(logger: logging.Logger) -> None:
+    logger.info("Received project creation request")
+    logger.info(f"Received JSON data: {PROJECT}")
+    logger.info(f"Project stored successfully. Project data: {PROJECT}")
+    logger.info(f"Method: POST Path: /projects Status: 200 Duration: {0.01:.2f}s")
+
+
+def queued_request(logger: logging.Logger, access_logger: logging.Logger) -> None:
+    logger.debug("Received project creation request")
+    logger.info("Project %s stored successfully", PROJECT["id"])
+    access_logger.info("Method: %s Path: %s Status: %s Duration: %.2fs", "POST", "/projects", 200, 0.01)
+
+
+def run(label: str, fn, requests: int) -> None:
+    start = time.perf_counter()
+    for _ in range(requests):
+        fn()
+    elapsed = time.perf_counter() - start
+    print(f"  {label:<45} {elapsed / requests * 1e6:8.1f} us/request")
+
+
+def main() -> None:
+    requests = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    logger = logging.getLogger("estimator_agent.api")
+    access_logger = logging.getLogger(ACCESS_LOGGER_NAME)
+    with tempfile.TemporaryDirectory() as tmp:
+        print(f"Logging overhead over {requests} simulated requests")
+
+        legacy_setup(os.path.join(tmp, "legacy.log"))
+        run("legacy: sync handlers, DEBUG, payloads", lambda: legacy_request(logger), requests)
+
+        reset_root()
+        configure_logging(level="INFO", log_file=os.path.join(tmp, "queued.log"),
+                          access_sample_rate=1.0, console=False)
+        run("queued: INFO, lazy formatting", lambda: queued_request(logger, access_logger), requests)
+        stop_logging()
+
+        reset_root()
+        configure_logging(level="INFO", log_file=os.path.join(tmp, "sampled.log"),
+                          access_sample_rate=0.1, console=False)
+        run("queued: INFO, lazy, 10% access sampling", lambda: queued_request(logger, access_logger), requests)
+        stop_logging()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+"""
+Measure end-to-end pipeline throughput against the offline LLM backend.
+
+Runs entity extraction over long specification books (DocumentService),
+a full estimate and proposal (EstimatorAgent) and the multi-agent project
+workflow (AgentService) with LLM_PROVIDER=fake. Every LLM call sleeps for a
+latency drawn from the given distribution and returns synthetic JSON, so
+results are repeatable and no OpenAI account or network access is needed.
+For each stage it prints the wall time, the number of LLM calls and the
+injected latency; the difference shows how much of the stage's cost is LLM
+wait and how much of that wait overlaps.
+
+Usage:
+    python benchmarks/bench_offline_pipeline.py [latency] [documents]
+
+    latency: LLM_LATENCY spec, e.g. "lognormal:800:0.5" (default) or "fixed:200"
+"""
+import os
+import sys
+import time
+
+LATENCY = sys.argv[1] if len(sys.argv) > 1 else "lognormal:800:0.5"
+DOCUMENTS = int(sys.argv[2]) if len(sys.argv) > 2 else 4
+
+# Must be set before estimator_agent modules read their configuration
+os.environ["LLM_PROVIDER"] = "fake"
+os.environ["LLM_LATENCY"] = LATENCY
+os.environ.setdefault("VECTOR_DB_PROVIDER", "local")
+os.environ.setdefault("EMBEDDING_CACHE_ENABLED", "false")
+os.environ.setdefault("LEXICAL_INDEX_PATH", "")
+os.environ.setdefault("CHECKPOINTS_ENABLED", "false")
+os.environ.setdefault("AGENT_SEARCH_TOOL", "false")
+
+from estimator_agent.agent import EstimatorAgent  # noqa: E402
+from estimator_agent.config import OPENAI_CONFIG  # noqa: E402
+from estimator_agent.models import DocumentType, ProjectLocation  # noqa: E402
+from estimator_agent.services.agent_service import AgentService  # noqa: E402
+from estimator_agent.services.document_service import DocumentService  # noqa: E402
+from estimator_agent.services.llm_provider import get_llm_provider  # noqa: E402
+
+SECTION = (
+    "Section 28 31 00 Fire Detection and Alarm. Provide an addressable fire alarm control panel "
+    "model FX-2000 per NFPA 72 with smoke detectors in every corridor, heat detectors in "
+    "mechanical rooms, manual pull stations at each exit and horn strobes in room B-101. "
+    "Access control readers at stair doors and CCTV cameras at the loading dock. "
+)
+
+
+def spec_book(index: int, chars: int = 60_000) -> str:
+    text = f"Specification book {index}. "
+    while len(text) < chars:
+        text += SECTION
+    return text
+
+
+def stage(label: str, run) -> None:
+    provider = get_llm_provider()
+    calls, latency = provider.calls, provider.latency_seconds
+    start = time.perf_counter()
+    run()
+    elapsed = time.perf_counter() - start
+    print(f"  {label:22s} {elapsed:8.2f} s wall  {provider.calls - calls:4d} LLM calls  "
+          f"{provider.latency_seconds - latency:8.2f} s injected latency")
+
+
+def main() -> None:
+    print(f"Offline pipeline, latency {LATENCY}, {DOCUMENTS} documents")
+    documents = DocumentService(openai_api_key="sk-offline")
+    stage("entity extraction", lambda: [
+        documents.extract_entities(spec_book(i), DocumentType.SPECIFICATION) for i in range(DOCUMENTS)
+    ])
+
+    estimator = EstimatorAgent(openai_config=OPENAI_CONFIG)
+    location = ProjectLocation(country="US", state_province="CA", city="San Jose", postal_code="95110")
+
+    def estimate_and_propose() -> None:
+        estimate = estimator.generate_estimate(
+            project_id="bench-1",
+            client_name="Benchmark Client",
+            project_name="Offline Tower",
+            location=location,
+            drawings={"floors": 12, "notes": "fire alarm and cctv on every floor"},
+            specifications={"section": SECTION}
+        )
+        estimator.generate_proposal(estimate)
+
+    stage("estimate and proposal", estimate_and_propose)
+
+    agents = AgentService(openai_api_key="sk-offline")
+    files = [{"filename": f"spec-{i}.pdf", "content": spec_book(i, 2_000)} for i in range(DOCUMENTS)]
+    stage("agent workflow", lambda: agents.create_project_workflow("bench-1", files))
+
+
+if __name__ == "__main__":
+    main()
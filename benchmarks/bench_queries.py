@@ -0,0 +1,132 @@
+"""
+Measure common project queries before and after the schema indexes.
+
+Builds a synthetic SQLite database (by default 100k projects, 600k history
+rows and 300k messages, about 1M rows), drops the model indexes to mimic the
+previous schema, times the queries, then runs upgrade_schema() and times them
+again. Also compares lazy and selectin loading of messages and history for a
+page of projects.
+
+Usage:
+    python benchmarks/bench_queries.py [projects] [db_path]
+"""
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+PROJECTS = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+DB_PATH = sys.argv[2] if len(sys.argv) > 2 else os.path.join(tempfile.mkdtemp(), "bench.db")
+HISTORY_PER_PROJECT = 6
+MESSAGES_PER_PROJECT = 3
+STATUSES = ["draft", "estimation_in_progress", "analyzed", "proposal_sent", "negotiation", "won", "lost"]
+
+# Must be set before estimator_agent.database builds its engines
+os.environ["DATABASE_URL"] = f"sqlite:///{DB_PATH}"
+
+from sqlalchemy import event, insert, select, text  # noqa: E402
+from sqlalchemy.orm import lazyload  # noqa: E402
+
+from estimator_agent.database import (  # noqa: E402
+    Base, Message, Project, ProjectHistory, SessionLocal, engine, upgrade_schema
+)
+
+
+def build_dataset() -> None:
+    Base.metadata.create_all(bind=engine)
+    with engine.begin() as conn:
+        for table in Base.metadata.sorted_tables:
+            for index in table.indexes:
+                conn.execute(text(f"DROP INDEX IF EXISTS {index.name}"))
+    rng = random.Random(42)
+    start = datetime(2023, 1, 1)
+    batch = 10_000
+    with engine.begin() as conn:
+        for offset in range(0, PROJECTS, batch):
+            projects, history, messages = [], [], []
+            for i in range(offset, min(offset + batch, PROJECTS)):
+                created = start + timedelta(minutes=i)
+                projects.append({
+                    "id": f"p{i}", "project_name": f"Project {i}", "client_name": f"Client {i % 5000}",
+                    "client_email": f"client{i % 5000}@example.com", "status": rng.choice(STATUSES),
+                    "created_at": created, "updated_at": created,
+                })
+                for h in range(HISTORY_PER_PROJECT):
+                    history.append({"id": f"h{i}-{h}", "project_id": f"p{i}", "status": STATUSES[h % len(STATUSES)],
+                                    "timestamp": created + timedelta(hours=h), "reason": "synthetic"})
+                for m in range(MESSAGES_PER_PROJECT):
+                    messages.append({"id": f"m{i}-{m}", "project_id": f"p{i}", "content": "Hello " * 20,
+                                     "sender": "client" if m % 2 else "ai", "timestamp": created + timedelta(hours=m)})
+            conn.execute(insert(Project), projects)
+            conn.execute(insert(ProjectHistory), history)
+            conn.execute(insert(Message), messages)
+
+
+QUERIES = {
+    "projects by status, newest 50": (
+        "SELECT id FROM projects WHERE status = :status ORDER BY created_at DESC LIMIT 50", {"status": "won"}),
+    "project timeline": (
+        "SELECT status, timestamp FROM project_history WHERE project_id = :id ORDER BY timestamp", {"id": "p4242"}),
+    "project messages": (
+        "SELECT content FROM messages WHERE project_id = :id ORDER BY timestamp", {"id": "p4242"}),
+    "projects by client email": (
+        "SELECT id FROM projects WHERE client_email = :email", {"email": "client42@example.com"}),
+}
+
+
+def time_queries(label: str, repeat: int = 20) -> None:
+    print(f"\n{label}")
+    with engine.connect() as conn:
+        for name, (sql, params) in QUERIES.items():
+            start = time.perf_counter()
+            for _ in range(repeat):
+                conn.execute(text(sql), params).fetchall()
+            elapsed = (time.perf_counter() - start) / repeat
+            plan = conn.execute(text("EXPLAIN QUERY PLAN " + sql), params).fetchall()
+            print(f"  {name:32s} {elapsed * 1000:9.3f} ms   plan: {'; '.join(row[-1] for row in plan)}")
+
+
+def load_page(strategy: str) -> float:
+    with SessionLocal() as session:
+        query = select(Project).where(Project.status == "won").order_by(Project.created_at.desc()).limit(50)
+        if strategy == "lazy":
+            query = query.options(lazyload(Project.messages), lazyload(Project.history))
+        start = time.perf_counter()
+        for project in session.scalars(query).all():
+            len(project.messages), len(project.history)
+        return time.perf_counter() - start
+
+
+def time_page_load(strategy: str, repeat: int = 5) -> None:
+    load_page(strategy)  # warm up statement compilation caches
+    statements = []
+    listener = lambda *args: statements.append(1)  # noqa: E731
+    event.listen(engine, "before_cursor_execute", listener)
+    try:
+        elapsed = min(load_page(strategy) for _ in range(repeat))
+    finally:
+        event.remove(engine, "before_cursor_execute", listener)
+    # Every statement is a round trip to a networked database, which SQLite does not pay
+    print(f"  {strategy:8s} page of 50 projects with messages and history: "
+          f"{elapsed * 1000:8.2f} ms, {len(statements) // repeat} statements")
+
+
+def main() -> None:
+    start = time.perf_counter()
+    build_dataset()
+    rows = PROJECTS * (1 + HISTORY_PER_PROJECT + MESSAGES_PER_PROJECT)
+    print(f"Built {rows:,} rows in {time.perf_counter() - start:.1f}s at {DB_PATH}")
+    time_queries("Without indexes")
+    start = time.perf_counter()
+    created = upgrade_schema()
+    print(f"\nupgrade_schema() created {len(created)} indexes in {time.perf_counter() - start:.1f}s")
+    time_queries("With indexes")
+    print("\nRelationship loading")
+    time_page_load("lazy")
+    time_page_load("selectin")
+
+
+if __name__ == "__main__":
+    main()
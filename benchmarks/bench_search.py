@@ -0,0 +1,79 @@
+"""
+Measure BM25 query latency on a synthetic corpus of spec-book chunks.
+
+Builds a LexicalIndex in memory (by default 1M chunks over 200 projects, each
+about 120 tokens drawn from a Zipf vocabulary plus code sections, model
+numbers and room numbers), then times per-project and cross-project queries
+for exact-token lookups and common-word queries.
+
+Usage:
+    python benchmarks/bench_search.py [chunks] [projects]
+"""
+import random
+import sys
+import time
+
+import numpy as np
+
+from estimator_agent.services.lexical_index import LexicalIndex
+
+CHUNKS = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+PROJECTS = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+TOKENS_PER_CHUNK = 120
+VOCABULARY = [f"word{i}" for i in range(50_000)]
+SYSTEMS = ["fire alarm", "sprinkler", "access control", "cctv", "intrusion detection"]
+
+QUERIES = {
+    "code section": "NFPA 72",
+    "model number": "FX-2000 control panel",
+    "room number": "room B-101",
+    "common words": "fire alarm sprinkler word1 word2",
+}
+
+
+def build_index() -> LexicalIndex:
+    rng = random.Random(7)
+    weights = 1 / np.arange(1, len(VOCABULARY) + 1)
+    sampler = np.random.default_rng(7)
+    index = LexicalIndex(path="")
+    per_project = CHUNKS // PROJECTS
+    for p in range(PROJECTS):
+        project_id = f"project-{p}"
+        texts, metadatas, ids = [], [], []
+        draws = sampler.choice(len(VOCABULARY), size=(per_project, TOKENS_PER_CHUNK), p=weights / weights.sum())
+        for c in range(per_project):
+            words = [VOCABULARY[i] for i in draws[c]]
+            words.append(rng.choice(SYSTEMS))
+            if rng.random() < 0.01:
+                words.append("NFPA 72")
+            if rng.random() < 0.002:
+                words.append("FX-2000")
+            words.append(f"room B-{rng.randint(100, 999)}")
+            texts.append(" ".join(words))
+            metadatas.append({"document_id": f"{project_id}-doc-{c // 100}", "project_id": project_id})
+            ids.append(f"{project_id}-chunk-{c}")
+        index.add_texts(texts, metadatas, ids, project_id=project_id)
+    return index
+
+
+def time_query(index: LexicalIndex, query: str, project_id, repeat: int = 20) -> float:
+    index.search(query, project_id=project_id, k=20)  # build posting arrays
+    start = time.perf_counter()
+    for _ in range(repeat):
+        index.search(query, project_id=project_id, k=20)
+    return (time.perf_counter() - start) / repeat
+
+
+def main() -> None:
+    start = time.perf_counter()
+    index = build_index()
+    print(f"Indexed {CHUNKS:,} chunks in {PROJECTS} projects in {time.perf_counter() - start:.1f}s")
+    for name, query in QUERIES.items():
+        project = time_query(index, query, "project-0")
+        everywhere = time_query(index, query, None, repeat=3)
+        print(f"  {name:14s} {query!r:36s} one project {project * 1000:7.2f} ms   "
+              f"all projects {everywhere * 1000:8.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+"""
+Compare JSON serialization throughput for large API responses.
+
+Runs FastAPI's default path (jsonable_encoder + JSONResponse) against the
+fast path in estimator_agent.responses for a ProjectEstimate with a long
+cost breakdown and for a stored project dict with a long message history.
+
+Usage:
+    python benchmarks/bench_serialization.py [line_items] [messages]
+"""
+import sys
+import timeit
+from datetime import datetime, timedelta
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+from estimator_agent.models import (
+    CostBreakdown,
+    Labor,
+    Material,
+    Message,
+    Project,
+    ProjectEstimate,
+    ProjectLocation,
+    SystemSpecification,
+    SystemType,
+)
+from estimator_agent.responses import FastJSONResponse, orjson
+
+
+def build_estimate(line_items: int) -> ProjectEstimate:
+    materials = [
+        Material(
+            sku=f"SKU-{i}",
+            description=f"Device {i}",
+            unit="ea",
+            quantity=i % 50 + 1,
+            unit_cost=12.5,
+            total_cost=12.5 * (i % 50 + 1),
+            supplier="Generic Supplier",
+            lead_time_days=7,
+        )
+        for i in range(line_items)
+    ]
+    labor = [
+        Labor(category="journeyman", hours=8, rate_per_hour=45.0, total_cost=360.0, skill_level="Journeyman")
+        for _ in range(line_items // 10)
+    ]
+    total = sum(m.total_cost for m in materials) + sum(l.total_cost for l in labor)
+    return ProjectEstimate(
+        project_id="bench",
+        client_name="Bench Client",
+        project_name="Bench Project",
+        location=ProjectLocation(country="US", state_province="CA", city="San Jose", postal_code="95112"),
+        systems=[
+            SystemSpecification(
+                system_type=SystemType.FIRE_ALARM,
+                manufacturer="Generic",
+                model="Standard",
+                features=["Standard features"],
+                certifications=["UL", "FM"],
+                warranty_years=1,
+            )
+        ],
+        cost_breakdown=CostBreakdown(
+            materials=materials,
+            labor=labor,
+            equipment=[],
+            subcontractors=[],
+            total_cost=total,
+            contingency_amount=total * 0.1,
+            tax_rate=0.08,
+            tax_amount=total * 0.08,
+            grand_total=total * 1.18,
+        ),
+        total_cost=total * 1.18,
+        valid_until=datetime.now() + timedelta(days=30),
+        compliance_codes=["72", "101"],
+        risk_factors=[],
+        value_engineering_suggestions=["Review detector spacing"] * 20,
+    )
+
+
+def build_project(messages: int) -> dict:
+    now = datetime.now()
+    return Project(
+        id="bench",
+        projectName="Bench Project",
+        clientName="Bench Client",
+        clientEmail="client@example.com",
+        clientPhone="555-0100",
+        messages=[
+            Message(sender="AI Agent", recipient="client@example.com", timestamp=now,
+                    content="Thank you for your feedback. " * 20, type="email", status="sent")
+            for _ in range(messages)
+        ],
+        history=[{"status": "draft", "timestamp": now.isoformat(), "reason": "Project created"}] * 50,
+        createdAt=now,
+        updatedAt=now,
+    ).dict()
+
+
+def measure(label: str, fn, size: int, number: int) -> None:
+    seconds = min(timeit.repeat(fn, number=number, repeat=3)) / number
+    print(f"  {label:<40} {seconds * 1000:8.2f} ms/op  {size / seconds / 1e6:8.1f} MB/s")
+
+
+def main() -> None:
+    line_items = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    messages = int(sys.argv[2]) if len(sys.argv) > 2 else 2000
+    print(f"orjson installed: {orjson is not None}")
+
+    estimate = build_estimate(line_items)
+    size = len(estimate.model_dump_json())
+    print(f"\nProjectEstimate with {line_items} materials ({size / 1024:.0f} KiB)")
+    measure("jsonable_encoder + JSONResponse", lambda: JSONResponse(jsonable_encoder(estimate)).body, size, 5)
+    measure("model_dump_json", estimate.model_dump_json, size, 5)
+    measure("FastJSONResponse(model)", lambda: FastJSONResponse(estimate).body, size, 5)
+
+    project = build_project(messages)
+    size = len(FastJSONResponse(project).body)
+    print(f"\nProject dict with {messages} messages ({size / 1024:.0f} KiB)")
+    measure("jsonable_encoder + JSONResponse", lambda: JSONResponse(jsonable_encoder(project)).body, size, 5)
+    measure("FastJSONResponse(dict)", lambda: FastJSONResponse(project).body, size, 5)
+
+
+if __name__ == "__main__":
+    main()
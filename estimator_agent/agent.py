@@ -15,6 +15,7 @@ from .models import (
 import json
 from .services import AWSService, OpenAIService
 from .config import AWSConfig, OpenAIConfig
+from .metrics import track_llm_call
 
 class EstimatorAgent:
     def __init__(self, aws_config: Optional[AWSConfig] = None, openai_config: Optional[OpenAIConfig] = None):
@@ -75,7 +76,8 @@ class EstimatorAgent:
                 
                 Return a JSON array of required systems."""
                 
-                response = self.openai_service.generate_completion(prompt)
+                with track_llm_call("analyze_project_scope"):
+                    response = self.openai_service.generate_completion(prompt)
                 detected_systems = json.loads(response)
                 
                 for system in detected_systems:
@@ -340,7 +342,8 @@ class EstimatorAgent:
                 
                 Provide specific, actionable value engineering suggestions that could reduce costs while maintaining quality and compliance."""
                 
-                ai_suggestions = self.openai_service.generate_completion(prompt)
+                with track_llm_call("suggest_value_engineering"):
+                    ai_suggestions = self.openai_service.generate_completion(prompt)
                 if ai_suggestions:
                     suggestions.extend(ai_suggestions.split('\n'))
             except Exception as e:
@@ -467,7 +470,8 @@ class EstimatorAgent:
                 
                 The summary should highlight the key benefits and value proposition of the proposed solution."""
                 
-                return self.openai_service.generate_completion(prompt)
+                with track_llm_call("_generate_executive_summary"):
+                    return self.openai_service.generate_completion(prompt)
             except Exception as e:
                 print(f"Error generating executive summary with AI: {e}")
         
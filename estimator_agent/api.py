@@ -1,14 +1,26 @@
-from fastapi import FastAPI, HTTPException, UploadFile, File, Form, Request, Depends
+from fastapi import FastAPI, HTTPException, UploadFile, File, Form, Request, Depends, Query, Response, Header
+from fastapi.encoders import jsonable_encoder
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.security import APIKeyHeader
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.trustedhost import TrustedHostMiddleware
-from slowapi import Limiter, _rate_limit_exceeded_handler
-from slowapi.util import get_remote_address
+from slowapi import _rate_limit_exceeded_handler
 from slowapi.errors import RateLimitExceeded
-from typing import Dict, Optional, List, Any
-from pydantic import BaseModel
+from typing import Dict, Optional, List, Any, Callable, Iterable, Iterator
+from pydantic import BaseModel, Field, ValidationError
 from estimator_agent.models import ProjectLocation, ProjectEstimate, Proposal, Project, ProjectStatus, Message
 from estimator_agent.agent import EstimatorAgent
+from estimator_agent.project_store import ProjectStore, project_fields
+from estimator_agent.http_cache import SerializedCache, etag_matches, not_modified
+from estimator_agent.responses import ClosingStreamingResponse, fast_response
+from estimator_agent.rate_limit import create_limiter, limit_for
+from estimator_agent.blob_store import content_disposition, get_blob_store
+from estimator_agent.compression import CompressionMiddleware
+from estimator_agent.export import EXPORT_FORMATS, iter_line_items
+from estimator_agent.idempotency import IdempotentRequest, IdempotencyConflict, create_idempotency_store
+from estimator_agent.metrics import REGISTRY, HTTP_REQUESTS, HTTP_LATENCY, HTTP_IN_FLIGHT, track_llm_call, cache_hit_ratios
+import asyncio
+import hashlib
 import json
 import uuid
 from datetime import datetime
@@ -16,36 +28,24 @@ import os
 import base64
 from sendgrid import SendGridAPIClient
 from sendgrid.helpers.mail import Mail, Email, To, Content, Attachment, FileContent, FileName, FileType, Disposition
-import openai
 from estimator_agent.services import AgentService
+from estimator_agent.services.llm_provider import get_llm_provider
 import logging
-from logging.handlers import RotatingFileHandler
+from estimator_agent.logging_config import LOGGING_CONFIG, ACCESS_LOGGER_NAME, configure_logging
 import time
 from functools import wraps
-from fastapi.responses import JSONResponse
-
-# Logging configuration
-LOG_FILE = "backend_debug.log"
-LOG_LEVEL = logging.DEBUG
-
-# Create a rotating file handler (5MB per file, keep 3 backups)
-file_handler = RotatingFileHandler(LOG_FILE, maxBytes=5*1024*1024, backupCount=3)
-file_handler.setLevel(LOG_LEVEL)
-file_formatter = logging.Formatter("%(asctime)s [%(levelname)s] %(name)s: %(message)s")
-file_handler.setFormatter(file_formatter)
-
-# Create a stream handler for console output
-console_handler = logging.StreamHandler()
-console_handler.setLevel(LOG_LEVEL)
-console_formatter = logging.Formatter("%(asctime)s [%(levelname)s] %(name)s: %(message)s")
-console_handler.setFormatter(console_formatter)
-
-# Get the root logger and configure it
-logging.basicConfig(level=LOG_LEVEL, handlers=[file_handler, console_handler])
+from fastapi.responses import JSONResponse, StreamingResponse, PlainTextResponse, RedirectResponse
+
+# Logging configuration: records are queued and written by a background thread
+configure_logging()
 logger = logging.getLogger(__name__)
+access_logger = logging.getLogger(ACCESS_LOGGER_NAME)
+
+# Full request and project payloads are only logged when explicitly enabled
+LOG_PAYLOADS = LOGGING_CONFIG['log_payloads']
 
-# Initialize rate limiter
-limiter = Limiter(key_func=get_remote_address)
+# Initialize rate limiter (per API key, falling back to client IP; storage from RATE_LIMIT_STORAGE_URI)
+limiter = create_limiter()
 
 # Initialize FastAPI app
 app = FastAPI(
@@ -66,6 +66,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["GET", "POST", "PUT", "DELETE"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "ETag", "X-Workflow-Id"],
 )
 
 # Add trusted host middleware
@@ -74,6 +75,9 @@ app.add_middleware(
     allowed_hosts=os.getenv("ALLOWED_HOSTS", "*").split(",")
 )
 
+# Compress large responses with br or gzip (threshold from COMPRESSION_MIN_SIZE)
+app.add_middleware(CompressionMiddleware)
+
 # API Key security
 API_KEY_NAME = "X-API-Key"
 api_key_header = APIKeyHeader(name=API_KEY_NAME, auto_error=True)
@@ -90,24 +94,41 @@ async def verify_api_key(api_key: str = Depends(api_key_header)):
 # Request logging middleware
 @app.middleware("http")
 async def log_requests(request: Request, call_next):
-    start_time = time.time()
+    start_time = time.perf_counter()
     response = await call_next(request)
-    duration = time.time() - start_time
+    duration = time.perf_counter() - start_time
     
-    logger.info(
-        f"Method: {request.method} Path: {request.url.path} "
-        f"Status: {response.status_code} Duration: {duration:.2f}s"
+    access_logger.info(
+        "Method: %s Path: %s Status: %s Duration: %.2fs",
+        request.method, request.url.path, response.status_code, duration
     )
     
     return response
 
+# Request metrics middleware
+@app.middleware("http")
+async def record_request_metrics(request: Request, call_next):
+    HTTP_IN_FLIGHT.inc()
+    start_time = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        HTTP_IN_FLIGHT.dec()
+        # Label by route template rather than raw path to keep label cardinality bounded
+        route = getattr(request.scope.get("route"), "path", "unmatched")
+        HTTP_LATENCY.observe(time.perf_counter() - start_time, method=request.method, route=route)
+        HTTP_REQUESTS.inc(method=request.method, route=route, status=status)
+
 # Error handling middleware
 @app.middleware("http")
 async def error_handling(request: Request, call_next):
     try:
         return await call_next(request)
     except Exception as e:
-        logger.error(f"Unhandled error: {str(e)}", exc_info=True)
+        logger.error("Unhandled error: %s", e, exc_info=True)
         raise HTTPException(
             status_code=500,
             detail="Internal server error"
@@ -115,8 +136,8 @@ async def error_handling(request: Request, call_next):
 
 # Health check endpoint
 @app.get("/health")
-@limiter.limit("30/minute")
-async def health_check():
+@limiter.limit(limit_for("30/minute"))
+async def health_check(request: Request):
     return {
         "status": "healthy",
         "timestamp": datetime.now().isoformat(),
@@ -126,13 +147,62 @@ async def health_check():
 estimator = EstimatorAgent()
 
 # In-memory storage for demo
-PROJECTS = {}
+PROJECTS = ProjectStore()
 ESTIMATES = {}
+# File metadata per project; bodies live in the blob store (BLOB_STORE_BACKEND)
 FILES = {}
 
+# Opt-in serialization path that bypasses FastAPI's jsonable_encoder for large responses
+FAST_JSON_RESPONSES = os.getenv("FAST_JSON_RESPONSES", "false").lower() == "true"
+
+def _respond(content: Any, headers: Optional[Dict[str, str]] = None) -> Any:
+    """Return content through the fast JSON path when enabled, otherwise let FastAPI encode it."""
+    if FAST_JSON_RESPONSES:
+        return fast_response(content, headers=headers)
+    return content
+
+# Append-only persistence of projects, status history and messages to the database
+PERSIST_EVENTS = os.getenv("PERSIST_EVENTS", "false").lower() == "true"
+if PERSIST_EVENTS:
+    from estimator_agent.events import EventWriter
+    event_writer = EventWriter().start()
+else:
+    event_writer = None
+
+def _record_new_projects(projects: Iterable[Dict[str, Any]]) -> None:
+    if event_writer is None:
+        return
+    for project in projects:
+        event_writer.project_created(project['id'], project['projectName'], project['clientName'],
+                                     project.get('clientEmail'), project['status'], project['createdAt'])
+        for entry in project.get('history', []):
+            event_writer.status_changed(project['id'], entry['status'], entry.get('reason'),
+                                        datetime.fromisoformat(entry['timestamp']))
+
+def _record_status(project_id: str, project: Dict[str, Any], status: ProjectStatus, reason: str, now: datetime) -> None:
+    """Move a project to ``status``, appending to its history."""
+    project['status'] = status
+    project['updatedAt'] = now
+    project.setdefault('history', []).append({"status": status, "timestamp": now.isoformat(), "reason": reason})
+    if event_writer is not None:
+        event_writer.status_changed(project_id, status, reason, now)
+
+def _append_message(project_id: str, project: Dict[str, Any], message: Dict[str, Any]) -> None:
+    project.setdefault('messages', []).append(message)
+    if event_writer is not None:
+        timestamp = message.get('timestamp')
+        if isinstance(timestamp, str):
+            timestamp = datetime.fromisoformat(timestamp)
+        event_writer.message_added(project_id, message['sender'], message['content'], timestamp)
+
+# Codes and labor rates are static for the life of the process, so they are
+# serialized once and served with long-lived cache headers.
+REFERENCE_CACHE_MAX_AGE = int(os.getenv("REFERENCE_CACHE_MAX_AGE", "3600"))
+reference_cache = SerializedCache("reference_data", cache_control=f"public, max-age={REFERENCE_CACHE_MAX_AGE}")
+
 SENDGRID_API_KEY = os.getenv("SENDGRID_API_KEY")
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
-openai.api_key = OPENAI_API_KEY
+llm_provider = get_llm_provider(OPENAI_API_KEY)
 
 def send_email(to_email, subject, body, attachment_bytes=None, attachment_filename=None):
     sg = SendGridAPIClient(api_key=SENDGRID_API_KEY)
@@ -162,118 +232,217 @@ class ProjectRequest(BaseModel):
     location: dict
     requirements: dict
 
+def _build_project(project_id: str, data: Dict[str, Any], now: datetime) -> Project:
+    return Project(
+        id=project_id,
+        projectName=data.get("projectName", "Unnamed Project"),
+        clientName=data.get("clientName", "Unknown Client"),
+        clientEmail=data.get("clientEmail", ""),
+        clientPhone=data.get("clientPhone", ""),
+        buildingType=data.get("buildingType", ""),
+        buildingSize=data.get("buildingSize", ""),
+        location=data.get("location", {}),
+        requirements=data.get("requirements", {}),
+        status=ProjectStatus.DRAFT,
+        estimate=None,
+        proposal=None,
+        messages=[],
+        history=[{"status": ProjectStatus.DRAFT, "timestamp": now.isoformat(), "reason": "Project created"}],
+        metadata={},
+        createdAt=now,
+        updatedAt=now
+    )
+
 @app.post("/projects")
-@limiter.limit("10/minute")
+@limiter.limit(limit_for("10/minute"))
 async def create_project(request: Request, api_key: str = Depends(verify_api_key)):
     """
     Create a new project from either JSON or form data.
     """
     try:
-        logger.info("Received project creation request")
+        logger.debug("Received project creation request")
         content_type = request.headers.get('content-type', '').lower()
         now = datetime.now()
         if 'application/json' in content_type:
-            logger.info("Processing JSON request")
+            logger.debug("Processing JSON request")
             json_data = await request.json()
-            logger.info(f"Received JSON data: {json_data}")
+            if LOG_PAYLOADS:
+                logger.debug("Received JSON data: %s", json_data)
             project_id = str(uuid.uuid4())
-            logger.info(f"Generated project ID: {project_id}")
-            project = Project(
-                id=project_id,
-                projectName=json_data.get("projectName", "Unnamed Project"),
-                clientName=json_data.get("clientName", "Unknown Client"),
-                clientEmail=json_data.get("clientEmail", ""),
-                clientPhone=json_data.get("clientPhone", ""),
-                buildingType=json_data.get("buildingType", ""),
-                buildingSize=json_data.get("buildingSize", ""),
-                location=json_data.get("location", {}),
-                requirements=json_data.get("requirements", {}),
-                status=ProjectStatus.DRAFT,
-                estimate=None,
-                proposal=None,
-                messages=[],
-                history=[{"status": ProjectStatus.DRAFT, "timestamp": now.isoformat(), "reason": "Project created"}],
-                metadata={},
-                createdAt=now,
-                updatedAt=now
-            )
+            project = _build_project(project_id, json_data, now)
             PROJECTS[project_id] = project.dict()
-            logger.info(f"Project stored successfully. Project data: {project.dict()}")
-            return project.dict()
+            _record_new_projects([PROJECTS[project_id]])
+            logger.info("Project %s stored successfully", project_id)
+            if LOG_PAYLOADS:
+                logger.debug("Project data: %s", PROJECTS[project_id])
+            return _respond(project)
         else:
-            logger.info("Processing multipart form data")
+            logger.debug("Processing multipart form data")
             form_data = await request.form()
-            logger.info(f"Received form data with {len(form_data)} fields")
+            logger.debug("Received form data with %d fields", len(form_data))
             data = {}
             files = []
             for key, value in form_data.items():
-                logger.info(f"Processing field: {key}")
                 if isinstance(value, UploadFile):
-                    logger.info(f"- File field: {key}, filename: {value.filename}")
+                    logger.debug("- File field: %s, filename: %s", key, value.filename)
                     files.append(value)
                 else:
                     try:
                         if key in ['location', 'requirements'] or key.endswith('json'):
-                            logger.info(f"- Parsing JSON field: {key}")
                             data[key] = json.loads(value)
                         else:
-                            logger.info(f"- String field: {key}={value}")
+                            if LOG_PAYLOADS:
+                                logger.debug("- String field: %s=%s", key, value)
                             data[key] = value
                     except Exception as e:
-                        logger.error(f"- Error parsing field {key}: {str(e)}")
+                        logger.error("- Error parsing field %s: %s", key, e)
                         data[key] = value
             project_id = str(uuid.uuid4())
-            logger.info(f"Generated project ID: {project_id}")
-            project = Project(
-                id=project_id,
-                projectName=data.get("projectName", "Unnamed Project"),
-                clientName=data.get("clientName", "Unknown Client"),
-                clientEmail=data.get("clientEmail", ""),
-                clientPhone=data.get("clientPhone", ""),
-                buildingType=data.get("buildingType", ""),
-                buildingSize=data.get("buildingSize", ""),
-                location=data.get("location", {}),
-                requirements=data.get("requirements", {}),
-                status=ProjectStatus.DRAFT,
-                estimate=None,
-                proposal=None,
-                messages=[],
-                history=[{"status": ProjectStatus.DRAFT, "timestamp": now.isoformat(), "reason": "Project created"}],
-                metadata={},
-                createdAt=now,
-                updatedAt=now
-            )
+            project = _build_project(project_id, data, now)
             PROJECTS[project_id] = project.dict()
-            logger.info(f"Project stored successfully. Project data: {project.dict()}")
+            _record_new_projects([PROJECTS[project_id]])
+            logger.info("Project %s stored successfully", project_id)
+            if LOG_PAYLOADS:
+                logger.debug("Project data: %s", PROJECTS[project_id])
             # Store files for this project if any
             if files:
                 FILES[project_id] = []
                 for file in files:
-                    file_content = await file.read()
+                    blob = await run_in_threadpool(get_blob_store().put, file.file)
                     FILES[project_id].append({
+                        "id": str(uuid.uuid4()),
                         "filename": file.filename,
                         "content_type": file.content_type,
-                        "content": file_content
+                        "sha256": blob.sha256,
+                        "size": blob.size,
+                        "storage_key": blob.key,
+                        "created_at": now.isoformat()
                     })
-                logger.info(f"Stored {len(files)} files for project {project_id}")
-            return project.dict()
+                logger.info("Stored %d files for project %s", len(files), project_id)
+            return _respond(project)
     except Exception as e:
-        logger.error(f"Error creating project: {str(e)}")
-        import traceback
-        traceback.print_exc()
+        logger.error("Error creating project: %s", e, exc_info=True)
         raise HTTPException(status_code=500, detail=f"Failed to create project: {str(e)}")
 
+# Upper bound on items accepted by the batch endpoints
+MAX_BATCH_SIZE = int(os.getenv("MAX_BATCH_SIZE", "1000"))
+# Estimates generated concurrently by POST /estimate:batch
+BATCH_ESTIMATE_CONCURRENCY = int(os.getenv("BATCH_ESTIMATE_CONCURRENCY", "8"))
+
+async def _read_batch(request: Request) -> List[Any]:
+    """
+    Read a batch body sent either as a JSON array or as NDJSON (one JSON value per line).
+
+    Lines that are not valid JSON are returned as ValueError instances so they
+    can be reported per item instead of failing the whole batch.
+    """
+    body = await request.body()
+    content_type = request.headers.get('content-type', '').lower()
+    if 'ndjson' in content_type or 'jsonlines' in content_type:
+        items: List[Any] = []
+        for line in body.splitlines():
+            if not line.strip():
+                continue
+            try:
+                items.append(json.loads(line))
+            except ValueError as e:
+                items.append(ValueError(f"Invalid JSON: {e}"))
+    else:
+        try:
+            items = json.loads(body)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=f"Invalid JSON: {e}")
+        if not isinstance(items, list):
+            raise HTTPException(status_code=400, detail="Expected a JSON array or NDJSON body")
+    if len(items) > MAX_BATCH_SIZE:
+        raise HTTPException(status_code=413, detail=f"Batch exceeds {MAX_BATCH_SIZE} items")
+    return items
+
+def _batch_error(index: int, error: Any) -> Dict[str, Any]:
+    return {"index": index, "status": "error", "error": str(error)}
+
+@app.post("/projects:batch")
+@limiter.limit(limit_for("10/minute"))
+async def create_projects_batch(request: Request, api_key: str = Depends(verify_api_key)):
+    """
+    Create many projects in one request.
+
+    Accepts a JSON array or NDJSON of project objects with the same fields as
+    ``POST /projects``. Every item is validated first, then all valid projects
+    are written to storage together. Returns one result per input item, in
+    input order.
+    """
+    items = await _read_batch(request)
+    now = datetime.now()
+    results = []
+    created: Dict[str, Dict[str, Any]] = {}
+    for index, item in enumerate(items):
+        if isinstance(item, Exception):
+            results.append(_batch_error(index, item))
+            continue
+        if not isinstance(item, dict):
+            results.append(_batch_error(index, "Expected a JSON object"))
+            continue
+        try:
+            project = _build_project(str(uuid.uuid4()), item, now)
+        except ValidationError as e:
+            results.append(_batch_error(index, e))
+            continue
+        created[project.id] = project.dict()
+        results.append({"index": index, "status": "created", "id": project.id})
+    PROJECTS.update(created)
+    _record_new_projects(created.values())
+    logger.info("Batch created %d projects (%d failed)", len(created), len(items) - len(created))
+    return _respond({"created": len(created), "failed": len(items) - len(created), "results": results})
+
 @app.get("/projects/{project_id}")
-@limiter.limit("30/minute")
-async def get_project(project_id: str, api_key: str = Depends(verify_api_key)):
+@limiter.limit(limit_for("30/minute"))
+async def get_project(request: Request, response: Response, project_id: str, api_key: str = Depends(verify_api_key)):
     project = PROJECTS.get(project_id)
     if not project:
         raise HTTPException(status_code=404, detail="Project not found")
-    return project
+    # Projects change whenever they are written back, so clients must revalidate
+    headers = {"ETag": PROJECTS.etag(project_id), "Cache-Control": "private, no-cache"}
+    if etag_matches(request, headers["ETag"]):
+        return not_modified(headers)
+    response.headers.update(headers)
+    return _respond(project, headers)
 
 @app.get("/projects")
-async def list_projects():
-    return list(PROJECTS.values())
+async def list_projects(
+    response: Response,
+    status: Optional[str] = None,
+    client: Optional[str] = None,
+    created_after: Optional[datetime] = None,
+    created_before: Optional[datetime] = None,
+    cursor: Optional[str] = None,
+    limit: int = Query(50, ge=1, le=500),
+    fields: Optional[str] = None
+):
+    """
+    List projects newest first.
+
+    Results can be filtered by status, client name and creation date. Pages
+    are capped at ``limit`` items; when more results exist the cursor for the
+    next page is returned in the ``X-Next-Cursor`` header. ``fields`` is a
+    comma-separated list of top-level fields to return (``id`` is always
+    included).
+    """
+    try:
+        projects, next_cursor = PROJECTS.query(
+            status=status,
+            client=client,
+            created_after=created_after,
+            created_before=created_before,
+            cursor=cursor,
+            limit=limit
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    headers = {"X-Next-Cursor": next_cursor} if next_cursor else {}
+    response.headers.update(headers)
+    selected = [f.strip() for f in fields.split(",") if f.strip()] if fields else None
+    return _respond([project_fields(project, selected) for project in projects], headers)
 
 class AnalysisRequest(BaseModel):
     promptTemplate: str = "Analyze this project and provide a detailed cost estimate."
@@ -289,18 +458,16 @@ async def analyze_project(project_id: str, request: AnalysisRequest = None):
         raise HTTPException(status_code=404, detail="Project not found")
     
     try:
-        logger.info(f"Analyzing project {project_id}")
+        logger.info("Analyzing project %s", project_id)
         # Update status to estimation_in_progress
         now = datetime.now()
-        project['status'] = ProjectStatus.ESTIMATION_IN_PROGRESS
-        project['updatedAt'] = now
-        project.setdefault('history', []).append({"status": ProjectStatus.ESTIMATION_IN_PROGRESS, "timestamp": now.isoformat(), "reason": "Estimation started"})
+        _record_status(project_id, project, ProjectStatus.ESTIMATION_IN_PROGRESS, "Estimation started", now)
         PROJECTS[project_id] = project
         if request:
-            logger.info(f"Using custom prompt: {request.promptTemplate}")
-            logger.info(f"Template type: {request.templateType}")
+            logger.debug("Using custom prompt: %s", request.promptTemplate)
+            logger.debug("Template type: %s", request.templateType)
         else:
-            logger.info("Using default prompt")
+            logger.debug("Using default prompt")
         
         # For demo purposes, return a mock AI analysis
         # In a real implementation, you would use the custom prompt with your LLM
@@ -386,17 +553,32 @@ async def analyze_project(project_id: str, request: AnalysisRequest = None):
         
         # Update project with estimate and status
         project['estimate'] = analysis
-        project['status'] = ProjectStatus.ANALYZED
-        project['updatedAt'] = now
-        project.setdefault('history', []).append({"status": ProjectStatus.ANALYZED, "timestamp": now.isoformat(), "reason": "Estimation complete"})
+        _record_status(project_id, project, ProjectStatus.ANALYZED, "Estimation complete", now)
         PROJECTS[project_id] = project
         return analysis
     except Exception as e:
-        logger.error(f"Error analyzing project: {str(e)}")
-        import traceback
-        traceback.print_exc()
+        logger.error("Error analyzing project: %s", e, exc_info=True)
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/projects/{project_id}/estimate/export")
+async def export_project_estimate(project_id: str, format: str = "csv"):
+    """
+    Stream the project's estimate line items as CSV, XLSX or NDJSON.
+    """
+    project = PROJECTS.get(project_id)
+    if not project:
+        raise HTTPException(status_code=404, detail="Project not found")
+    if not project.get('estimate'):
+        raise HTTPException(status_code=404, detail="Project has no estimate")
+    if format not in EXPORT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"Unsupported export format: {format}")
+    writer, media_type, extension = EXPORT_FORMATS[format]
+    return StreamingResponse(
+        writer(iter_line_items(project['estimate'])),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="estimate-{project_id}.{extension}"'}
+    )
+
 class EstimateRequest(BaseModel):
     project_id: str
     client_name: str
@@ -419,10 +601,49 @@ async def create_estimate(request: EstimateRequest):
             drawings=request.drawings or {},
             specifications=request.specifications or {}
         )
-        return estimate
+        return _respond(estimate)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/estimate:batch")
+async def create_estimates_batch(request: Request):
+    """
+    Generate estimates for many projects in one request.
+
+    Accepts a JSON array or NDJSON of ``/estimate`` request bodies. Items are
+    validated up front and valid ones are estimated concurrently. Returns one
+    result per input item, in input order.
+    """
+    items = await _read_batch(request)
+    semaphore = asyncio.Semaphore(BATCH_ESTIMATE_CONCURRENCY)
+
+    async def estimate_item(index: int, item: Any) -> Dict[str, Any]:
+        if isinstance(item, Exception):
+            return _batch_error(index, item)
+        try:
+            estimate_request = EstimateRequest.model_validate(item)
+        except ValidationError as e:
+            return _batch_error(index, e)
+        async with semaphore:
+            try:
+                estimate = await run_in_threadpool(
+                    estimator.generate_estimate,
+                    project_id=estimate_request.project_id,
+                    client_name=estimate_request.client_name,
+                    project_name=estimate_request.project_name,
+                    location=estimate_request.location,
+                    drawings=estimate_request.drawings or {},
+                    specifications=estimate_request.specifications or {}
+                )
+            except Exception as e:
+                logger.error("Error estimating batch item %d: %s", index, e)
+                return _batch_error(index, e)
+        return {"index": index, "status": "ok", "estimate": estimate}
+
+    results = await asyncio.gather(*(estimate_item(i, item) for i, item in enumerate(items)))
+    failed = sum(1 for result in results if result["status"] == "error")
+    return _respond({"succeeded": len(results) - failed, "failed": failed, "results": results})
+
 @app.post("/proposal", response_model=Proposal)
 async def create_proposal(estimate: dict):
     """
@@ -431,84 +652,219 @@ async def create_proposal(estimate: dict):
     try:
         estimate_obj = ProjectEstimate(**estimate)
         proposal = estimator.generate_proposal(estimate_obj)
-        return proposal
+        return _respond(proposal)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/codes/{country}")
-async def get_regional_codes(country: str):
+async def get_regional_codes(request: Request, country: str):
     """
     Get applicable codes and standards for a specific country.
     """
     if country not in estimator.regional_codes:
         raise HTTPException(status_code=404, detail=f"No codes found for country: {country}")
-    return estimator.regional_codes[country]
+    return reference_cache.response(request, ("codes", country), estimator.regional_codes[country])
 
 @app.get("/labor-rates/{country}")
-async def get_labor_rates(country: str):
+async def get_labor_rates(request: Request, country: str):
     """
     Get labor rates for a specific country.
     """
     if country not in estimator.labor_rates:
         raise HTTPException(status_code=404, detail=f"No labor rates found for country: {country}")
-    return estimator.labor_rates[country]
+    return reference_cache.response(request, ("labor-rates", country), estimator.labor_rates[country])
+
+def _build_proposal_prompt(project: Dict[str, Any]) -> str:
+    return f"""
+        You are a professional estimator. Write a detailed, client-friendly proposal for the following project:\n\nProject: {project.get('projectName')}\nClient: {project.get('clientName')}\nRequirements: {project.get('requirements')}\nEstimate: {project.get('estimate')}\n"""
+
+def _build_negotiation_prompt(project: Dict[str, Any], client_message: str) -> str:
+    return f"""
+    You are a professional estimator negotiating with a client. The client said: '{client_message}'.\nProject details: {project.get('requirements')}.\nDraft a persuasive, professional response to win the project at a good margin."""
+
+def _complete(prompt: str, caller: str) -> str:
+    with track_llm_call(caller) as call:
+        response = llm_provider.complete([{"role": "system", "content": prompt}], model="gpt-4")
+        call.record_usage(response.usage)
+    return response.text
+
+def _stream_completion(prompt: str, caller: str) -> Iterator[str]:
+    """Yield completion tokens as they arrive from the model."""
+    with track_llm_call(caller) as call:
+        chunks = 0
+        for token in llm_provider.stream([{"role": "system", "content": prompt}], model="gpt-4"):
+            chunks += 1
+            yield token
+        # Streamed responses carry no usage block; each content chunk is one token
+        call.record_tokens(chunks)
+
+def _sse_event(data: Any, event: Optional[str] = None) -> str:
+    payload = json.dumps(data, default=str)
+    if event:
+        return f"event: {event}\ndata: {payload}\n\n"
+    return f"data: {payload}\n\n"
+
+def _stream_reply(prompt: str, caller: str, on_complete: Callable[[str], Any]) -> Iterator[str]:
+    """
+    Forward model tokens as SSE ``data`` events, then persist the full text via
+    ``on_complete`` and emit its result as a final ``done`` event.
+    """
+    parts = []
+    try:
+        for token in _stream_completion(prompt, caller):
+            parts.append(token)
+            yield _sse_event({"token": token})
+        result = on_complete("".join(parts))
+        yield _sse_event(result, event="done")
+    except Exception as e:
+        logger.error("Error streaming completion: %s", e, exc_info=True)
+        yield _sse_event({"detail": str(e)}, event="error")
+
+SSE_HEADERS = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+
+# Responses of POST requests sent with an Idempotency-Key, replayed on retries
+idempotency_store = create_idempotency_store()
+REPLAY_HEADERS = {"Idempotent-Replayed": "true"}
+
+def _begin_idempotent(idempotency_key: Optional[str], scope: str, payload: Any = None):
+    """Claim the client's idempotency key; returns the request handle and any stored response to replay."""
+    idempotent = IdempotentRequest(idempotency_store, idempotency_key, scope, payload)
+    try:
+        return idempotent, idempotent.replay()
+    except IdempotencyConflict as e:
+        raise HTTPException(status_code=409, detail=str(e))
+
+def _remember(idempotent: IdempotentRequest, result: Any) -> Any:
+    idempotent.complete(jsonable_encoder(result))
+    return result
+
+def _idempotent_stream(idempotent: IdempotentRequest, content: Iterator[str]) -> StreamingResponse:
+    """SSE response that releases the idempotency key when it ends without completing, e.g. on disconnect."""
+    return ClosingStreamingResponse(
+        content,
+        on_close=idempotent.abort,
+        media_type="text/event-stream",
+        headers=SSE_HEADERS
+    )
+
+def _replay_stream(stored: Any) -> StreamingResponse:
+    return StreamingResponse(
+        iter([_sse_event(stored, event="done")]),
+        media_type="text/event-stream",
+        headers={**SSE_HEADERS, **REPLAY_HEADERS}
+    )
+
+def _new_proposal(project_id: str, project: Dict[str, Any], now: datetime) -> Dict[str, Any]:
+    proposal_id = str(uuid.uuid4())
+    return {
+        "id": proposal_id,
+        "projectId": project_id,
+        "proposalUrl": proposal_id,
+        "title": f"Proposal for {project.get('projectName', 'Unknown Project')}",
+        "clientName": project.get('clientName', 'Unknown Client'),
+        "createdAt": now.isoformat(),
+        "status": "draft"
+    }
+
+def _record_proposal(idempotent: IdempotentRequest, project_id: str, project: Dict[str, Any], proposal: Dict[str, Any], proposal_body: str, now: datetime) -> Dict[str, Any]:
+    # Send proposal email
+    send_email(
+        to_email=project.get('clientEmail'),
+        subject=proposal['title'],
+        body=proposal_body
+    )
+    idempotent.side_effect()
+    # Log the sent email as a message
+    _append_message(project_id, project, {
+        "sender": "AI Agent",
+        "recipient": project.get('clientEmail'),
+        "timestamp": now.isoformat(),
+        "content": proposal_body,
+        "type": "email",
+        "status": "sent"
+    })
+    # Update project with proposal and status
+    project['proposal'] = proposal
+    _record_status(project_id, project, ProjectStatus.PROPOSAL_SENT, "Proposal sent", now)
+    PROJECTS[project_id] = project
+    return proposal
+
+def _record_negotiation(idempotent: IdempotentRequest, project_id: str, project: Dict[str, Any], message: Message, ai_reply: str, now: datetime) -> Dict[str, Any]:
+    """
+    Persist the client's message with the AI reply, as one idempotent unit
+
+    Nothing is written until the reply exists, so a retry after a failed or
+    aborted attempt does not append the client's message a second time.
+    """
+    _append_message(project_id, project, message.dict())
+    _record_status(project_id, project, ProjectStatus.NEGOTIATION, "Negotiation/feedback", now)
+    # Send negotiation email
+    send_email(
+        to_email=project.get('clientEmail'),
+        subject=f"Re: {project.get('projectName')} - Negotiation",
+        body=ai_reply
+    )
+    idempotent.side_effect()
+    # Log the AI's message
+    _append_message(project_id, project, {
+        "sender": "AI Agent",
+        "recipient": project.get('clientEmail'),
+        "timestamp": now.isoformat(),
+        "content": ai_reply,
+        "type": "email",
+        "status": "sent"
+    })
+    PROJECTS[project_id] = project
+    return {"status": "ok"}
 
 @app.post("/projects/{project_id}/proposal")
-async def generate_project_proposal(project_id: str):
+async def generate_project_proposal(project_id: str, idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key")):
     project = PROJECTS.get(project_id)
     if not project:
         raise HTTPException(status_code=404, detail="Project not found")
+    idempotent, stored = _begin_idempotent(idempotency_key, f"proposal:{project_id}")
+    if stored is not None:
+        return JSONResponse(stored, headers=REPLAY_HEADERS)
     try:
         now = datetime.now()
-        proposal_id = str(uuid.uuid4())
-        proposal = {
-            "id": proposal_id,
-            "projectId": project_id,
-            "proposalUrl": proposal_id,
-            "title": f"Proposal for {project.get('projectName', 'Unknown Project')}",
-            "clientName": project.get('clientName', 'Unknown Client'),
-            "createdAt": now.isoformat(),
-            "status": "draft"
-        }
+        proposal = _new_proposal(project_id, project, now)
         # AI-generated proposal content
-        prompt = f"""
-        You are a professional estimator. Write a detailed, client-friendly proposal for the following project:\n\nProject: {project.get('projectName')}\nClient: {project.get('clientName')}\nRequirements: {project.get('requirements')}\nEstimate: {project.get('estimate')}\n"""
-        ai_response = openai.ChatCompletion.create(
-            model="gpt-4",
-            messages=[{"role": "system", "content": prompt}]
-        )
-        proposal_body = ai_response['choices'][0]['message']['content']
-        # Send proposal email
-        send_email(
-            to_email=project.get('clientEmail'),
-            subject=proposal['title'],
-            body=proposal_body
-        )
-        # Log the sent email as a message
-        project.setdefault('messages', []).append({
-            "sender": "AI Agent",
-            "recipient": project.get('clientEmail'),
-            "timestamp": now.isoformat(),
-            "content": proposal_body,
-            "type": "email",
-            "status": "sent"
-        })
-        # Update project with proposal and status
-        project['proposal'] = proposal
-        project['status'] = ProjectStatus.PROPOSAL_SENT
-        project['updatedAt'] = now
-        project.setdefault('history', []).append({"status": ProjectStatus.PROPOSAL_SENT, "timestamp": now.isoformat(), "reason": "Proposal sent"})
-        PROJECTS[project_id] = project
-        return proposal
+        proposal_body = _complete(_build_proposal_prompt(project), "generate_project_proposal")
+        return _remember(idempotent, _record_proposal(idempotent, project_id, project, proposal, proposal_body, now))
     except Exception as e:
+        idempotent.abort()
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/projects/{project_id}/proposal/stream")
+async def stream_project_proposal(project_id: str, idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key")):
+    """
+    Stream the AI-generated proposal over server-sent events.
+
+    Each token is sent as a ``data`` event. Once the completion finishes the
+    proposal is emailed and persisted exactly as ``POST /projects/{id}/proposal``
+    does, and the proposal record is sent as a final ``done`` event. A retry
+    with the same ``Idempotency-Key`` replays only the ``done`` event.
+    """
+    project = PROJECTS.get(project_id)
+    if not project:
+        raise HTTPException(status_code=404, detail="Project not found")
+    idempotent, stored = _begin_idempotent(idempotency_key, f"proposal:{project_id}")
+    if stored is not None:
+        return _replay_stream(stored)
+    now = datetime.now()
+    proposal = _new_proposal(project_id, project, now)
+    return _idempotent_stream(idempotent, _stream_reply(
+        _build_proposal_prompt(project),
+        "stream_project_proposal",
+        lambda body: _remember(idempotent, _record_proposal(idempotent, project_id, project, proposal, body, now))
+    ))
+
 @app.post("/projects/{project_id}/messages")
 async def add_project_message(project_id: str, message: Message):
     project = PROJECTS.get(project_id)
     if not project:
         raise HTTPException(status_code=404, detail="Project not found")
-    project.setdefault('messages', []).append(message.dict())
+    _append_message(project_id, project, message.dict())
     project['updatedAt'] = datetime.now()
     PROJECTS[project_id] = project
     return {"status": "ok"}
@@ -518,43 +874,73 @@ async def get_project_messages(project_id: str):
     project = PROJECTS.get(project_id)
     if not project:
         raise HTTPException(status_code=404, detail="Project not found")
-    return project.get('messages', [])
+    return _respond(project.get('messages', []))
+
+@app.get("/projects/{project_id}/files")
+async def list_project_files(project_id: str):
+    if project_id not in PROJECTS:
+        raise HTTPException(status_code=404, detail="Project not found")
+    return FILES.get(project_id, [])
+
+@app.get("/projects/{project_id}/files/{file_id}")
+async def download_project_file(project_id: str, file_id: str):
+    """
+    Download an uploaded file, via a presigned URL redirect when the blob store supports it.
+    """
+    stored = next((f for f in FILES.get(project_id, []) if f["id"] == file_id), None)
+    if not stored:
+        raise HTTPException(status_code=404, detail="File not found")
+    blob_store = get_blob_store()
+    url = blob_store.presigned_url(stored["sha256"], filename=stored["filename"])
+    if url:
+        return RedirectResponse(url, status_code=307)
+    return StreamingResponse(
+        blob_store.iter_chunks(stored["sha256"]),
+        media_type=stored["content_type"] or "application/octet-stream",
+        headers={
+            "Content-Disposition": content_disposition(stored["filename"]),
+            "Content-Length": str(stored["size"]),
+            "ETag": f'"{stored["sha256"]}"'
+        }
+    )
 
 @app.post("/projects/{project_id}/negotiate")
-async def negotiate_project(project_id: str, message: Message):
+async def negotiate_project(project_id: str, message: Message, idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key")):
     project = PROJECTS.get(project_id)
     if not project:
         raise HTTPException(status_code=404, detail="Project not found")
+    idempotent, stored = _begin_idempotent(idempotency_key, f"negotiate:{project_id}", message.dict())
+    if stored is not None:
+        return JSONResponse(stored, headers=REPLAY_HEADERS)
     now = datetime.now()
-    project.setdefault('messages', []).append(message.dict())
-    project['status'] = ProjectStatus.NEGOTIATION
-    project['updatedAt'] = now
-    project.setdefault('history', []).append({"status": ProjectStatus.NEGOTIATION, "timestamp": now.isoformat(), "reason": "Negotiation/feedback"})
-    # AI-generated negotiation response
-    prompt = f"""
-    You are a professional estimator negotiating with a client. The client said: '{message.content}'.\nProject details: {project.get('requirements')}.\nDraft a persuasive, professional response to win the project at a good margin."""
-    ai_response = openai.ChatCompletion.create(
-        model="gpt-4",
-        messages=[{"role": "system", "content": prompt}]
-    )
-    ai_reply = ai_response['choices'][0]['message']['content']
-    # Send negotiation email
-    send_email(
-        to_email=project.get('clientEmail'),
-        subject=f"Re: {project.get('projectName')} - Negotiation",
-        body=ai_reply
-    )
-    # Log the AI's message
-    project.setdefault('messages', []).append({
-        "sender": "AI Agent",
-        "recipient": project.get('clientEmail'),
-        "timestamp": now.isoformat(),
-        "content": ai_reply,
-        "type": "email",
-        "status": "sent"
-    })
-    PROJECTS[project_id] = project
-    return {"status": "ok"}
+    try:
+        # AI-generated negotiation response
+        ai_reply = _complete(_build_negotiation_prompt(project, message.content), "negotiate_project")
+        return _remember(idempotent, _record_negotiation(idempotent, project_id, project, message, ai_reply, now))
+    except Exception:
+        idempotent.abort()
+        raise
+
+@app.post("/projects/{project_id}/negotiate/stream")
+async def stream_negotiation_reply(project_id: str, message: Message, idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key")):
+    """
+    Stream the AI negotiation reply over server-sent events.
+
+    The client's message and the reply are appended to the project's
+    messages, and the reply emailed, once the completion finishes.
+    """
+    project = PROJECTS.get(project_id)
+    if not project:
+        raise HTTPException(status_code=404, detail="Project not found")
+    idempotent, stored = _begin_idempotent(idempotency_key, f"negotiate:{project_id}", message.dict())
+    if stored is not None:
+        return _replay_stream(stored)
+    now = datetime.now()
+    return _idempotent_stream(idempotent, _stream_reply(
+        _build_negotiation_prompt(project, message.content),
+        "stream_negotiation_reply",
+        lambda reply: _remember(idempotent, _record_negotiation(idempotent, project_id, project, message, reply, now))
+    ))
 
 @app.get("/test")
 async def test_api():
@@ -566,21 +952,32 @@ async def test_api():
 class AIProjectCreationRequest(BaseModel):
     documents: List[Dict[str, Any]]  # List of documents with content and metadata
     email: Optional[str] = None  # Optional email for communication
+    # Reuse to resume a failed attempt from its checkpoints
+    workflowId: Optional[str] = Field(None, pattern=r"^[A-Za-z0-9_-]{1,128}$")
 
 @app.post("/projects/ai-create")
-async def create_project_ai(request: AIProjectCreationRequest):
+async def create_project_ai(request: AIProjectCreationRequest, idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key")):
     """
     Create a new project using AI agents to extract information from documents.
+
+    Retrying with the same workflowId or Idempotency-Key resumes the workflow,
+    so steps that finished in the failed attempt are not run again. Errors
+    carry the workflow id in the X-Workflow-Id header for that retry.
     """
+    now = datetime.now()
+    project_id = str(uuid.uuid4())
+    if request.workflowId:
+        workflow_id = request.workflowId
+    elif idempotency_key:
+        workflow_id = "wf-" + hashlib.sha256(idempotency_key.encode()).hexdigest()[:32]
+    else:
+        workflow_id = f"wf-{project_id}"
     try:
-        now = datetime.now()
-        project_id = str(uuid.uuid4())
-        
         # Initialize agent service
         agent_service = AgentService(openai_api_key=OPENAI_API_KEY)
         
         # Create and execute project workflow
-        workflow = agent_service.create_project_workflow(project_id, request.documents)
+        workflow = agent_service.create_project_workflow(project_id, request.documents, workflow_id)
         
         # Extract project information from workflow results
         project_info = workflow.result.get('output', {})
@@ -612,21 +1009,30 @@ async def create_project_ai(request: AIProjectCreationRequest):
         
         # Store project
         PROJECTS[project_id] = project.dict()
+        _record_new_projects([PROJECTS[project_id]])
         
-        return project.dict()
+        return _respond(project)
         
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error creating project: {str(e)}")
+        raise HTTPException(
+            status_code=500,
+            detail=f"Error creating project: {str(e)}",
+            headers={"X-Workflow-Id": workflow_id}
+        )
 
 class ReviewRequest(BaseModel):
     reviewStatus: Dict[str, str]
     reviewNotes: Dict[str, str]
 
 @app.post("/projects/{project_id}/finalize")
-async def finalize_project(project_id: str, request: ReviewRequest):
+async def finalize_project(project_id: str, request: ReviewRequest, idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key")):
     """
     Finalize a project after review and generate the final proposal.
     """
+    idempotent, stored = _begin_idempotent(idempotency_key, f"finalize:{project_id}", request.dict())
+    if stored is not None:
+        return JSONResponse(stored, headers=REPLAY_HEADERS)
+    project = None
     try:
         project = PROJECTS.get(project_id)
         if not project:
@@ -640,23 +1046,12 @@ async def finalize_project(project_id: str, request: ReviewRequest):
         
         # Check if any step was rejected
         if any(status == 'rejected' for status in request.reviewStatus.values()):
-            project['status'] = ProjectStatus.REVISION_NEEDED
-            project['updatedAt'] = now
-            project.setdefault('history', []).append({
-                "status": ProjectStatus.REVISION_NEEDED,
-                "timestamp": now.isoformat(),
-                "reason": "Project needs revision based on review"
-            })
-            return project
+            _record_status(project_id, project, ProjectStatus.REVISION_NEEDED, "Project needs revision based on review", now)
+            PROJECTS[project_id] = project
+            return _remember(idempotent, project)
         
         # All steps approved, generate final proposal
-        project['status'] = ProjectStatus.FINALIZING
-        project['updatedAt'] = now
-        project.setdefault('history', []).append({
-            "status": ProjectStatus.FINALIZING,
-            "timestamp": now.isoformat(),
-            "reason": "Generating final proposal"
-        })
+        _record_status(project_id, project, ProjectStatus.FINALIZING, "Generating final proposal", now)
         
         # Initialize agent service
         agent_service = AgentService(openai_api_key=OPENAI_API_KEY)
@@ -670,13 +1065,7 @@ async def finalize_project(project_id: str, request: ReviewRequest):
         
         # Update project with final proposal
         project['proposal'] = final_proposal
-        project['status'] = ProjectStatus.COMPLETED
-        project['updatedAt'] = now
-        project.setdefault('history', []).append({
-            "status": ProjectStatus.COMPLETED,
-            "timestamp": now.isoformat(),
-            "reason": "Project finalized with approved proposal"
-        })
+        _record_status(project_id, project, ProjectStatus.COMPLETED, "Project finalized with approved proposal", now)
         
         # Send email notification
         if project.get('clientEmail'):
@@ -691,37 +1080,44 @@ Your project proposal has been finalized and is ready for review. You can access
 Best regards,
 The Estimator AI Team"""
             )
+            idempotent.side_effect()
         
         PROJECTS[project_id] = project
-        return project
+        return _remember(idempotent, project)
         
     except Exception as e:
+        idempotent.abort()
+        if project:
+            # The review fields and status were already changed in place; store them
+            # so the ETag version and status index reflect what GET now returns
+            PROJECTS[project_id] = project
         raise HTTPException(status_code=500, detail=f"Error finalizing project: {str(e)}")
 
 # Add metrics endpoint
 @app.get("/metrics")
-@limiter.limit("5/minute")
-async def get_metrics(api_key: str = Depends(verify_api_key)):
+@limiter.limit(limit_for("5/minute"))
+async def get_metrics(request: Request, format: str = "json", api_key: str = Depends(verify_api_key)):
     """
     Get API metrics and statistics
+
+    Pass ``format=prometheus`` (or send ``Accept: text/plain``) for the
+    Prometheus text exposition format.
     """
+    if format == "prometheus" or "text/plain" in request.headers.get("accept", ""):
+        return PlainTextResponse(REGISTRY.render_prometheus(), media_type="text/plain; version=0.0.4")
     return {
         "total_projects": len(PROJECTS),
         "total_estimates": len(ESTIMATES),
         "total_files": sum(len(files) for files in FILES.values()),
+        "cache_hit_ratios": cache_hit_ratios(),
+        "metrics": REGISTRY.snapshot(),
         "timestamp": datetime.now().isoformat()
     }
 
 @app.exception_handler(Exception)
 async def global_exception_handler(request: Request, exc: Exception):
-    logger.error(f"Unhandled error: {exc}", exc_info=True)
+    logger.error("Unhandled error: %s", exc, exc_info=True)
     return JSONResponse(
         status_code=500,
         content={"detail": "Internal server error"},
     )
-
-file_handler = logging.FileHandler("backend_debug.log")
-file_handler.setLevel(logging.DEBUG)
-formatter = logging.Formatter("%(asctime)s [%(levelname)s] %(name)s: %(message)s")
-file_handler.setFormatter(formatter)
-logging.getLogger().addHandler(file_handler) 
\ No newline at end of file
@@ -0,0 +1,218 @@
+"""
+Content-addressed storage for uploaded file bodies.
+
+Blobs are keyed by the SHA-256 of their content, so uploading the same file
+twice stores it once. Only the hash, size and key are kept in the database.
+Bodies are written and read in chunks and never held in memory whole. The
+S3 backend can also hand out presigned URLs so clients download directly
+from S3.
+"""
+import hashlib
+import os
+import tempfile
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import BinaryIO, Iterator, Optional, Tuple
+from urllib.parse import quote
+
+BLOB_STORE_CONFIG = {
+    'backend': os.getenv('BLOB_STORE_BACKEND', 'local'),
+    'root': os.getenv('BLOB_STORE_ROOT', 'blobs'),
+    'bucket': os.getenv('BLOB_STORE_BUCKET', os.getenv('AWS_S3_BUCKET', 'estimator-ai-documents')),
+    'prefix': os.getenv('BLOB_STORE_PREFIX', 'blobs/'),
+    'presign_seconds': int(os.getenv('BLOB_STORE_PRESIGN_SECONDS', '3600')),
+}
+
+CHUNK_SIZE = 1024 * 1024
+# Uploads larger than this are spooled to disk while being hashed
+SPOOL_SIZE = 8 * 1024 * 1024
+
+
+@dataclass
+class StoredBlob:
+    sha256: str
+    size: int
+    key: str
+    # False when identical content was already stored
+    created: bool = True
+
+
+def blob_key(sha256: str) -> str:
+    """Fan blobs out over two directory levels to keep directories small."""
+    return f"{sha256[:2]}/{sha256[2:4]}/{sha256}"
+
+
+def content_disposition(filename: str) -> str:
+    """
+    ``attachment`` Content-Disposition for a client-supplied filename
+
+    The quoted ``filename`` is an ASCII fallback with quotes, backslashes and
+    control characters replaced; ``filename*`` carries the exact name
+    percent-encoded as UTF-8 (RFC 5987/6266).
+    """
+    fallback = "".join(
+        c if 0x20 <= ord(c) < 0x7f and c not in '"\\' else "_"
+        for c in filename
+    )
+    return f"attachment; filename=\"{fallback}\"; filename*=UTF-8''{quote(filename, safe='')}"
+
+
+def _copy_hashing(source: BinaryIO, target: BinaryIO) -> Tuple[str, int]:
+    digest = hashlib.sha256()
+    size = 0
+    while True:
+        chunk = source.read(CHUNK_SIZE)
+        if not chunk:
+            break
+        digest.update(chunk)
+        size += len(chunk)
+        target.write(chunk)
+    return digest.hexdigest(), size
+
+
+class BlobStore(ABC):
+    @abstractmethod
+    def put(self, stream: BinaryIO) -> StoredBlob:
+        """
+        Store the content of a readable binary stream
+
+        Args:
+            stream: File-like object, read in chunks from its current position
+
+        Returns:
+            StoredBlob with the content hash, size and storage key
+        """
+        raise NotImplementedError
+
+    def put_bytes(self, data: bytes) -> StoredBlob:
+        with tempfile.SpooledTemporaryFile(max_size=SPOOL_SIZE) as spool:
+            spool.write(data)
+            spool.seek(0)
+            return self.put(spool)
+
+    @abstractmethod
+    def iter_chunks(self, sha256: str, chunk_size: int = CHUNK_SIZE) -> Iterator[bytes]:
+        raise NotImplementedError
+
+    @abstractmethod
+    def exists(self, sha256: str) -> bool:
+        raise NotImplementedError
+
+    @abstractmethod
+    def delete(self, sha256: str) -> None:
+        raise NotImplementedError
+
+    def presigned_url(self, sha256: str, filename: Optional[str] = None,
+                      expires_in: Optional[int] = None) -> Optional[str]:
+        """URL the client can download the blob from directly, or None if the backend has none."""
+        return None
+
+
+class LocalBlobStore(BlobStore):
+    def __init__(self, root: str):
+        self.root = root
+        self._tmp = os.path.join(root, "tmp")
+
+    def _path(self, sha256: str) -> str:
+        return os.path.join(self.root, blob_key(sha256))
+
+    def put(self, stream: BinaryIO) -> StoredBlob:
+        # Created on first write so that merely configuring the store leaves no directories behind
+        os.makedirs(self._tmp, exist_ok=True)
+        with tempfile.NamedTemporaryFile(dir=self._tmp, delete=False) as tmp:
+            sha256, size = _copy_hashing(stream, tmp)
+        path = self._path(sha256)
+        if os.path.exists(path):
+            os.unlink(tmp.name)
+            return StoredBlob(sha256, size, blob_key(sha256), created=False)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Atomic on the same filesystem, so readers never see a partial blob
+        os.replace(tmp.name, path)
+        return StoredBlob(sha256, size, blob_key(sha256))
+
+    def iter_chunks(self, sha256: str, chunk_size: int = CHUNK_SIZE) -> Iterator[bytes]:
+        with open(self._path(sha256), "rb") as f:
+            while True:
+                chunk = f.read(chunk_size)
+                if not chunk:
+                    break
+                yield chunk
+
+    def exists(self, sha256: str) -> bool:
+        return os.path.exists(self._path(sha256))
+
+    def delete(self, sha256: str) -> None:
+        try:
+            os.unlink(self._path(sha256))
+        except FileNotFoundError:
+            pass
+
+
+class S3BlobStore(BlobStore):
+    def __init__(self, bucket: str, prefix: str = "blobs/", client=None,
+                 presign_seconds: int = BLOB_STORE_CONFIG['presign_seconds']):
+        if client is None:
+            import boto3
+            client = boto3.client('s3', region_name=os.getenv('AWS_REGION'))
+        self.client = client
+        self.bucket = bucket
+        self.prefix = prefix
+        self.presign_seconds = presign_seconds
+
+    def _key(self, sha256: str) -> str:
+        return self.prefix + blob_key(sha256)
+
+    def put(self, stream: BinaryIO) -> StoredBlob:
+        # The key depends on the hash, so the body is spooled while hashing and uploaded afterwards
+        with tempfile.SpooledTemporaryFile(max_size=SPOOL_SIZE) as spool:
+            sha256, size = _copy_hashing(stream, spool)
+            if self.exists(sha256):
+                return StoredBlob(sha256, size, blob_key(sha256), created=False)
+            spool.seek(0)
+            self.client.upload_fileobj(spool, self.bucket, self._key(sha256),
+                                       ExtraArgs={"Metadata": {"sha256": sha256}})
+        return StoredBlob(sha256, size, blob_key(sha256))
+
+    def iter_chunks(self, sha256: str, chunk_size: int = CHUNK_SIZE) -> Iterator[bytes]:
+        body = self.client.get_object(Bucket=self.bucket, Key=self._key(sha256))["Body"]
+        try:
+            yield from body.iter_chunks(chunk_size)
+        finally:
+            body.close()
+
+    def exists(self, sha256: str) -> bool:
+        from botocore.exceptions import ClientError
+        try:
+            self.client.head_object(Bucket=self.bucket, Key=self._key(sha256))
+            return True
+        except ClientError as e:
+            if e.response.get("Error", {}).get("Code") in ("404", "NoSuchKey", "NotFound"):
+                return False
+            raise
+
+    def delete(self, sha256: str) -> None:
+        self.client.delete_object(Bucket=self.bucket, Key=self._key(sha256))
+
+    def presigned_url(self, sha256: str, filename: Optional[str] = None,
+                      expires_in: Optional[int] = None) -> Optional[str]:
+        params = {"Bucket": self.bucket, "Key": self._key(sha256)}
+        if filename:
+            params["ResponseContentDisposition"] = content_disposition(filename)
+        return self.client.generate_presigned_url(
+            'get_object', Params=params, ExpiresIn=expires_in or self.presign_seconds)
+
+
+def create_blob_store(backend: Optional[str] = None) -> BlobStore:
+    backend = backend or BLOB_STORE_CONFIG['backend']
+    if backend == "s3":
+        return S3BlobStore(BLOB_STORE_CONFIG['bucket'], BLOB_STORE_CONFIG['prefix'])
+    if backend == "local":
+        return LocalBlobStore(BLOB_STORE_CONFIG['root'])
+    raise ValueError(f"Unknown blob store backend: {backend}")
+
+
+@lru_cache(maxsize=1)
+def get_blob_store() -> BlobStore:
+    """The configured store, created on first use rather than at import."""
+    return create_blob_store()
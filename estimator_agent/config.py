@@ -41,6 +41,24 @@ OPENAI_CONFIG = {
     'model': os.getenv('OPENAI_MODEL', 'gpt-4o'),
     'temperature': float(os.getenv('OPENAI_TEMPERATURE', '0.7')),
     'max_tokens': int(os.getenv('OPENAI_MAX_TOKENS', '2000')),
+    # Pooled HTTP connections shared by LLM clients, and the request timeout in seconds
+    'max_connections': int(os.getenv('OPENAI_MAX_CONNECTIONS', '20')),
+    'timeout': float(os.getenv('OPENAI_TIMEOUT', '60')),
+}
+
+# LLM backend: "openai", "fake" (synthetic responses), "replay" (responses
+# recorded in replay_path, synthetic on a miss unless strict) or "record"
+# (call OpenAI and append each response to replay_path). Latencies are
+# "none", "fixed:MS", "uniform:MIN_MS:MAX_MS", "normal:MEAN_MS:SD_MS",
+# "lognormal:MEDIAN_MS:SIGMA" or, for replay, "recorded".
+LLM_PROVIDER_CONFIG = {
+    'provider': os.getenv('LLM_PROVIDER', 'openai'),
+    'replay_path': os.getenv('LLM_REPLAY_PATH', 'llm_replay.jsonl'),
+    'strict': os.getenv('LLM_REPLAY_STRICT', 'false').lower() == 'true',
+    'latency': os.getenv('LLM_LATENCY', 'none'),
+    'embedding_latency': os.getenv('LLM_EMBEDDING_LATENCY', 'none'),
+    'embedding_dimension': int(os.getenv('LLM_FAKE_EMBEDDING_DIMENSION', '1536')),
+    'seed': int(os.getenv('LLM_FAKE_SEED', '0')),
 }
 
 # LangChain Configuration
@@ -50,12 +68,73 @@ LANGCHAIN_CONFIG = {
     'chunk_overlap': int(os.getenv('LANGCHAIN_CHUNK_OVERLAP', '200')),
 }
 
+# CrewAI agents: verbose tracing, the web search tool, and how many
+# independent workflow steps (per-document parsing) run at once
+AGENT_CONFIG = {
+    'verbose': os.getenv('AGENT_VERBOSE', 'false').lower() == 'true',
+    'search_tool': os.getenv('AGENT_SEARCH_TOOL', 'true').lower() == 'true',
+    'max_parallel': int(os.getenv('AGENT_MAX_PARALLEL', '4')),
+}
+
+# Workflow step checkpoints: a local directory or a redis:// URL
+CHECKPOINT_CONFIG = {
+    'enabled': os.getenv('CHECKPOINTS_ENABLED', 'true').lower() == 'true',
+    'store_url': os.getenv('CHECKPOINT_STORE_URL', 'checkpoints'),
+    'ttl_seconds': int(os.getenv('CHECKPOINT_TTL_SECONDS', str(7 * 24 * 3600))),
+}
+
+# Entity extraction: "map_reduce" extracts from every segment of a document
+# concurrently and merges the results; "truncate" only reads the first characters
+ENTITY_EXTRACTION_CONFIG = {
+    'mode': os.getenv('EXTRACTION_MODE', 'map_reduce'),
+    'segment_chars': int(os.getenv('EXTRACTION_SEGMENT_CHARS', '12000')),
+    'segment_overlap': int(os.getenv('EXTRACTION_SEGMENT_OVERLAP', '500')),
+    'max_concurrency': int(os.getenv('EXTRACTION_MAX_CONCURRENCY', '4')),
+    # Estimated prompt tokens a single document may spend across all segments
+    'token_budget': int(os.getenv('EXTRACTION_TOKEN_BUDGET', '200000')),
+    'truncate_chars': int(os.getenv('EXTRACTION_TRUNCATE_CHARS', '10000')),
+}
+
+# Streaming S3 document loading: ranged-GET block size, blocks cached per
+# document, and how much of a non-seekable body is buffered before spilling to disk
+DOCUMENT_LOADER_CONFIG = {
+    'block_size': int(os.getenv('S3_RANGE_BLOCK_SIZE', str(1024 * 1024))),
+    'cache_blocks': int(os.getenv('S3_RANGE_CACHE_BLOCKS', '16')),
+    'spool_max_size': int(os.getenv('DOCUMENT_SPOOL_MAX_BYTES', str(32 * 1024 * 1024))),
+}
+
+# Embedding cache: SQLite file, provider batch size and concurrent provider calls
+EMBEDDING_CACHE_CONFIG = {
+    'enabled': os.getenv('EMBEDDING_CACHE_ENABLED', 'true').lower() == 'true',
+    'path': os.getenv('EMBEDDING_CACHE_PATH', 'embedding_cache.sqlite3'),
+    'batch_size': int(os.getenv('EMBEDDING_BATCH_SIZE', '512')),
+    'max_concurrency': int(os.getenv('EMBEDDING_MAX_CONCURRENCY', '4')),
+}
+
 # Vector Database Configuration
 VECTOR_DB_CONFIG = {
     'provider': os.getenv('VECTOR_DB_PROVIDER', 'pinecone'),
     'api_key': os.getenv('VECTOR_DB_API_KEY'),
     'environment': os.getenv('VECTOR_DB_ENVIRONMENT', 'us-west1-gcp'),
     'index_name': os.getenv('VECTOR_DB_INDEX_NAME', 'estimator-ai'),
+    'dimension': int(os.getenv('VECTOR_DB_DIMENSION', '1536')),
+    # Local provider: index directory, "flat" (exact) or "ivf" search, and IVF list/probe counts
+    'path': os.getenv('VECTOR_DB_PATH', 'vector_index'),
+    'index_type': os.getenv('VECTOR_DB_INDEX_TYPE', 'flat'),
+    'nlist': int(os.getenv('VECTOR_DB_NLIST', '256')),
+    'nprobe': int(os.getenv('VECTOR_DB_NPROBE', '8')),
+    # Seconds between background saves of a local index with unsaved changes
+    'save_interval': float(os.getenv('VECTOR_DB_SAVE_INTERVAL', '30')),
+}
+
+# BM25 index over document chunks, sharded per project, and the weight of
+# the vector score when fusing it with lexical scores in search
+LEXICAL_INDEX_CONFIG = {
+    'path': os.getenv('LEXICAL_INDEX_PATH', 'lexical_index'),
+    'k1': float(os.getenv('LEXICAL_INDEX_K1', '1.2')),
+    'b': float(os.getenv('LEXICAL_INDEX_B', '0.75')),
+    'hybrid_alpha': float(os.getenv('SEARCH_HYBRID_ALPHA', '0.5')),
+    'candidates': int(os.getenv('SEARCH_HYBRID_CANDIDATES', '4')),
 }
 
 # AWS Services Configuration
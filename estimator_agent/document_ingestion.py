@@ -7,7 +7,6 @@ import docx
 import pdfplumber
 from langchain.text_splitter import RecursiveCharacterTextSplitter
 from langchain.schema import Document
-from langchain_openai import ChatOpenAI
 from langchain.prompts import ChatPromptTemplate
 import boto3
 from google.oauth2.credentials import Credentials
@@ -26,6 +25,8 @@ from PIL import Image
 import ezdxf
 import io
 import logging
+from .metrics import track_llm_call, record_cache_lookup
+from .services.llm_provider import get_llm_provider
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -48,7 +49,9 @@ class LLMCache:
         if not self.redis_client:
             return None
         try:
-            return self.redis_client.get(key)
+            value = self.redis_client.get(key)
+            record_cache_lookup("llm", value is not None)
+            return value
         except Exception as e:
             logger.warning(f"Cache get error: {e}")
             return None
@@ -71,10 +74,7 @@ class DocumentProcessor:
             chunk_overlap=200,
             length_function=len,
         )
-        self.llm = ChatOpenAI(
-            model_name="gpt-3.5-turbo",
-            temperature=0
-        )
+        self.llm = get_llm_provider().chat_model("gpt-3.5-turbo", temperature=0)
         self.cache = LLMCache(redis_url)
         self.metadata_prompt = ChatPromptTemplate.from_messages([
             ("system", """You are an expert at analyzing construction and security system requirements.
@@ -133,7 +133,9 @@ class DocumentProcessor:
             chain = self.metadata_prompt | self.llm
             
             # Get the response
-            response = chain.invoke({"text": truncated_content})
+            with track_llm_call("extract_metadata") as call:
+                response = chain.invoke({"text": truncated_content})
+                call.record_usage(response.response_metadata.get("token_usage"))
             
             # Parse the JSON response
             metadata = json.loads(response.content)
@@ -194,11 +196,7 @@ class ImageProcessor(DocumentProcessor):
     """Process image files using OpenAI's Vision API with specialized analysis for fire alarms and security systems"""
     def __init__(self, redis_url: Optional[str] = None):
         super().__init__(redis_url)
-        self.vision_model = ChatOpenAI(
-            model_name="gpt-4o",
-            temperature=0,
-            max_tokens=2000
-        )
+        self.vision_model = get_llm_provider().chat_model("gpt-4o", temperature=0, max_tokens=2000)
         self.vision_prompt = ChatPromptTemplate.from_messages([
             ("system", """You are an expert at analyzing fire alarm and security system technical drawings, blueprints, and schematics.
             Your expertise includes NFPA, NEC, and UL standards compliance.
@@ -344,7 +342,9 @@ class ImageProcessor(DocumentProcessor):
             chain = self.vision_prompt | self.vision_model
             
             # Get the response
-            response = chain.invoke({"image_url": image_url})
+            with track_llm_call("analyze_image") as call:
+                response = chain.invoke({"image_url": image_url})
+                call.record_usage(response.response_metadata.get("token_usage"))
             
             # Parse the JSON response
             analysis = json.loads(response.content)
@@ -0,0 +1,262 @@
+"""
+Append-only persistence of project history and messages.
+
+Status changes and messages are written as new ``project_history`` and
+``messages`` rows instead of by rewriting a project document. The project's
+current status is materialized in ``projects.status``. Events are buffered
+and flushed in one transaction per batch. Each table gets one executemany
+INSERT, which SQLAlchemy sends as multi-row VALUES batches. One executemany
+UPDATE moves each touched project to its latest status.
+
+If a batch fails, its rows are retried one at a time. Rows the database
+rejects (constraint violations, bad values) are dead-lettered: logged to the
+``estimator_agent.events.dead_letter`` logger and dropped, so one bad row
+cannot block the rows behind it. When the database is unreachable the rows
+stay buffered, up to ``max_buffer`` events.
+"""
+import atexit
+import logging
+import os
+import threading
+import uuid
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import bindparam, exists, insert, select, update
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import OperationalError
+
+from .database import Message, Project, ProjectHistory, engine as default_engine
+
+logger = logging.getLogger(__name__)
+dead_letter_logger = logging.getLogger(__name__ + ".dead_letter")
+
+EVENTS_CONFIG = {
+    'batch_size': int(os.getenv('EVENTS_BATCH_SIZE', '500')),
+    'flush_interval': float(os.getenv('EVENTS_FLUSH_INTERVAL', '1.0')),
+    # Pending events kept while the database is unavailable; later events are dead-lettered
+    'max_buffer': int(os.getenv('EVENTS_MAX_BUFFER', '100000')),
+}
+
+
+class EventWriter:
+    """
+    Buffer history and message events and write them in batches.
+
+    Once ``start()`` has been called, a background thread flushes every
+    ``flush_interval`` seconds, and sooner when ``batch_size`` events are
+    pending; a final flush runs at exit. Recording an event never touches
+    the database, so it is safe on the request path.
+    """
+
+    def __init__(self, bind: Optional[Engine] = None,
+                 batch_size: Optional[int] = None,
+                 flush_interval: Optional[float] = None,
+                 max_buffer: Optional[int] = None):
+        self.bind = bind or default_engine
+        self.batch_size = batch_size or EVENTS_CONFIG['batch_size']
+        self.flush_interval = flush_interval or EVENTS_CONFIG['flush_interval']
+        self.max_buffer = max_buffer or EVENTS_CONFIG['max_buffer']
+        self.dead_lettered = 0
+        self._projects: List[Dict[str, Any]] = []
+        self._history: List[Dict[str, Any]] = []
+        self._messages: List[Dict[str, Any]] = []
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._wake = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def project_created(self, project_id: str, project_name: str, client_name: str,
+                        client_email: Optional[str] = None, status: str = "draft",
+                        timestamp: Optional[datetime] = None) -> None:
+        timestamp = timestamp or datetime.utcnow()
+        self._append(self._projects, {
+            "id": project_id,
+            "project_name": project_name,
+            "client_name": client_name,
+            "client_email": client_email,
+            "status": str(getattr(status, "value", status)),
+            "created_at": timestamp,
+            "updated_at": timestamp,
+        })
+
+    def status_changed(self, project_id: str, status: str, reason: Optional[str] = None,
+                       timestamp: Optional[datetime] = None) -> None:
+        self._append(self._history, {
+            "id": str(uuid.uuid4()),
+            "project_id": project_id,
+            "status": str(getattr(status, "value", status)),
+            "reason": reason,
+            "timestamp": timestamp or datetime.utcnow(),
+        })
+
+    def message_added(self, project_id: str, sender: str, content: str,
+                      timestamp: Optional[datetime] = None) -> None:
+        self._append(self._messages, {
+            "id": str(uuid.uuid4()),
+            "project_id": project_id,
+            "sender": sender,
+            "content": content,
+            "timestamp": timestamp or datetime.utcnow(),
+        })
+
+    def _pending(self) -> int:
+        return len(self._projects) + len(self._history) + len(self._messages)
+
+    def _append(self, buffer: List[Dict[str, Any]], row: Dict[str, Any]) -> None:
+        with self._lock:
+            pending = self._pending()
+            if pending < self.max_buffer:
+                buffer.append(row)
+        if pending >= self.max_buffer:
+            self._dead_letter("buffer full", [row])
+        elif pending + 1 >= self.batch_size:
+            self._wake.set()
+
+    def _dead_letter(self, reason: str, rows: List[Dict[str, Any]]) -> None:
+        self.dead_lettered += len(rows)
+        for row in rows:
+            dead_letter_logger.error("Dropped event (%s): %r", reason, row)
+
+    def _write(self, conn: Any, projects: List[Dict[str, Any]],
+               history: List[Dict[str, Any]], messages: List[Dict[str, Any]]) -> None:
+        if projects:
+            conn.execute(insert(Project), projects)
+        if history:
+            conn.execute(insert(ProjectHistory), history)
+        if messages:
+            conn.execute(insert(Message), messages)
+        # Latest status per project, applied with one UPDATE statement for the batch
+        latest: Dict[str, Dict[str, Any]] = {}
+        for event in history:
+            current = latest.get(event["project_id"])
+            if current is None or event["timestamp"] >= current["b_timestamp"]:
+                latest[event["project_id"]] = {
+                    "b_id": event["project_id"],
+                    "b_status": event["status"],
+                    "b_timestamp": event["timestamp"],
+                }
+        if latest:
+            conn.execute(
+                update(Project)
+                .where(Project.id == bindparam("b_id"))
+                .values(status=bindparam("b_status"), updated_at=bindparam("b_timestamp")),
+                list(latest.values())
+            )
+
+    def _requeue(self, projects: List[Dict[str, Any]], history: List[Dict[str, Any]],
+                 messages: List[Dict[str, Any]]) -> None:
+        """Put unwritten rows back in front of newer events, within max_buffer."""
+        with self._lock:
+            room = self.max_buffer - self._pending()
+            kept = []
+            for rows in (projects, history, messages):
+                kept.append(rows[:max(room, 0)])
+                room -= len(kept[-1])
+            self._projects[:0], self._history[:0], self._messages[:0] = kept
+        dropped = [row for rows, kept_rows in zip((projects, history, messages), kept)
+                   for row in rows[len(kept_rows):]]
+        if dropped:
+            self._dead_letter("buffer full", dropped)
+
+    def _write_rows(self, projects: List[Dict[str, Any]], history: List[Dict[str, Any]],
+                    messages: List[Dict[str, Any]]) -> int:
+        """
+        Write a failed batch one row per transaction
+
+        Returns:
+            Number of rows written
+        """
+        rows = [(group, row) for group, batch in enumerate((projects, history, messages)) for row in batch]
+        written = 0
+        for index, (group, row) in enumerate(rows):
+            groups: List[List[Dict[str, Any]]] = [[], [], []]
+            groups[group].append(row)
+            try:
+                with self.bind.begin() as conn:
+                    self._write(conn, *groups)
+                written += 1
+            except OperationalError:
+                logger.error("Database unavailable; keeping %d events for the next flush",
+                             len(rows) - index, exc_info=True)
+                remaining: List[List[Dict[str, Any]]] = [[], [], []]
+                for pending_group, pending in rows[index:]:
+                    remaining[pending_group].append(pending)
+                self._requeue(*remaining)
+                raise
+            except Exception as e:
+                self._dead_letter(str(e).splitlines()[0], [row])
+        return written
+
+    def flush(self) -> int:
+        """
+        Write all pending events, in one transaction when every row is valid
+
+        Returns:
+            Number of events written
+
+        Raises:
+            OperationalError: When the database is unavailable; unwritten events stay buffered
+        """
+        with self._flush_lock:
+            with self._lock:
+                projects, self._projects = self._projects, []
+                history, self._history = self._history, []
+                messages, self._messages = self._messages, []
+            total = len(projects) + len(history) + len(messages)
+            if not total:
+                return 0
+            try:
+                with self.bind.begin() as conn:
+                    self._write(conn, projects, history, messages)
+                return total
+            except Exception:
+                logger.warning("Failed to write a batch of %d events; retrying row by row", total, exc_info=True)
+            return self._write_rows(projects, history, messages)
+
+    def _run(self) -> None:
+        while not self._stopped.is_set():
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            try:
+                self.flush()
+            except Exception:
+                pass  # Already logged; retried on the next tick
+
+    def start(self) -> "EventWriter":
+        """Flush periodically from a background thread and once more at exit."""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="event-writer", daemon=True)
+            self._thread.start()
+            atexit.register(self.close)
+        return self
+
+    def close(self) -> None:
+        self._stopped.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self.flush()
+
+
+def materialize_status(bind: Optional[Engine] = None) -> int:
+    """
+    Recompute ``projects.status`` from each project's latest history row
+
+    Returns:
+        Number of projects updated
+    """
+    bind = bind or default_engine
+    latest = (
+        select(ProjectHistory.status)
+        .where(ProjectHistory.project_id == Project.id)
+        .order_by(ProjectHistory.timestamp.desc())
+        .limit(1)
+        .scalar_subquery()
+    )
+    has_history = exists().where(ProjectHistory.project_id == Project.id)
+    with bind.begin() as conn:
+        result = conn.execute(update(Project).where(has_history).values(status=latest))
+    return result.rowcount
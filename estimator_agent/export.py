@@ -0,0 +1,128 @@
+"""
+Streaming export of estimate line items as CSV, NDJSON or XLSX.
+
+Line items are produced one at a time from the stored estimate, and each
+format is written as an iterator of chunks so the full document is never
+built in memory.
+"""
+import csv
+import json
+import tempfile
+from typing import Any, Dict, Iterable, Iterator
+
+EXPORT_COLUMNS = ["category", "item", "quantity", "unit", "unit_cost", "total_cost"]
+
+# Chunk size for streaming spooled XLSX workbooks
+XLSX_CHUNK_SIZE = 64 * 1024
+# Workbooks larger than this are spooled to disk instead of memory
+XLSX_SPOOL_SIZE = 8 * 1024 * 1024
+
+# Cost sections of a ``CostBreakdown`` and the fields used for each export column
+_COST_SECTIONS = {
+    "materials": ("description", "quantity", "unit", "unit_cost"),
+    "labor": ("category", "hours", None, "rate_per_hour"),
+    "equipment": ("name", "days_needed", None, "daily_rate"),
+    "subcontractors": ("company", None, None, None),
+}
+
+
+def iter_line_items(estimate: Any) -> Iterator[Dict[str, Any]]:
+    """
+    Yield the line items of an estimate as flat rows keyed by EXPORT_COLUMNS
+
+    Args:
+        estimate: A ``ProjectEstimate`` (or its dict form) with a ``cost_breakdown``,
+            or a project analysis with a ``breakdown`` list of categories
+
+    Returns:
+        Iterator over line item rows
+    """
+    if hasattr(estimate, "dict"):
+        estimate = estimate.dict()
+    if estimate.get("cost_breakdown"):
+        breakdown = estimate["cost_breakdown"]
+        for section, (name, quantity, unit, unit_cost) in _COST_SECTIONS.items():
+            for entry in breakdown.get(section) or []:
+                yield {
+                    "category": section,
+                    "item": entry.get(name),
+                    "quantity": entry.get(quantity) if quantity else 1,
+                    "unit": entry.get(unit) if unit else ("hours" if section == "labor" else ""),
+                    "unit_cost": entry.get(unit_cost) if unit_cost else entry.get("cost"),
+                    "total_cost": entry.get("total_cost", entry.get("cost")),
+                }
+        return
+    for category in estimate.get("breakdown") or []:
+        for entry in category.get("items") or []:
+            yield {
+                "category": category.get("category"),
+                "item": entry.get("name"),
+                "quantity": entry.get("quantity"),
+                "unit": entry.get("unit", ""),
+                "unit_cost": entry.get("unitCost"),
+                "total_cost": entry.get("totalCost"),
+            }
+
+
+class _LineBuffer:
+    """Write target for ``csv.writer`` that hands back what was written since the last call."""
+
+    def __init__(self):
+        self._parts = []
+
+    def write(self, text: str) -> None:
+        self._parts.append(text)
+
+    def take(self) -> str:
+        text = "".join(self._parts)
+        self._parts.clear()
+        return text
+
+
+def iter_csv(rows: Iterable[Dict[str, Any]]) -> Iterator[str]:
+    buffer = _LineBuffer()
+    writer = csv.DictWriter(buffer, fieldnames=EXPORT_COLUMNS, extrasaction="ignore")
+    writer.writeheader()
+    yield buffer.take()
+    for row in rows:
+        writer.writerow(row)
+        yield buffer.take()
+
+
+def iter_ndjson(rows: Iterable[Dict[str, Any]]) -> Iterator[str]:
+    for row in rows:
+        yield json.dumps(row, default=str) + "\n"
+
+
+def iter_xlsx(rows: Iterable[Dict[str, Any]], sheet_title: str = "Estimate") -> Iterator[bytes]:
+    """
+    Write rows to a write-only workbook and stream the saved file.
+
+    XLSX is a zip archive and can only be emitted once complete, so the
+    workbook is saved to a spooled temporary file. Write-only mode keeps
+    openpyxl from holding every cell in memory while rows are added.
+    """
+    from openpyxl import Workbook
+
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet(title=sheet_title)
+    sheet.append(EXPORT_COLUMNS)
+    for row in rows:
+        sheet.append([row.get(column) for column in EXPORT_COLUMNS])
+
+    with tempfile.SpooledTemporaryFile(max_size=XLSX_SPOOL_SIZE) as spool:
+        workbook.save(spool)
+        spool.seek(0)
+        while True:
+            chunk = spool.read(XLSX_CHUNK_SIZE)
+            if not chunk:
+                break
+            yield chunk
+
+
+# format -> (writer, media type, file extension)
+EXPORT_FORMATS = {
+    "csv": (iter_csv, "text/csv", "csv"),
+    "ndjson": (iter_ndjson, "application/x-ndjson", "ndjson"),
+    "xlsx": (iter_xlsx, "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet", "xlsx"),
+}
@@ -0,0 +1,69 @@
+import hashlib
+import json
+from typing import Any, Dict, Hashable, Optional, Tuple
+
+from fastapi import Request, Response
+
+from .metrics import record_cache_lookup
+
+
+def make_etag(body: bytes) -> str:
+    """Build a strong ETag from the serialized response body."""
+    return f'"{hashlib.sha1(body).hexdigest()}"'
+
+
+def etag_matches(request: Request, etag: str) -> bool:
+    """
+    Check the request's If-None-Match header against an ETag.
+
+    Uses the weak comparison required for If-None-Match, so ``W/"x"`` matches ``"x"``.
+    """
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    wanted = etag[2:] if etag.startswith("W/") else etag
+    for candidate in header.split(","):
+        candidate = candidate.strip()
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if candidate == wanted:
+            return True
+    return False
+
+
+def not_modified(headers: Dict[str, str]) -> Response:
+    return Response(status_code=304, headers=headers)
+
+
+class SerializedCache:
+    """
+    Cache of pre-serialized JSON payloads and their ETags.
+
+    Meant for reference data that does not change while the process runs, so
+    each payload is serialized and hashed once instead of on every request.
+    """
+
+    def __init__(self, name: str, cache_control: str):
+        self.name = name
+        self.cache_control = cache_control
+        self._entries: Dict[Hashable, Tuple[bytes, str]] = {}
+
+    def response(self, request: Request, key: Hashable, payload: Any) -> Response:
+        entry = self._entries.get(key)
+        record_cache_lookup(self.name, entry is not None)
+        if entry is None:
+            body = json.dumps(payload, default=str).encode()
+            entry = self._entries[key] = (body, make_etag(body))
+        body, etag = entry
+        headers = {"ETag": etag, "Cache-Control": self.cache_control}
+        if etag_matches(request, etag):
+            return not_modified(headers)
+        return Response(content=body, media_type="application/json", headers=headers)
+
+    def invalidate(self, key: Optional[Hashable] = None) -> None:
+        if key is None:
+            self._entries.clear()
+        else:
+            self._entries.pop(key, None)
@@ -0,0 +1,194 @@
+"""
+Idempotency-Key support for POST endpoints with side effects.
+
+A client retrying a request with the same ``Idempotency-Key`` header gets the
+stored result of the first attempt back instead of triggering another LLM
+call or email. Results are kept in a bounded store: in process for tests and
+single-worker deployments, or in Redis when workers must share them.
+"""
+import hashlib
+import json
+import os
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+IDEMPOTENCY_CONFIG = {
+    'store_url': os.getenv('IDEMPOTENCY_STORE_URL', 'memory://'),
+    'max_entries': int(os.getenv('IDEMPOTENCY_MAX_ENTRIES', '10000')),
+    'ttl_seconds': int(os.getenv('IDEMPOTENCY_TTL_SECONDS', str(24 * 3600))),
+    # How long an in-progress claim blocks retries before it is considered abandoned
+    'lock_seconds': int(os.getenv('IDEMPOTENCY_LOCK_SECONDS', '300')),
+}
+
+PENDING = "pending"
+DONE = "done"
+
+
+class IdempotencyConflict(Exception):
+    """The key is in use by a request still in progress, or by one with a different body."""
+
+
+class IdempotencyStore(ABC):
+    @abstractmethod
+    def begin(self, key: str, fingerprint: str) -> Optional[Dict[str, Any]]:
+        """
+        Claim ``key`` for a new request
+
+        Returns:
+            None if the key was free and is now claimed, otherwise the existing
+            entry (``{"state", "fingerprint", "response"}``)
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def complete(self, key: str, fingerprint: str, response: Any) -> None:
+        raise NotImplementedError
+
+    @abstractmethod
+    def release(self, key: str) -> None:
+        raise NotImplementedError
+
+
+class InMemoryIdempotencyStore(IdempotencyStore):
+    """Process-local LRU store with a maximum size and per-entry TTL."""
+
+    def __init__(self, max_entries: int, ttl_seconds: int, lock_seconds: int):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.lock_seconds = lock_seconds
+        self._entries: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def begin(self, key: str, fingerprint: str) -> Optional[Dict[str, Any]]:
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry["expires_at"] > now:
+                self._entries.move_to_end(key)
+                return entry
+            self._entries[key] = {
+                "state": PENDING,
+                "fingerprint": fingerprint,
+                "response": None,
+                "expires_at": now + self.lock_seconds,
+            }
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return None
+
+    def complete(self, key: str, fingerprint: str, response: Any) -> None:
+        with self._lock:
+            self._entries[key] = {
+                "state": DONE,
+                "fingerprint": fingerprint,
+                "response": response,
+                "expires_at": time.monotonic() + self.ttl_seconds,
+            }
+            self._entries.move_to_end(key)
+
+    def release(self, key: str) -> None:
+        with self._lock:
+            self._entries.pop(key, None)
+
+
+class RedisIdempotencyStore(IdempotencyStore):
+    """Store shared by all workers; Redis TTLs and maxmemory policy bound its size."""
+
+    def __init__(self, redis_url: str, ttl_seconds: int, lock_seconds: int, prefix: str = "idempotency:"):
+        import redis
+        self.client = redis.from_url(redis_url)
+        self.ttl_seconds = ttl_seconds
+        self.lock_seconds = lock_seconds
+        self.prefix = prefix
+
+    def begin(self, key: str, fingerprint: str) -> Optional[Dict[str, Any]]:
+        pending = json.dumps({"state": PENDING, "fingerprint": fingerprint, "response": None})
+        if self.client.set(self.prefix + key, pending, nx=True, ex=self.lock_seconds):
+            return None
+        existing = self.client.get(self.prefix + key)
+        if existing is None:
+            # Expired between the two calls; try once more
+            return self.begin(key, fingerprint)
+        return json.loads(existing)
+
+    def complete(self, key: str, fingerprint: str, response: Any) -> None:
+        entry = json.dumps({"state": DONE, "fingerprint": fingerprint, "response": response})
+        self.client.set(self.prefix + key, entry, ex=self.ttl_seconds)
+
+    def release(self, key: str) -> None:
+        self.client.delete(self.prefix + key)
+
+
+def create_idempotency_store(store_url: Optional[str] = None) -> IdempotencyStore:
+    url = store_url or IDEMPOTENCY_CONFIG['store_url']
+    if url.startswith("redis"):
+        return RedisIdempotencyStore(url, IDEMPOTENCY_CONFIG['ttl_seconds'], IDEMPOTENCY_CONFIG['lock_seconds'])
+    return InMemoryIdempotencyStore(
+        IDEMPOTENCY_CONFIG['max_entries'], IDEMPOTENCY_CONFIG['ttl_seconds'], IDEMPOTENCY_CONFIG['lock_seconds'])
+
+
+def fingerprint(payload: Any) -> str:
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode()).hexdigest()
+
+
+class IdempotentRequest:
+    """
+    Idempotency bookkeeping for a single request.
+
+    Every method is a no-op when the client did not send a key, so endpoints
+    can use it unconditionally.
+    """
+
+    def __init__(self, store: IdempotencyStore, key: Optional[str], scope: str, payload: Any = None):
+        self.store = store
+        self.key = f"{scope}:{key}" if key else None
+        self.fingerprint = fingerprint(payload)
+        # Set once the request has done something a retry must not repeat
+        self.side_effects = False
+        self._finished = False
+
+    def replay(self) -> Optional[Any]:
+        """
+        Claim the key, or return the stored response of an earlier request with it
+
+        Raises:
+            IdempotencyConflict: If the earlier request is still running or had a different body
+        """
+        if not self.key:
+            return None
+        entry = self.store.begin(self.key, self.fingerprint)
+        if entry is None:
+            return None
+        if entry["fingerprint"] != self.fingerprint:
+            raise IdempotencyConflict("Idempotency-Key was already used with a different request body")
+        if entry["state"] != DONE:
+            raise IdempotencyConflict("A request with this Idempotency-Key is still in progress")
+        return entry["response"]
+
+    def complete(self, response: Any) -> None:
+        self._finished = True
+        if self.key:
+            self.store.complete(self.key, self.fingerprint, response)
+
+    def side_effect(self) -> None:
+        """Record an external effect, such as a sent email, that a retry would repeat."""
+        self.side_effects = True
+
+    def abort(self) -> None:
+        """
+        Release the key so the client can retry after a failure
+
+        Does nothing once the request has completed or been aborted, so it is
+        safe to call whenever a response ends, and never releases a retry's
+        claim. After a side effect the key is kept: the client gets a conflict
+        until the lock expires rather than a retry that repeats the effect.
+        """
+        if self._finished:
+            return
+        self._finished = True
+        if self.key and not self.side_effects:
+            self.store.release(self.key)
@@ -0,0 +1,128 @@
+"""
+Non-blocking logging setup for the API.
+
+Log records are put on an in-memory queue by the request handlers and written
+to the rotating log file and the console by a background listener thread, so
+file and terminal I/O never happens on the request path. The handlers only
+merge each message with its arguments before enqueueing; timestamps and the
+log line itself are formatted on the listener thread.
+"""
+import atexit
+import copy
+import logging
+import os
+import queue
+import random
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+from typing import Optional
+
+LOG_FORMAT = "%(asctime)s [%(levelname)s] %(name)s: %(message)s"
+
+# Logger used for one-line-per-request access logs; subject to sampling
+ACCESS_LOGGER_NAME = "estimator_agent.access"
+
+LOGGING_CONFIG = {
+    'level': os.getenv('LOG_LEVEL', 'INFO').upper(),
+    'file': os.getenv('LOG_FILE', 'backend_debug.log'),
+    'max_bytes': int(os.getenv('LOG_MAX_BYTES', str(5 * 1024 * 1024))),
+    'backup_count': int(os.getenv('LOG_BACKUP_COUNT', '3')),
+    'access_sample_rate': float(os.getenv('LOG_ACCESS_SAMPLE_RATE', '1.0')),
+    'log_payloads': os.getenv('LOG_PAYLOADS', 'false').lower() == 'true',
+}
+
+_listener: Optional[QueueListener] = None
+
+# Renders tracebacks on the logging thread; the listener's formatter reuses exc_text
+_exception_formatter = logging.Formatter()
+
+
+class DeferredFormatQueueHandler(QueueHandler):
+    """
+    Queue handler that leaves most formatting to the listener thread.
+
+    The stock QueueHandler formats every record before enqueueing it, which
+    puts the formatting cost back on the caller. This one only renders the
+    message with its arguments, and any traceback, on the calling thread.
+    Objects passed as arguments may change before the listener runs, and a
+    queued traceback would keep every frame and its locals alive until then.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = _exception_formatter.formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+class SamplingFilter(logging.Filter):
+    """Pass only a fraction of records below WARNING; warnings and errors always pass."""
+
+    def __init__(self, rate: float):
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        return record.levelno >= logging.WARNING or self.rate >= 1.0 or random.random() < self.rate
+
+
+def configure_logging(level: Optional[str] = None,
+                      log_file: Optional[str] = None,
+                      access_sample_rate: Optional[float] = None,
+                      console: bool = True) -> QueueListener:
+    """
+    Route all logging through a queue drained by a background thread
+
+    Args:
+        level: Root log level; defaults to the LOG_LEVEL environment variable
+        log_file: Rotating log file path; defaults to LOG_FILE
+        access_sample_rate: Fraction of access log records to keep
+        console: Also write records to stderr
+
+    Returns:
+        The running QueueListener (also stopped automatically at exit)
+    """
+    global _listener
+    if _listener is not None:
+        return _listener
+
+    formatter = logging.Formatter(LOG_FORMAT)
+    file_handler = RotatingFileHandler(
+        log_file or LOGGING_CONFIG['file'],
+        maxBytes=LOGGING_CONFIG['max_bytes'],
+        backupCount=LOGGING_CONFIG['backup_count']
+    )
+    file_handler.setFormatter(formatter)
+    handlers = [file_handler]
+    if console:
+        console_handler = logging.StreamHandler()
+        console_handler.setFormatter(formatter)
+        handlers.append(console_handler)
+
+    log_queue: "queue.SimpleQueue[logging.LogRecord]" = queue.SimpleQueue()
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(DeferredFormatQueueHandler(log_queue))
+    root.setLevel(level or LOGGING_CONFIG['level'])
+
+    rate = LOGGING_CONFIG['access_sample_rate'] if access_sample_rate is None else access_sample_rate
+    access_logger = logging.getLogger(ACCESS_LOGGER_NAME)
+    access_logger.filters = [f for f in access_logger.filters if not isinstance(f, SamplingFilter)]
+    if rate < 1.0:
+        access_logger.addFilter(SamplingFilter(rate))
+
+    _listener = QueueListener(log_queue, *handlers, respect_handler_level=True)
+    _listener.start()
+    atexit.register(stop_logging)
+    return _listener
+
+
+def stop_logging() -> None:
+    """Flush queued records and stop the listener thread."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
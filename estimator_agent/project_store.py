@@ -0,0 +1,183 @@
+import base64
+import heapq
+import json
+from bisect import bisect_left, insort
+from collections import defaultdict
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+SortKey = Tuple[str, str]
+
+
+def _status_key(value: Any) -> str:
+    return str(getattr(value, "value", value) or "")
+
+
+def _client_key(value: Any) -> str:
+    return str(value or "").strip().casefold()
+
+
+def _created_key(value: Any) -> str:
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return str(value or "")
+
+
+def encode_cursor(key: SortKey) -> str:
+    return base64.urlsafe_b64encode(json.dumps(list(key)).encode()).decode()
+
+
+def decode_cursor(cursor: str) -> SortKey:
+    """Decode an opaque pagination cursor, raising ValueError if it is malformed."""
+    try:
+        created, project_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return str(created), str(project_id)
+    except Exception as e:
+        raise ValueError(f"Invalid cursor: {cursor}") from e
+
+
+def project_fields(project: Dict[str, Any], fields: Optional[Iterable[str]]) -> Dict[str, Any]:
+    """Return only the requested top-level fields of a project (``id`` is always kept)."""
+    if not fields:
+        return project
+    wanted = {"id", *fields}
+    return {key: value for key, value in project.items() if key in wanted}
+
+
+class ProjectStore(dict):
+    """
+    In-memory project storage keyed by project id.
+
+    Behaves like the plain dict it replaces, but keeps secondary indexes on
+    status, client name and creation time up to date on every write so that
+    ``query`` can serve filtered, paginated listings without scanning every
+    project. It also keeps a per-project version counter, bumped on every
+    write, which is used to build ETags. Writes must go through item
+    assignment (``PROJECTS[id] = project``) for the indexes and version to see
+    in-place changes.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._by_status: Dict[str, Set[str]] = defaultdict(set)
+        self._by_client: Dict[str, Set[str]] = defaultdict(set)
+        self._by_created: List[SortKey] = []
+        self._indexed: Dict[str, Tuple[str, str, SortKey]] = {}
+        self._versions: Dict[str, int] = {}
+
+    def __setitem__(self, project_id: str, project: Dict[str, Any]) -> None:
+        super().__setitem__(project_id, project)
+        self._unindex(project_id)
+        self._index(project_id, project)
+        self._versions[project_id] = self._versions.get(project_id, 0) + 1
+
+    def __delitem__(self, project_id: str) -> None:
+        super().__delitem__(project_id)
+        self._unindex(project_id)
+        self._versions.pop(project_id, None)
+
+    def pop(self, project_id: str, *default: Any) -> Any:
+        if project_id in self:
+            self._unindex(project_id)
+            self._versions.pop(project_id, None)
+        return super().pop(project_id, *default)
+
+    def clear(self) -> None:
+        super().clear()
+        self._by_status.clear()
+        self._by_client.clear()
+        self._by_created.clear()
+        self._indexed.clear()
+        self._versions.clear()
+
+    def version(self, project_id: str) -> int:
+        """Number of times the project has been written, or 0 if it does not exist."""
+        return self._versions.get(project_id, 0)
+
+    def etag(self, project_id: str) -> str:
+        return f'"{project_id}-{self.version(project_id)}"'
+
+    def update(self, *args: Any, **kwargs: Any) -> None:
+        for project_id, project in dict(*args, **kwargs).items():
+            self[project_id] = project
+
+    def setdefault(self, project_id: str, default: Any = None) -> Any:
+        if project_id not in self:
+            self[project_id] = default
+        return self[project_id]
+
+    def _index(self, project_id: str, project: Dict[str, Any]) -> None:
+        status = _status_key(project.get("status"))
+        client = _client_key(project.get("clientName"))
+        sort_key = (_created_key(project.get("createdAt")), project_id)
+        self._by_status[status].add(project_id)
+        self._by_client[client].add(project_id)
+        insort(self._by_created, sort_key)
+        self._indexed[project_id] = (status, client, sort_key)
+
+    def _unindex(self, project_id: str) -> None:
+        entry = self._indexed.pop(project_id, None)
+        if entry is None:
+            return
+        status, client, sort_key = entry
+        self._by_status[status].discard(project_id)
+        if not self._by_status[status]:
+            del self._by_status[status]
+        self._by_client[client].discard(project_id)
+        if not self._by_client[client]:
+            del self._by_client[client]
+        position = bisect_left(self._by_created, sort_key)
+        if position < len(self._by_created) and self._by_created[position] == sort_key:
+            del self._by_created[position]
+
+    def query(self,
+              status: Optional[str] = None,
+              client: Optional[str] = None,
+              created_after: Optional[datetime] = None,
+              created_before: Optional[datetime] = None,
+              cursor: Optional[str] = None,
+              limit: int = 50) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        """
+        List projects newest first, filtered by status, client and creation date
+
+        Args:
+            status: Only return projects in this status
+            client: Only return projects for this client name (case-insensitive)
+            created_after: Only return projects created at or after this time
+            created_before: Only return projects created before this time
+            cursor: Opaque cursor returned by a previous call
+            limit: Maximum number of projects to return
+
+        Returns:
+            Tuple of the matching projects and the cursor for the next page,
+            or None when there are no more results
+        """
+        lower = _created_key(created_after) if created_after else None
+        upper: Optional[SortKey] = (_created_key(created_before), "") if created_before else None
+        if cursor:
+            after = decode_cursor(cursor)
+            upper = min(upper, after) if upper else after
+
+        candidates = None
+        for index, key in ((self._by_status, _status_key(status) if status else None),
+                           (self._by_client, _client_key(client) if client else None)):
+            if key is None:
+                continue
+            ids = index.get(key, set())
+            candidates = ids if candidates is None else candidates & ids
+
+        if candidates is None:
+            # No equality filter: walk the creation-time index backwards from the upper bound
+            hi = bisect_left(self._by_created, upper) if upper else len(self._by_created)
+            lo = bisect_left(self._by_created, (lower, "")) if lower else 0
+            keys = self._by_created[max(lo, hi - limit - 1):hi][::-1]
+        else:
+            keys = heapq.nlargest(
+                limit + 1,
+                (sort_key for sort_key in (self._indexed[pid][2] for pid in candidates)
+                 if (upper is None or sort_key < upper) and (lower is None or sort_key[0] >= lower))
+            )
+
+        page = keys[:limit]
+        next_cursor = encode_cursor(page[-1]) if len(keys) > limit else None
+        return [dict.__getitem__(self, project_id) for _, project_id in page], next_cursor
@@ -0,0 +1,194 @@
+"""
+Rate limiter configuration shared by all API workers.
+
+Limits are counted in the storage named by RATE_LIMIT_STORAGE_URI. Use
+``memory://`` for a single process or tests, and ``redis://...`` so that
+every worker and pod shares the same counters. Prefix the URI with
+``batched+`` (e.g. ``batched+redis://redis:6379``) to count locally and sync
+with the shared store in batches instead of on every request.
+
+Requests are counted per API key only when the key is valid (the API_KEY
+the API accepts, or a key listed in RATE_LIMIT_API_KEY_LIMITS). Any other
+request, including one with a made-up key, is counted per client IP, so
+rotating keys cannot create fresh buckets.
+"""
+import atexit
+import hashlib
+import hmac
+import json
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, Optional
+
+from fastapi import Request
+from limits.storage import Storage, storage_from_string
+from slowapi import Limiter
+from slowapi.util import get_remote_address
+
+RATE_LIMIT_CONFIG = {
+    'storage_uri': os.getenv('RATE_LIMIT_STORAGE_URI', 'memory://'),
+    'batch_size': int(os.getenv('RATE_LIMIT_BATCH_SIZE', '10')),
+    'sync_interval': float(os.getenv('RATE_LIMIT_SYNC_INTERVAL', '1.0')),
+    # JSON object mapping API keys to limit strings, e.g. {"key-1": "100/minute"}
+    'api_key_limits': json.loads(os.getenv('RATE_LIMIT_API_KEY_LIMITS', '{}')),
+}
+
+
+def _api_key_id(api_key: str) -> str:
+    """Stable, non-reversible identifier for an API key, safe to use as a storage key."""
+    return "apikey:" + hashlib.sha256(api_key.encode()).hexdigest()[:16]
+
+
+API_KEY_LIMITS: Dict[str, str] = {
+    _api_key_id(api_key): limit for api_key, limit in RATE_LIMIT_CONFIG['api_key_limits'].items()
+}
+
+
+def _verified_api_key_id(api_key: str) -> Optional[str]:
+    """Identifier of a valid API key, or None for an unknown one."""
+    key_id = _api_key_id(api_key)
+    if key_id in API_KEY_LIMITS:
+        return key_id
+    expected = os.getenv("API_KEY")
+    if expected and hmac.compare_digest(api_key.encode(), expected.encode()):
+        return key_id
+    return None
+
+
+def rate_limit_key(request: Request) -> str:
+    """Rate-limit per valid API key, otherwise per client IP."""
+    api_key = request.headers.get("X-API-Key")
+    key_id = _verified_api_key_id(api_key) if api_key else None
+    return key_id or get_remote_address(request)
+
+
+def limit_for(default: str) -> Callable[[str], str]:
+    """Build a dynamic limit that applies any per-API-key override, else ``default``."""
+    def provider(key: str) -> str:
+        return API_KEY_LIMITS.get(key, default)
+    return provider
+
+
+class _LocalWindow:
+    __slots__ = ("known", "pending", "expiry", "expires_at", "synced_at")
+
+    def __init__(self, known: int, expiry: int, expires_at: float, synced_at: float):
+        self.known = known
+        self.pending = 0
+        self.expiry = expiry
+        self.expires_at = expires_at
+        self.synced_at = synced_at
+
+
+class BatchedStorage(Storage):
+    """
+    Counter storage that keeps hits in process and syncs them in batches.
+
+    Each key's count is read from the shared storage once per window. After
+    that, hits are counted locally and pushed with a single ``incr`` once
+    ``batch_size`` hits are pending or ``sync_interval`` seconds have passed.
+    Each worker can therefore overshoot a limit by at most one batch, in
+    exchange for far fewer round trips. Hits still pending when their window
+    ends are pushed before it is dropped, so they count toward the next
+    window instead of being lost. Expired windows are swept every
+    ``sync_interval`` seconds, and pending hits are pushed at exit. Only
+    fixed-window limits are supported.
+    """
+
+    STORAGE_SCHEME = ["batched+memory", "batched+redis", "batched+rediss", "batched+redis+unix"]
+
+    def __init__(self, uri: Optional[str] = None, wrap_exceptions: bool = False, **options: Any):
+        super().__init__(uri, wrap_exceptions=wrap_exceptions)
+        self._shared = storage_from_string(uri.split("batched+", 1)[1], **options)
+        self.batch_size = RATE_LIMIT_CONFIG['batch_size']
+        self.sync_interval = RATE_LIMIT_CONFIG['sync_interval']
+        self._windows: Dict[str, _LocalWindow] = {}
+        self._swept_at = time.time()
+        self._lock = threading.Lock()
+        atexit.register(self.flush)
+
+    @property
+    def base_exceptions(self) -> Any:
+        return self._shared.base_exceptions
+
+    def _window(self, key: str, expiry: int, now: float) -> _LocalWindow:
+        window = self._windows.get(key)
+        if window is not None and window.expires_at <= now:
+            self._push(key, window, now)
+            window = None
+        if window is None:
+            known = self._shared.get(key)
+            expires_at = self._shared.get_expiry(key) if known else now + expiry
+            window = self._windows[key] = _LocalWindow(known, expiry, expires_at, now)
+        return window
+
+    def _sync(self, key: str, expiry: int, window: _LocalWindow, now: float) -> None:
+        window.known = self._shared.incr(key, expiry, amount=window.pending)
+        window.pending = 0
+        window.synced_at = now
+
+    def _push(self, key: str, window: _LocalWindow, now: float) -> None:
+        """Push pending hits, into the current shared window once the local one has ended."""
+        if window.pending:
+            expiry = max(1, int(window.expires_at - now)) if window.expires_at > now else window.expiry
+            self._sync(key, expiry, window, now)
+
+    def _sweep(self, now: float) -> None:
+        for key, window in list(self._windows.items()):
+            if window.expires_at <= now:
+                self._push(key, window, now)
+                del self._windows[key]
+        self._swept_at = now
+
+    def incr(self, key: str, expiry: int, *args: Any, amount: int = 1, **kwargs: Any) -> int:
+        now = time.time()
+        with self._lock:
+            if now - self._swept_at >= self.sync_interval:
+                self._sweep(now)
+            window = self._window(key, expiry, now)
+            window.pending += amount
+            if window.pending >= self.batch_size or now - window.synced_at >= self.sync_interval:
+                self._sync(key, expiry, window, now)
+            return window.known + window.pending
+
+    def get(self, key: str) -> int:
+        with self._lock:
+            window = self._windows.get(key)
+            if window is not None and window.expires_at > time.time():
+                return window.known + window.pending
+        return self._shared.get(key)
+
+    def get_expiry(self, key: str) -> float:
+        window = self._windows.get(key)
+        if window is not None:
+            return window.expires_at
+        return self._shared.get_expiry(key)
+
+    def flush(self) -> None:
+        """Push all pending local hits to the shared storage and drop expired windows."""
+        now = time.time()
+        with self._lock:
+            for key, window in self._windows.items():
+                self._push(key, window, now)
+            self._sweep(now)
+
+    def check(self) -> bool:
+        return self._shared.check()
+
+    def reset(self) -> Optional[int]:
+        with self._lock:
+            self._windows.clear()
+        return self._shared.reset()
+
+    def clear(self, key: str) -> None:
+        with self._lock:
+            self._windows.pop(key, None)
+        self._shared.clear(key)
+
+
+def create_limiter(storage_uri: Optional[str] = None) -> Limiter:
+    return Limiter(
+        key_func=rate_limit_key,
+        storage_uri=storage_uri or RATE_LIMIT_CONFIG['storage_uri']
+    )
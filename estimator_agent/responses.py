@@ -0,0 +1,62 @@
+import json
+from typing import Any, Callable, Dict, Optional
+
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+from pydantic import BaseModel
+
+try:
+    import orjson
+except ImportError:  # orjson is optional; fall back to the standard library encoder
+    orjson = None
+
+
+def _default(value: Any) -> Any:
+    if isinstance(value, BaseModel):
+        return value.model_dump(mode="json")
+    return str(value)
+
+
+def dumps(content: Any) -> bytes:
+    """Serialize content to compact JSON bytes, using orjson when it is installed."""
+    if isinstance(content, BaseModel):
+        return content.model_dump_json().encode()
+    if orjson is not None:
+        return orjson.dumps(content, default=_default, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(content, default=_default, separators=(",", ":")).encode()
+
+
+class FastJSONResponse(JSONResponse):
+    """
+    JSON response that skips FastAPI's ``jsonable_encoder`` pass.
+
+    Pydantic models are serialized with ``model_dump_json`` and everything else
+    with orjson (or ``json`` if orjson is missing). Endpoints must return this
+    response directly for the encoder pass to be skipped.
+    """
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+
+def fast_response(content: Any, status_code: int = 200, headers: Optional[Dict[str, str]] = None) -> Response:
+    return FastJSONResponse(content=content, status_code=status_code, headers=headers)
+
+
+class ClosingStreamingResponse(StreamingResponse):
+    """
+    Streaming response that calls ``on_close`` once the response has ended.
+
+    It runs however the response ends: finished, failed, or cut off by a
+    client disconnect, even one before the body iterator was first advanced,
+    when a generator's own ``finally`` never runs.
+    """
+
+    def __init__(self, content: Any, on_close: Callable[[], None], **kwargs: Any):
+        super().__init__(content, **kwargs)
+        self.on_close = on_close
+
+    async def __call__(self, scope: Any, receive: Any, send: Any) -> None:
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            self.on_close()
@@ -4,12 +4,21 @@ from crewai import Agent, Task, Crew, Process
 from langchain.tools import tool
 from langchain_community.tools import DuckDuckGoSearchRun
 from ..models import AgentRole, AgentAction, AgentWorkflow, ParsedDocument, ProjectEstimate, Proposal
+from ..config import AGENT_CONFIG, CHECKPOINT_CONFIG
+from .checkpoints import create_checkpoint_store, input_hash
+from .llm_provider import get_llm_provider
+from .workflow import WorkflowExecutor
 import json
 
 class AgentService:
     def __init__(self, openai_api_key: str):
         self.openai_api_key = openai_api_key
-        self.search_tool = DuckDuckGoSearchRun()
+        self.llm = get_llm_provider(openai_api_key).chat_model("gpt-4")
+        self.verbose = AGENT_CONFIG['verbose']
+        self.search_tool = DuckDuckGoSearchRun() if AGENT_CONFIG['search_tool'] else None
+        self.tools = [self.search_tool] if self.search_tool else []
+        # Completed steps are saved so a rerun after a failure skips their LLM calls
+        self.checkpoints = create_checkpoint_store() if CHECKPOINT_CONFIG['enabled'] else None
         
     def create_document_parser_agent(self) -> Agent:
         """
@@ -21,10 +30,10 @@ class AgentService:
             backstory="""You are an expert at analyzing construction documents, drawings, and specifications. 
             Your goal is to extract key information about fire protection and security system requirements.
             You can understand technical drawings, specifications, and project requirements documents.""",
-            verbose=True,
+            verbose=self.verbose,
             allow_delegation=False,
-            tools=[self.search_tool],
-            llm_model="gpt-4"
+            tools=self.tools,
+            llm=self.llm
         )
         
     def create_requirements_agent(self) -> Agent:
@@ -37,10 +46,10 @@ class AgentService:
             backstory="""You are an expert in fire protection and security systems requirements analysis.
             You can identify system requirements, compliance needs, and technical specifications from project documents.
             You understand building codes, safety standards, and industry best practices.""",
-            verbose=True,
+            verbose=self.verbose,
             allow_delegation=True,
-            tools=[self.search_tool],
-            llm_model="gpt-4"
+            tools=self.tools,
+            llm=self.llm
         )
         
     def create_cost_estimator_agent(self) -> Agent:
@@ -53,10 +62,10 @@ class AgentService:
             backstory="""You are an expert in estimating costs for fire protection and security systems.
             You understand material costs, labor rates, equipment costs, and regional variations.
             You can provide detailed cost breakdowns and identify potential cost-saving opportunities.""",
-            verbose=True,
+            verbose=self.verbose,
             allow_delegation=True,
-            tools=[self.search_tool],
-            llm_model="gpt-4"
+            tools=self.tools,
+            llm=self.llm
         )
         
     def create_proposal_generator_agent(self) -> Agent:
@@ -69,10 +78,10 @@ class AgentService:
             backstory="""You are an expert in writing professional proposals for fire protection and security systems.
             You can create clear, persuasive proposals that highlight the value proposition and technical excellence.
             You understand how to present costs, timelines, and technical specifications in a client-friendly format.""",
-            verbose=True,
+            verbose=self.verbose,
             allow_delegation=True,
-            tools=[self.search_tool],
-            llm_model="gpt-4"
+            tools=self.tools,
+            llm=self.llm
         )
         
     @tool
@@ -163,27 +172,32 @@ class AgentService:
         estimate_obj = ProjectEstimate(**estimate)
         return estimator.generate_proposal(estimate_obj)
         
-    def create_project_workflow(self, project_id: str, documents: List[Dict[str, Any]]) -> AgentWorkflow:
+    def _run_task(self, agent: Agent, description: str, expected_output: str) -> str:
         """
-        Create and execute a workflow for a project with review steps
+        Run a single task with its own one-agent crew
         
         Args:
-            project_id: Project identifier
-            documents: List of documents to process
+            agent: Agent that performs the task
+            description: Task description, including any upstream results
+            expected_output: Description of the expected output
             
         Returns:
-            AgentWorkflow object with results
+            The task output as text
         """
-        # Create the agents
-        parser_agent = self.create_document_parser_agent()
-        requirements_agent = self.create_requirements_agent()
-        estimator_agent = self.create_cost_estimator_agent()
-        proposal_agent = self.create_proposal_generator_agent()
+        task = Task(description=description, agent=agent, expected_output=expected_output)
+        crew = Crew(
+            agents=[agent],
+            tasks=[task],
+            verbose=2 if self.verbose else 0,
+            process=Process.sequential
+        )
+        return str(crew.kickoff())
         
-        # Step 1: Document Parsing and Requirements Extraction
-        parsing_task = Task(
-            description=f"""Analyze the following documents and extract all relevant information:
-            {', '.join([doc.get('filename', 'Unknown') for doc in documents])}
+    def _parse_document(self, document: Dict[str, Any]) -> str:
+        return self._run_task(
+            self.create_document_parser_agent(),
+            f"""Analyze the following document and extract all relevant information:
+            {document.get('filename', 'Unknown')}
             
             Extract:
             1. Project name and basic information
@@ -195,13 +209,18 @@ class AgentService:
             
             Provide a structured JSON output with all extracted information.
             Format the output for easy review and validation.""",
-            agent=parser_agent,
-            expected_output="A detailed analysis of the documents with extracted information in JSON format"
+            "A detailed analysis of the document with extracted information in JSON format"
         )
         
-        # Step 2: Requirements Analysis and Structuring
-        requirements_task = Task(
-            description="""Analyze the extracted information and structure the project requirements.
+    def _analyze_requirements(self, parsed: Dict[str, str]) -> str:
+        analyses = "\n\n".join(f"{name}:\n{output}" for name, output in parsed.items())
+        return self._run_task(
+            self.create_requirements_agent(),
+            f"""Analyze the extracted information and structure the project requirements.
+            
+            Extracted information per document:
+            {analyses}
+            
             Include:
             1. Required systems and their specifications
             2. Compliance requirements
@@ -213,14 +232,17 @@ class AgentService:
             Provide a structured JSON output with all requirements.
             Include confidence scores for each requirement.
             Highlight any areas that need human review or clarification.""",
-            agent=requirements_agent,
-            expected_output="A structured JSON of project requirements with confidence scores",
-            context=[parsing_task]
+            "A structured JSON of project requirements with confidence scores"
         )
         
-        # Step 3: Cost Estimation
-        estimation_task = Task(
-            description="""Generate a detailed cost estimate based on the requirements.
+    def _estimate_costs(self, requirements: str) -> str:
+        return self._run_task(
+            self.create_cost_estimator_agent(),
+            f"""Generate a detailed cost estimate based on the requirements.
+            
+            Requirements:
+            {requirements}
+            
             Include:
             1. Material costs breakdown
             2. Labor costs breakdown
@@ -232,14 +254,20 @@ class AgentService:
             Provide a structured JSON output with the cost estimate.
             Include confidence scores for each cost item.
             Highlight any assumptions or areas that need review.""",
-            agent=estimator_agent,
-            expected_output="A comprehensive cost estimate in JSON format with confidence scores",
-            context=[requirements_task]
+            "A comprehensive cost estimate in JSON format with confidence scores"
         )
         
-        # Step 4: Proposal Generation
-        proposal_task = Task(
-            description="""Create a professional proposal based on the requirements and estimate.
+    def _write_proposal(self, requirements: str, estimate: str) -> str:
+        return self._run_task(
+            self.create_proposal_generator_agent(),
+            f"""Create a professional proposal based on the requirements and estimate.
+            
+            Requirements:
+            {requirements}
+            
+            Cost Estimate:
+            {estimate}
+            
             Include:
             1. Executive summary
             2. Scope of work
@@ -252,28 +280,88 @@ class AgentService:
             Provide a structured JSON output with the proposal content.
             Include placeholders for any information that needs human review or approval.
             Format the output for easy review and editing.""",
-            agent=proposal_agent,
-            expected_output="A complete proposal in JSON format with review placeholders",
-            context=[estimation_task]
+            "A complete proposal in JSON format with review placeholders"
         )
         
-        # Create the crew with sequential processing
-        crew = Crew(
-            agents=[parser_agent, requirements_agent, estimator_agent, proposal_agent],
-            tasks=[parsing_task, requirements_task, estimation_task, proposal_task],
-            verbose=2,
-            process=Process.sequential
+    def build_project_workflow(self, documents: List[Dict[str, Any]],
+                               workflow_id: Optional[str] = None) -> WorkflowExecutor:
+        """
+        Build the project workflow DAG
+        
+        Each document is parsed by its own step, and these steps run in
+        parallel. Requirements analysis waits for all of them. Cost
+        estimation and proposal writing follow in order, because each needs
+        the previous result.
+        
+        Args:
+            documents: List of documents to process
+            workflow_id: Checkpoint namespace; steps completed in an earlier run are restored
+            
+        Returns:
+            WorkflowExecutor ready to run
+        """
+        executor = WorkflowExecutor(
+            max_workers=AGENT_CONFIG['max_parallel'],
+            checkpoints=self.checkpoints if workflow_id else None,
+            workflow_id=workflow_id
         )
+        # Step name -> label used when handing the parse results to the requirements agent
+        parse_steps = {}
+        for index, document in enumerate(documents):
+            name = f"document_parsing:{index}"
+            executor.add(name, lambda inputs, document=document: self._parse_document(document), key=document)
+            parse_steps[name] = f"{index + 1}. {document.get('filename', 'Unknown')}"
+        executor.add(
+            "requirements_analysis",
+            lambda inputs: self._analyze_requirements({label: inputs[name] for name, label in parse_steps.items()}),
+            depends_on=list(parse_steps)
+        )
+        executor.add(
+            "cost_estimation",
+            lambda inputs: self._estimate_costs(inputs["requirements_analysis"]),
+            depends_on=["requirements_analysis"]
+        )
+        executor.add(
+            "proposal_generation",
+            lambda inputs: self._write_proposal(inputs["requirements_analysis"], inputs["cost_estimation"]),
+            depends_on=["requirements_analysis", "cost_estimation"]
+        )
+        return executor
+        
+    def create_project_workflow(self, project_id: str, documents: List[Dict[str, Any]],
+                                workflow_id: Optional[str] = None) -> AgentWorkflow:
+        """
+        Create and execute a workflow for a project with review steps
+        
+        Steps are checkpointed under the workflow id. Running the workflow
+        again with the same id (for example after the proposal step
+        failed) restores every step whose inputs are unchanged instead of
+        calling the LLM again. The checkpoints are cleared once every step
+        has succeeded.
+        
+        Args:
+            project_id: Project identifier
+            documents: List of documents to process
+            workflow_id: Workflow identifier; defaults to one per project
+            
+        Returns:
+            AgentWorkflow object with results
+        """
+        started_at = datetime.now()
+        workflow_id = workflow_id or f"wf-{project_id}"
+        executor = self.build_project_workflow(documents, workflow_id)
         
         # Execute the workflow
-        result = crew.kickoff()
+        outputs = executor.run()
+        if self.checkpoints:
+            self.checkpoints.clear(workflow_id)
         
         # Create workflow record with review status
         workflow = AgentWorkflow(
-            workflow_id=f"wf-{project_id}-{datetime.now().strftime('%Y%m%d%H%M%S')}",
+            workflow_id=workflow_id,
             project_id=project_id,
             status="pending_review",  # Changed to indicate review is needed
-            started_at=datetime.now(),
+            started_at=started_at,
             completed_at=datetime.now(),
             current_step="proposal_generation",
             steps_completed=[
@@ -284,7 +372,10 @@ class AgentService:
             ],
             actions=[],
             result={
-                "output": result,
+                "output": outputs["proposal_generation"],
+                "steps": outputs,
+                "timings": executor.timings,
+                "resumed_steps": executor.resumed,
                 "review_status": {
                     "requirements": "pending",
                     "estimate": "pending",
@@ -300,6 +391,10 @@ class AgentService:
         """
         Generate the final proposal incorporating review feedback
         
+        The proposal is checkpointed under the project's workflow, so
+        retrying finalization with the same project data and review notes
+        returns the saved result without another LLM call.
+        
         Args:
             project_id: Project identifier
             project_data: Project data including requirements and estimates
@@ -308,6 +403,45 @@ class AgentService:
         Returns:
             Dictionary containing the final proposal
         """
+        workflow_id = (project_data.get('metadata') or {}).get('workflow_id') or f"wf-{project_id}"
+        digest = input_hash({
+            "project": {key: project_data.get(key) for key in ('projectName', 'clientName', 'location', 'requirements', 'estimate')},
+            "review_notes": review_notes,
+        })
+        record = self.checkpoints.get(workflow_id, "final_proposal", digest) if self.checkpoints else None
+        if record is not None:
+            result = record["output"]
+        else:
+            result = self._write_final_proposal(project_data, review_notes)
+            if self.checkpoints:
+                self.checkpoints.put(workflow_id, "final_proposal", digest, result)
+        
+        # Parse the result and create the final proposal
+        try:
+            proposal_data = json.loads(result)
+        except json.JSONDecodeError:
+            # If the result isn't valid JSON, create a structured proposal
+            proposal_data = {
+                "executiveSummary": result,
+                "scopeOfWork": "See executive summary",
+                "technicalSpecifications": "See executive summary",
+                "complianceMatrix": "See executive summary",
+                "termsAndConditions": "See executive summary",
+                "paymentSchedule": "See executive summary",
+                "projectTimeline": "See executive summary"
+            }
+        
+        # Add metadata
+        proposal_data.update({
+            "projectId": project_id,
+            "version": "final",
+            "generatedAt": datetime.now().isoformat(),
+            "reviewNotes": review_notes
+        })
+        
+        return proposal_data
+        
+    def _write_final_proposal(self, project_data: Dict[str, Any], review_notes: Dict[str, str]) -> str:
         # Create the proposal agent
         proposal_agent = self.create_proposal_generator_agent()
         
@@ -345,29 +479,4 @@ class AgentService:
         )
         
         # Execute the task
-        result = proposal_agent.execute(proposal_task)
-        
-        # Parse the result and create the final proposal
-        try:
-            proposal_data = json.loads(result)
-        except json.JSONDecodeError:
-            # If the result isn't valid JSON, create a structured proposal
-            proposal_data = {
-                "executiveSummary": result,
-                "scopeOfWork": "See executive summary",
-                "technicalSpecifications": "See executive summary",
-                "complianceMatrix": "See executive summary",
-                "termsAndConditions": "See executive summary",
-                "paymentSchedule": "See executive summary",
-                "projectTimeline": "See executive summary"
-            }
-        
-        # Add metadata
-        proposal_data.update({
-            "projectId": project_id,
-            "version": "final",
-            "generatedAt": datetime.now().isoformat(),
-            "reviewNotes": review_notes
-        })
-        
-        return proposal_data 
\ No newline at end of file
+        return proposal_agent.execute(proposal_task)
@@ -0,0 +1,151 @@
+"""
+Step-level checkpoints for agent workflows.
+
+Each finished step's output is stored under (workflow_id, step, input hash).
+The hash covers everything the step consumed: its own input (such as the
+document it parses) and the outputs of the steps it depends on. A rerun of
+the same workflow finds the outputs of steps that already succeeded and skips
+their LLM calls, while any step whose inputs changed runs again. Checkpoints
+are small JSON files on local disk, or Redis keys when workers must share
+them.
+
+Local checkpoints are removed when they are read after their TTL, when a
+step is checkpointed again with new inputs, and when the workflow finishes.
+Workflow ids can come from clients, so both stores key a workflow by the
+hash of its id rather than the id itself.
+"""
+import hashlib
+import json
+import os
+import re
+import time
+from abc import ABC, abstractmethod
+from typing import Any, Dict, Optional
+from urllib.parse import quote
+
+from ..config import CHECKPOINT_CONFIG
+
+
+# Names of the checkpoint files LocalCheckpointStore writes: <quoted step>.<sha256>.json
+_CHECKPOINT_FILE = re.compile(r"[^/]+\.[0-9a-f]{64}\.json")
+
+
+def input_hash(payload: Any) -> str:
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode()).hexdigest()
+
+
+def _workflow_key(workflow_id: str) -> str:
+    """Fixed-alphabet name for a workflow, safe as a path component and in key patterns."""
+    return hashlib.sha256(workflow_id.encode()).hexdigest()
+
+
+class CheckpointStore(ABC):
+    @abstractmethod
+    def get(self, workflow_id: str, step: str, digest: str) -> Optional[Dict[str, Any]]:
+        """
+        Stored checkpoint for a step run with the given inputs
+
+        Returns:
+            ``{"output", "created_at"}`` or None when the step has not completed with these inputs
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def put(self, workflow_id: str, step: str, digest: str, output: Any) -> None:
+        raise NotImplementedError
+
+    @abstractmethod
+    def clear(self, workflow_id: str) -> None:
+        raise NotImplementedError
+
+
+class LocalCheckpointStore(CheckpointStore):
+    """One JSON file per checkpoint under ``<root>/<sha256 of workflow_id>/``."""
+
+    def __init__(self, root: str, ttl_seconds: int):
+        self.root = root
+        self.ttl_seconds = ttl_seconds
+
+    def _dir(self, workflow_id: str) -> str:
+        return os.path.join(self.root, _workflow_key(workflow_id))
+
+    def _path(self, workflow_id: str, step: str, digest: str) -> str:
+        return os.path.join(self._dir(workflow_id), f"{quote(step, safe='')}.{digest}.json")
+
+    def get(self, workflow_id: str, step: str, digest: str) -> Optional[Dict[str, Any]]:
+        try:
+            with open(self._path(workflow_id, step, digest)) as f:
+                record = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+        if time.time() - record["created_at"] > self.ttl_seconds:
+            self._remove(self._path(workflow_id, step, digest))
+            return None
+        return record
+
+    def put(self, workflow_id: str, step: str, digest: str, output: Any) -> None:
+        directory = self._dir(workflow_id)
+        os.makedirs(directory, exist_ok=True)
+        path = self._path(workflow_id, step, digest)
+        with open(path + ".tmp", "w") as f:
+            json.dump({"output": output, "created_at": time.time()}, f, default=str)
+        os.replace(path + ".tmp", path)
+        # A step keeps only the checkpoint for its latest inputs
+        prefix = f"{quote(step, safe='')}."
+        for name in os.listdir(directory):
+            stale = name[len(prefix):-len(".json")]
+            if name.startswith(prefix) and name.endswith(".json") and "." not in stale and stale != digest:
+                self._remove(os.path.join(directory, name))
+
+    @staticmethod
+    def _remove(path: str) -> None:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+    def clear(self, workflow_id: str) -> None:
+        directory = self._dir(workflow_id)
+        if not os.path.isdir(directory):
+            return
+        for name in os.listdir(directory):
+            if _CHECKPOINT_FILE.fullmatch(name):
+                self._remove(os.path.join(directory, name))
+        try:
+            os.rmdir(directory)
+        except OSError:
+            pass  # Not empty: a put in progress, or files this store did not write
+
+
+class RedisCheckpointStore(CheckpointStore):
+    """Checkpoints shared by all workers; expired by Redis TTLs."""
+
+    def __init__(self, redis_url: str, ttl_seconds: int, prefix: str = "checkpoint:"):
+        import redis
+        self.client = redis.from_url(redis_url)
+        self.ttl_seconds = ttl_seconds
+        self.prefix = prefix
+
+    def _key(self, workflow_id: str, step: str, digest: str) -> str:
+        return f"{self.prefix}{_workflow_key(workflow_id)}:{step}:{digest}"
+
+    def get(self, workflow_id: str, step: str, digest: str) -> Optional[Dict[str, Any]]:
+        value = self.client.get(self._key(workflow_id, step, digest))
+        return json.loads(value) if value is not None else None
+
+    def put(self, workflow_id: str, step: str, digest: str, output: Any) -> None:
+        record = json.dumps({"output": output, "created_at": time.time()}, default=str)
+        self.client.set(self._key(workflow_id, step, digest), record, ex=self.ttl_seconds)
+
+    def clear(self, workflow_id: str) -> None:
+        keys = list(self.client.scan_iter(match=f"{self.prefix}{_workflow_key(workflow_id)}:*"))
+        if keys:
+            self.client.delete(*keys)
+
+
+def create_checkpoint_store(store_url: Optional[str] = None) -> CheckpointStore:
+    """Redis store for ``redis://`` URLs, otherwise a local directory."""
+    url = store_url or CHECKPOINT_CONFIG['store_url']
+    if url.startswith("redis"):
+        return RedisCheckpointStore(url, CHECKPOINT_CONFIG['ttl_seconds'])
+    return LocalCheckpointStore(url, CHECKPOINT_CONFIG['ttl_seconds'])
@@ -0,0 +1,228 @@
+"""
+Load documents straight from S3 without downloading them to temp files.
+
+PDF and DOCX parsers need random access. Both formats keep their index at the
+end of the file, so parsers seek around. ``S3RangeReader`` turns those seeks
+into ranged GETs of fixed-size blocks and keeps a few recent blocks cached.
+Text and CSV are decoded while the object body streams in. If ranged GETs are
+not available (for example a stand-in client without ``head_object``), the
+body is copied into a ``SpooledTemporaryFile``. It stays in memory up to
+DOCUMENT_SPOOL_MAX_BYTES and only then spills to disk. The client can be
+boto3 or anything with the same ``get_object``/``head_object`` calls
+(MinIO, LocalStack, moto).
+
+The documents produced match the LangChain loaders these functions replace:
+one per PDF page, one per CSV row, and one for DOCX and plain text.
+"""
+import codecs
+import csv
+import io
+from collections import OrderedDict
+from tempfile import SpooledTemporaryFile
+from typing import IO, Any, List, Optional, Tuple
+
+from langchain_core.documents import Document
+
+from ..config import DOCUMENT_LOADER_CONFIG
+
+PDF = "application/pdf"
+DOCX = "application/vnd.openxmlformats-officedocument.wordprocessingml.document"
+CSV = "text/csv"
+
+
+class S3RangeReader(io.RawIOBase):
+    """
+    Seekable read-only file over an S3 object, fetched in cached blocks.
+
+    Wrap it in ``io.BufferedReader`` for small reads.
+    """
+
+    def __init__(self, client: Any, bucket: str, key: str,
+                 size: Optional[int] = None,
+                 block_size: Optional[int] = None,
+                 cache_blocks: Optional[int] = None):
+        self.client = client
+        self.bucket = bucket
+        self.key = key
+        self.size = size if size is not None else client.head_object(Bucket=bucket, Key=key)["ContentLength"]
+        self.block_size = block_size or DOCUMENT_LOADER_CONFIG['block_size']
+        self.cache_blocks = cache_blocks or DOCUMENT_LOADER_CONFIG['cache_blocks']
+        self.requests = 0
+        self._position = 0
+        self._blocks: "OrderedDict[int, bytes]" = OrderedDict()
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def tell(self) -> int:
+        return self._position
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        if whence == io.SEEK_SET:
+            position = offset
+        elif whence == io.SEEK_CUR:
+            position = self._position + offset
+        elif whence == io.SEEK_END:
+            position = self.size + offset
+        else:
+            raise ValueError(f"Invalid whence: {whence}")
+        if position < 0:
+            raise ValueError("Negative seek position")
+        self._position = position
+        return position
+
+    def _block(self, index: int) -> bytes:
+        block = self._blocks.get(index)
+        if block is not None:
+            self._blocks.move_to_end(index)
+            return block
+        start = index * self.block_size
+        end = min(start + self.block_size, self.size) - 1
+        response = self.client.get_object(Bucket=self.bucket, Key=self.key, Range=f"bytes={start}-{end}")
+        block = response["Body"].read()
+        self.requests += 1
+        self._blocks[index] = block
+        if len(self._blocks) > self.cache_blocks:
+            self._blocks.popitem(last=False)
+        return block
+
+    def readinto(self, buffer) -> int:
+        view = memoryview(buffer).cast("B")
+        written = 0
+        while written < len(view) and self._position < self.size:
+            index, offset = divmod(self._position, self.block_size)
+            block = self._block(index)
+            count = min(len(view) - written, len(block) - offset)
+            view[written:written + count] = block[offset:offset + count]
+            written += count
+            self._position += count
+        return written
+
+
+class _BodyReader(io.RawIOBase):
+    """Forward-only raw stream over a ``get_object`` body that counts bytes read."""
+
+    def __init__(self, body: Any):
+        self.body = body
+        self.size = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        view = memoryview(buffer).cast("B")
+        data = self.body.read(len(view))
+        view[:len(data)] = data
+        self.size += len(data)
+        return len(data)
+
+
+def spool_object(client: Any, bucket: str, key: str,
+                 max_size: Optional[int] = None) -> Tuple[IO[bytes], int]:
+    """
+    Copy an object into a spooled temp file in blocks
+
+    Returns:
+        The file positioned at the start, and the object size
+    """
+    spool = SpooledTemporaryFile(max_size=max_size or DOCUMENT_LOADER_CONFIG['spool_max_size'])
+    body = client.get_object(Bucket=bucket, Key=key)["Body"]
+    size = 0
+    for block in iter(lambda: body.read(DOCUMENT_LOADER_CONFIG['block_size']), b""):
+        spool.write(block)
+        size += len(block)
+    spool.seek(0)
+    return spool, size
+
+
+def open_seekable(client: Any, bucket: str, key: str) -> Tuple[IO[bytes], int]:
+    """
+    Random-access stream over an object: ranged GETs when the client supports them,
+    otherwise a bounded spool
+
+    Returns:
+        The stream and the object size
+    """
+    if hasattr(client, "head_object"):
+        reader = S3RangeReader(client, bucket, key)
+        return io.BufferedReader(reader, buffer_size=64 * 1024), reader.size
+    return spool_object(client, bucket, key)
+
+
+def _load_pdf(stream: IO[bytes], source: str) -> List[Document]:
+    from pypdf import PdfReader
+
+    reader = PdfReader(stream)
+    return [
+        Document(page_content=page.extract_text(), metadata={"source": source, "page": number})
+        for number, page in enumerate(reader.pages)
+    ]
+
+
+def _load_docx(stream: IO[bytes], source: str) -> List[Document]:
+    import docx
+
+    document = docx.Document(stream)
+    parts = [paragraph.text for paragraph in document.paragraphs]
+    for table in document.tables:
+        for row in table.rows:
+            parts.append("\t".join(cell.text for cell in row.cells))
+    return [Document(page_content="\n".join(parts), metadata={"source": source})]
+
+
+def _csv_field(key: Optional[str], value: Any) -> str:
+    # DictReader files extra fields under a None key as a list, like CSVLoader
+    name = key.strip() if key is not None else key
+    if isinstance(value, list):
+        value = ",".join(item.strip() for item in value)
+    elif value is not None:
+        value = value.strip()
+    return f"{name}: {value if value is not None else ''}"
+
+
+def _load_csv(body: _BodyReader, source: str, encoding: str) -> List[Document]:
+    text = io.TextIOWrapper(io.BufferedReader(body), encoding=encoding, newline="")
+    return [
+        Document(
+            page_content="\n".join(_csv_field(k, v) for k, v in row.items()),
+            metadata={"source": source, "row": number}
+        )
+        for number, row in enumerate(csv.DictReader(text))
+    ]
+
+
+def _load_text(body: _BodyReader, source: str, encoding: str) -> List[Document]:
+    decoder = codecs.getincrementaldecoder(encoding)(errors="replace")
+    parts = [decoder.decode(block) for block in iter(lambda: body.read(DOCUMENT_LOADER_CONFIG['block_size']), b"")]
+    parts.append(decoder.decode(b"", final=True))
+    return [Document(page_content="".join(parts), metadata={"source": source})]
+
+
+def load_s3_document(client: Any, bucket: str, key: str, content_type: str,
+                     encoding: str = "utf-8") -> Tuple[List[Document], int]:
+    """
+    Parse an S3 object with the parser for its content type, without a local copy
+
+    Args:
+        client: Boto3 S3 client or a compatible stand-in
+        bucket: Bucket name
+        key: Object key
+        content_type: MIME type of the document
+        encoding: Encoding of text and CSV objects
+
+    Returns:
+        The loaded documents and the object size in bytes
+    """
+    source = f"s3://{bucket}/{key}"
+    if content_type in (PDF, DOCX):
+        stream, size = open_seekable(client, bucket, key)
+        with stream:
+            loader = _load_pdf if content_type == PDF else _load_docx
+            return loader(stream, source), size
+    body = _BodyReader(client.get_object(Bucket=bucket, Key=key)["Body"])
+    if content_type == CSV:
+        return _load_csv(body, source, encoding), body.size
+    return _load_text(body, source, encoding), body.size
@@ -1,6 +1,9 @@
-from typing import List, Dict, Any, Optional
-import os
-import tempfile
+from typing import List, Dict, Any, Optional, Tuple
+import json
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
 from langchain_community.document_loaders import (
     PyPDFLoader,
     Docx2txtLoader,
@@ -8,42 +11,172 @@ from langchain_community.document_loaders import (
     CSVLoader
 )
 from langchain.text_splitter import RecursiveCharacterTextSplitter
-from langchain_openai import OpenAIEmbeddings
-from langchain_community.vectorstores import Pinecone
-import pinecone
+from langchain.chains import LLMChain
+from langchain.prompts import PromptTemplate
 from ..models import ParsedDocument, DocumentType
-from ..config import LANGCHAIN_CONFIG, VECTOR_DB_CONFIG
+from ..config import (
+    LANGCHAIN_CONFIG,
+    EMBEDDING_CACHE_CONFIG,
+    LEXICAL_INDEX_CONFIG,
+    ENTITY_EXTRACTION_CONFIG,
+)
+from ..metrics import track_llm_call
+from .vector_store import (
+    CENTROID_KIND,
+    LocalVectorStore,
+    add_embeddings,
+    centroid_id,
+    create_vector_store,
+    document_centroid,
+    fetch_vectors,
+)
+from .embedding_cache import CachedEmbeddings
+from .document_loaders import load_s3_document
+from .lexical_index import LexicalIndex, fuse_results
+from .llm_provider import get_llm_provider
 from datetime import datetime
 import uuid
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Rough prompt-size estimate; close enough for budgeting without a tokenizer
+CHARS_PER_TOKEN = 4
+
+
+def _dedupe_key(value: Any) -> str:
+    if isinstance(value, str):
+        return " ".join(value.lower().split())
+    return json.dumps(value, sort_keys=True, default=str)
+
+
+def merge_extracted_entities(results: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Merge per-segment extraction results deterministically
+    
+    Lists (system_types, equipment, requirements, ...) are unioned in segment
+    order, dropping duplicates (strings compare case- and
+    whitespace-insensitively). Scalar values that differ between segments
+    become a list of the distinct values. Segments whose response could not
+    be parsed are skipped unless every segment failed.
+    
+    Args:
+        results: Parsed JSON objects, one per segment, in document order
+        
+    Returns:
+        A single entities dictionary
+    """
+    parsed = [result for result in results if isinstance(result, dict) and "error" not in result]
+    if not parsed:
+        return results[0] if results else {}
+    merged: Dict[str, List[Any]] = {}
+    seen: Dict[str, set] = {}
+    scalar_keys = set()
+    for result in parsed:
+        for key, value in result.items():
+            values = value if isinstance(value, list) else [value]
+            if not isinstance(value, list):
+                scalar_keys.add(key)
+            bucket = merged.setdefault(key, [])
+            keys = seen.setdefault(key, set())
+            for item in values:
+                if item in (None, "", [], {}):
+                    continue
+                item_key = _dedupe_key(item)
+                if item_key not in keys:
+                    keys.add(item_key)
+                    bucket.append(item)
+    return {
+        key: values[0] if key in scalar_keys and len(values) == 1 else values
+        for key, values in merged.items()
+    }
+
+
+# Entity extraction prompt per document type; each is compiled into a PromptTemplate once
+EXTRACTION_TEMPLATES = {
+    DocumentType.DRAWING: """
+Extract the following information from the drawing text:
+1. System types mentioned (Fire Alarm, Fire Suppression, Access Control, CCTV, Intrusion Detection)
+2. Building areas covered
+3. Equipment types and quantities
+4. Any specific requirements or notes
+
+Text: {text}
+
+Format your response as a JSON object with these keys: system_types, building_areas, equipment, requirements
+""",
+    DocumentType.SPECIFICATION: """
+Extract the following information from the specification text:
+1. System types specified (Fire Alarm, Fire Suppression, Access Control, CCTV, Intrusion Detection)
+2. Required manufacturers or models
+3. Performance requirements
+4. Testing and commissioning requirements
+5. Warranty requirements
+
+Text: {text}
+
+Format your response as a JSON object with these keys: system_types, manufacturers, performance, testing, warranty
+""",
+    DocumentType.SCOPE_OF_WORK: """
+Extract the following information from the scope of work:
+1. System types included (Fire Alarm, Fire Suppression, Access Control, CCTV, Intrusion Detection)
+2. Areas to be covered
+3. Special requirements
+4. Timeline or schedule information
+5. Customer responsibilities
+
+Text: {text}
+
+Format your response as a JSON object with these keys: system_types, areas, special_requirements, timeline, customer_responsibilities
+""",
+}
+
+DEFAULT_EXTRACTION_TEMPLATE = """
+Extract the following information from the text:
+1. System types mentioned (Fire Alarm, Fire Suppression, Access Control, CCTV, Intrusion Detection)
+2. Any specific requirements or notes
+3. Important dates or deadlines
+4. Contact information
+
+Text: {text}
+
+Format your response as a JSON object with these keys: system_types, requirements, dates, contacts
+"""
+
+
+@lru_cache(maxsize=None)
+def extraction_prompt(document_type: DocumentType) -> PromptTemplate:
+    template = EXTRACTION_TEMPLATES.get(document_type, DEFAULT_EXTRACTION_TEMPLATE)
+    return PromptTemplate(template=template, input_variables=["text"])
+
 
 class DocumentService:
     def __init__(self, openai_api_key: str):
         self.openai_api_key = openai_api_key
-        self.embeddings = OpenAIEmbeddings(openai_api_key=openai_api_key)
+        self.llm_provider = get_llm_provider(openai_api_key)
+        embeddings_model = LANGCHAIN_CONFIG.get('embeddings_model', 'text-embedding-ada-002')
+        self.embeddings = self.llm_provider.embeddings(embeddings_model)
+        if EMBEDDING_CACHE_CONFIG['enabled']:
+            # Repeated boilerplate chunks are embedded once and reused across documents
+            self.embeddings = CachedEmbeddings(self.embeddings, namespace=embeddings_model)
         self.text_splitter = RecursiveCharacterTextSplitter(
             chunk_size=LANGCHAIN_CONFIG.get('chunk_size', 1000),
             chunk_overlap=LANGCHAIN_CONFIG.get('chunk_overlap', 200)
         )
-        
-        # Initialize Pinecone
-        pinecone.init(
-            api_key=VECTOR_DB_CONFIG.get('api_key', ''),
-            environment=VECTOR_DB_CONFIG.get('environment', '')
+        self.extraction_splitter = RecursiveCharacterTextSplitter(
+            chunk_size=ENTITY_EXTRACTION_CONFIG['segment_chars'],
+            chunk_overlap=ENTITY_EXTRACTION_CONFIG['segment_overlap']
         )
         
-        # Create index if it doesn't exist
-        index_name = VECTOR_DB_CONFIG.get('index_name', 'estimator-ai')
-        if index_name not in pinecone.list_indexes():
-            pinecone.create_index(
-                name=index_name,
-                dimension=1536,  # OpenAI embeddings dimension
-                metric="cosine"
-            )
-            
-        self.vector_store = Pinecone.from_existing_index(
-            index_name=index_name,
-            embedding=self.embeddings
-        )
+        # Local in-process index or Pinecone, per VECTOR_DB_PROVIDER
+        self.vector_store = create_vector_store(self.embeddings)
+        # BM25 index for exact tokens (code sections, model and room numbers)
+        self.lexical_index = LexicalIndex()
+        
+        # Extraction LLM and chains, built on first use and reused
+        self._llm = None
+        self._chains: Dict[DocumentType, Any] = {}
+        self._chain_lock = threading.Lock()
         
     def load_document(self, file_path: str, content_type: str) -> List[Any]:
         """
@@ -93,64 +226,120 @@ class DocumentService:
         Returns:
             ParsedDocument object with extracted information
         """
-        # Download the file from S3
-        with tempfile.NamedTemporaryFile(delete=False) as temp_file:
-            s3_client.download_file(s3_bucket, s3_key, temp_file.name)
-            temp_file_path = temp_file.name
-            
-        try:
-            # Load the document
-            document = self.load_document(temp_file_path, content_type)
-            
-            # Split the document into chunks
-            chunks = self.text_splitter.split_documents(document)
-            
-            # Get the full text content
-            text_content = "\n\n".join([chunk.page_content for chunk in chunks])
-            
-            # Extract entities using LLM
-            extracted_entities = self.extract_entities(text_content, document_type)
-            
-            # Add to vector store with metadata
-            metadata = {
-                "document_id": document_id,
-                "filename": filename,
-                "content_type": content_type,
-                "document_type": document_type.value,
-                "s3_key": s3_key,
-                "project_id": project_id if project_id else ""
-            }
+        # Parse straight from S3: ranged reads for PDF/DOCX, streamed bodies otherwise
+        document, size = load_s3_document(s3_client, s3_bucket, s3_key, content_type)
+        
+        # Split the document into chunks
+        chunks = self.text_splitter.split_documents(document)
+        
+        # Get the full text content
+        text_content = "\n\n".join([chunk.page_content for chunk in chunks])
+        
+        # Extract entities using LLM
+        extracted_entities = self.extract_entities(text_content, document_type)
+        
+        # Add to vector store with metadata
+        metadata = {
+            "document_id": document_id,
+            "filename": filename,
+            "content_type": content_type,
+            "document_type": document_type.value,
+            "s3_key": s3_key,
+            "project_id": project_id if project_id else ""
+        }
+        
+        ids = [f"{document_id}-chunk-{i}" for i in range(len(chunks))]
+        texts = [chunk.page_content for chunk in chunks]
+        metadatas = [metadata for _ in range(len(chunks))]
+        
+        # Embed once; the chunk vectors also give the document's centroid entry
+        vectors = self.embeddings.embed_documents(texts) if texts else []
+        if vectors:
+            add_embeddings(
+                self.vector_store,
+                vectors + [document_centroid(vectors)],
+                texts + [texts[0]],
+                metadatas + [{**metadata, "kind": CENTROID_KIND}],
+                ids + [centroid_id(document_id)]
+            )
+        self.lexical_index.add_texts(texts=texts, metadatas=metadatas, ids=ids, project_id=project_id)
+        
+        # Create the parsed document record
+        parsed_document = ParsedDocument(
+            document_id=document_id,
+            document_type=document_type,
+            filename=filename,
+            content_type=content_type,
+            size=size,
+            s3_key=s3_key,
+            text_content=text_content,
+            extracted_entities=extracted_entities,
+            created_date=datetime.now(),
+            project_id=project_id
+        )
+        
+        return parsed_document
             
-            ids = [f"{document_id}-chunk-{i}" for i in range(len(chunks))]
-            texts = [chunk.page_content for chunk in chunks]
-            metadatas = [metadata for _ in range(len(chunks))]
+    def _extraction_chain(self, document_type: DocumentType) -> Any:
+        """
+        LLM chain that extracts entities for a document type
+        
+        Chains are built once per document type and share one LLM client,
+        whose HTTP connections are pooled across calls.
+        
+        Args:
+            document_type: Type of document
             
-            self.vector_store.add_texts(texts=texts, metadatas=metadatas, ids=ids)
+        Returns:
+            LLMChain taking the document text as its only input
+        """
+        with self._chain_lock:
+            chain = self._chains.get(document_type)
+            if chain is None:
+                if self._llm is None:
+                    self._llm = self.llm_provider.completion_model("gpt-4o", temperature=0)
+                chain = LLMChain(llm=self._llm, prompt=extraction_prompt(document_type))
+                self._chains[document_type] = chain
+            return chain
+        
+    def _extract_segment(self, chain: Any, text: str) -> Dict[str, Any]:
+        with track_llm_call("extract_entities"):
+            response = chain.run(text)
+        
+        # Parse the response as JSON
+        try:
+            return json.loads(response)
+        except json.JSONDecodeError:
+            return {"error": "Failed to parse LLM response as JSON", "raw_response": response}
             
-            # Create the parsed document record
-            parsed_document = ParsedDocument(
-                document_id=document_id,
-                document_type=document_type,
-                filename=filename,
-                content_type=content_type,
-                size=os.path.getsize(temp_file_path),
-                s3_key=s3_key,
-                text_content=text_content,
-                extracted_entities=extracted_entities,
-                created_date=datetime.now(),
-                project_id=project_id
+    def _extraction_segments(self, text_content: str) -> Tuple[List[str], int]:
+        """Split text into segments; returns those that fit the token budget and the total count."""
+        segments = self.extraction_splitter.split_text(text_content)
+        budget = ENTITY_EXTRACTION_CONFIG['token_budget']
+        kept, spent = [], 0
+        for segment in segments:
+            tokens = len(segment) // CHARS_PER_TOKEN + 1
+            if kept and spent + tokens > budget:
+                break
+            kept.append(segment)
+            spent += tokens
+        if len(kept) < len(segments):
+            logger.warning(
+                "Entity extraction token budget (%d) reached; extracting %d of %d segments",
+                budget, len(kept), len(segments)
             )
-            
-            return parsed_document
-            
-        finally:
-            # Clean up the temporary file
-            os.unlink(temp_file_path)
+        return kept, len(segments)
             
     def extract_entities(self, text_content: str, document_type: DocumentType) -> Dict[str, Any]:
         """
         Extract entities from document text using LLM
         
+        In map-reduce mode the whole text is split into segments that are
+        extracted concurrently (up to EXTRACTION_MAX_CONCURRENCY calls, within
+        EXTRACTION_TOKEN_BUDGET) and merged with merge_extracted_entities, so
+        equipment and requirements deep in a spec book are kept. If segments
+        are dropped for the budget, the result reports the coverage.
+        
         Args:
             text_content: Document text content
             document_type: Type of document
@@ -158,84 +347,30 @@ class DocumentService:
         Returns:
             Dictionary of extracted entities
         """
-        from langchain.llms import OpenAI
-        from langchain.chains import LLMChain
-        from langchain.prompts import PromptTemplate
-        
-        # Create a prompt template based on document type
-        if document_type == DocumentType.DRAWING:
-            template = """
-            Extract the following information from the drawing text:
-            1. System types mentioned (Fire Alarm, Fire Suppression, Access Control, CCTV, Intrusion Detection)
-            2. Building areas covered
-            3. Equipment types and quantities
-            4. Any specific requirements or notes
-            
-            Text: {text}
-            
-            Format your response as a JSON object with these keys: system_types, building_areas, equipment, requirements
-            """
-        elif document_type == DocumentType.SPECIFICATION:
-            template = """
-            Extract the following information from the specification text:
-            1. System types specified (Fire Alarm, Fire Suppression, Access Control, CCTV, Intrusion Detection)
-            2. Required manufacturers or models
-            3. Performance requirements
-            4. Testing and commissioning requirements
-            5. Warranty requirements
-            
-            Text: {text}
-            
-            Format your response as a JSON object with these keys: system_types, manufacturers, performance, testing, warranty
-            """
-        elif document_type == DocumentType.SCOPE_OF_WORK:
-            template = """
-            Extract the following information from the scope of work:
-            1. System types included (Fire Alarm, Fire Suppression, Access Control, CCTV, Intrusion Detection)
-            2. Areas to be covered
-            3. Special requirements
-            4. Timeline or schedule information
-            5. Customer responsibilities
-            
-            Text: {text}
-            
-            Format your response as a JSON object with these keys: system_types, areas, special_requirements, timeline, customer_responsibilities
-            """
-        else:
-            template = """
-            Extract the following information from the text:
-            1. System types mentioned (Fire Alarm, Fire Suppression, Access Control, CCTV, Intrusion Detection)
-            2. Any specific requirements or notes
-            3. Important dates or deadlines
-            4. Contact information
-            
-            Text: {text}
-            
-            Format your response as a JSON object with these keys: system_types, requirements, dates, contacts
-            """
-            
-        prompt = PromptTemplate(template=template, input_variables=["text"])
-        
-        # Create an LLM chain
-        llm = OpenAI(temperature=0, model_name="gpt-4o", openai_api_key=self.openai_api_key)
-        chain = LLMChain(llm=llm, prompt=prompt)
+        chain = self._extraction_chain(document_type)
+        if ENTITY_EXTRACTION_CONFIG['mode'] != 'map_reduce':
+            # Use a truncated version of the text to stay within token limits
+            return self._extract_segment(chain, text_content[:ENTITY_EXTRACTION_CONFIG['truncate_chars']])
         
-        # Run the chain to extract entities
-        # Use a truncated version of the text to stay within token limits
-        truncated_text = text_content[:10000]  # Adjust as needed
-        response = chain.run(truncated_text)
+        segments, total = self._extraction_segments(text_content)
+        if len(segments) <= 1:
+            return self._extract_segment(chain, segments[0] if segments else text_content)
         
-        # Parse the response as JSON
-        import json
-        try:
-            return json.loads(response)
-        except json.JSONDecodeError:
-            return {"error": "Failed to parse LLM response as JSON", "raw_response": response}
+        workers = min(ENTITY_EXTRACTION_CONFIG['max_concurrency'], len(segments))
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(lambda segment: self._extract_segment(chain, segment), segments))
+        entities = merge_extracted_entities(results)
+        if len(segments) < total:
+            entities["coverage"] = {"segments": total, "extracted": len(segments)}
+        return entities
             
     def search_documents(self, query: str, project_id: Optional[str] = None, limit: int = 5) -> List[Dict[str, Any]]:
         """
         Search for documents matching a query
         
+        Vector and BM25 candidates are fused, so both paraphrases and exact
+        tokens such as "NFPA 72" or model numbers rank well.
+        
         Args:
             query: Search query
             project_id: Optional project ID to filter results
@@ -244,17 +379,18 @@ class DocumentService:
         Returns:
             List of matching document chunks with relevance scores
         """
-        filter_dict = {}
+        filter_dict = {"kind": {"$ne": CENTROID_KIND}}
         if project_id:
             filter_dict["project_id"] = project_id
             
+        # Over-fetch from both retrievers so fusion can promote hits ranked low by one of them
+        candidates = limit * LEXICAL_INDEX_CONFIG['candidates']
         results = self.vector_store.similarity_search_with_score(
             query=query,
-            k=limit,
-            filter=filter_dict if filter_dict else None
+            k=candidates,
+            filter=filter_dict
         )
-        
-        return [
+        vector_hits = [
             {
                 "content": result[0].page_content,
                 "metadata": result[0].metadata,
@@ -262,46 +398,63 @@ class DocumentService:
             }
             for result in results
         ]
+        lexical_hits = self.lexical_index.search(query, project_id=project_id, k=candidates)
+        
+        return fuse_results(vector_hits, lexical_hits, limit=limit)
         
-    def get_related_documents(self, document_id: str, limit: int = 5) -> List[Dict[str, Any]]:
+    def get_related_documents(self, document_id: str, limit: int = 5, max_sim: bool = False) -> List[Dict[str, Any]]:
         """
         Get documents related to a specific document
         
+        Uses the document's stored centroid vector, so no embedding call is
+        made. With ``max_sim``, more candidates are fetched and re-ranked by
+        comparing every chunk pair: each chunk of this document is matched
+        to its closest chunk in the candidate and the similarities are
+        averaged. Re-ranking needs the local vector store; other backends
+        keep the centroid ranking.
+        
         Args:
             document_id: Document ID to find related documents for
             limit: Maximum number of results to return
+            max_sim: Re-rank candidates by multi-chunk max-sim scoring
             
         Returns:
-            List of related document chunks with relevance scores
+            List of related documents (centroid entries) with relevance scores
         """
-        # First, get the document's text to use as query
-        filter_dict = {"document_id": document_id}
-        results = self.vector_store.similarity_search(
-            query="",  # Empty query to get by filter
-            k=1,
-            filter=filter_dict
-        )
-        
-        if not results:
+        local = isinstance(self.vector_store, LocalVectorStore)
+        centroid = fetch_vectors(self.vector_store, [centroid_id(document_id)]).get(centroid_id(document_id))
+        chunk_filter = {"document_id": document_id, "kind": {"$ne": CENTROID_KIND}}
+        if centroid is None and local:
+            # Indexed before centroids were stored
+            _, chunk_vectors = self.vector_store.get_vectors(filter=chunk_filter)
+            if len(chunk_vectors):
+                centroid = document_centroid(chunk_vectors)
+        if centroid is None:
             return []
-            
-        # Use the document's text as query to find similar documents
-        query_text = results[0].page_content
-        
-        # Exclude the original document from results
-        filter_dict = {"document_id": {"$ne": document_id}}
         
-        results = self.vector_store.similarity_search_with_score(
-            query=query_text,
-            k=limit,
-            filter=filter_dict
+        rerank = max_sim and local
+        results = self.vector_store.similarity_search_by_vector_with_score(
+            embedding=centroid,
+            k=limit * LEXICAL_INDEX_CONFIG['candidates'] if rerank else limit,
+            filter={"kind": CENTROID_KIND, "document_id": {"$ne": document_id}}
         )
-        
-        return [
+        related = [
             {
                 "content": result[0].page_content,
                 "metadata": result[0].metadata,
                 "score": result[1]
             }
             for result in results
-        ] 
\ No newline at end of file
+        ]
+        
+        if rerank and related:
+            _, source = self.vector_store.get_vectors(filter=chunk_filter)
+            for entry in related:
+                _, candidate = self.vector_store.get_vectors(filter={
+                    "document_id": entry["metadata"]["document_id"], "kind": {"$ne": CENTROID_KIND}
+                })
+                if len(source) and len(candidate):
+                    entry["score"] = float(np.max(source @ candidate.T, axis=1).mean())
+            related.sort(key=lambda entry: entry["score"], reverse=True)
+        
+        return related[:limit]
@@ -0,0 +1,108 @@
+"""
+Persistent cache in front of an embeddings provider.
+
+Spec books repeat a lot of boilerplate (general conditions, NFPA
+references), so many chunks embed to the same vector. Embeddings are cached
+in SQLite under the SHA-256 of the whitespace-normalized text and the model
+name. Only misses are sent to the provider. Misses are deduplicated, split
+into batches of the provider's maximum size and embedded concurrently.
+"""
+import hashlib
+import re
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+
+from ..config import EMBEDDING_CACHE_CONFIG
+from ..metrics import record_cache_lookup, track_llm_call
+
+_WHITESPACE = re.compile(r"\s+")
+
+# SQLite limits the number of bound parameters per statement
+_LOOKUP_CHUNK = 500
+
+
+def normalize_text(text: str) -> str:
+    return _WHITESPACE.sub(" ", text).strip()
+
+
+class CachedEmbeddings:
+    """
+    Embeddings wrapper with a persistent cache, batching and bounded concurrency.
+
+    Exposes ``embed_documents`` and ``embed_query`` so it can be passed
+    wherever a LangChain ``Embeddings`` object is expected.
+    """
+
+    def __init__(self, embeddings: Any, namespace: str,
+                 path: Optional[str] = None,
+                 batch_size: Optional[int] = None,
+                 max_concurrency: Optional[int] = None):
+        self.embeddings = embeddings
+        self.namespace = namespace
+        self.batch_size = batch_size or EMBEDDING_CACHE_CONFIG['batch_size']
+        self.max_concurrency = max_concurrency or EMBEDDING_CACHE_CONFIG['max_concurrency']
+        self._conn = sqlite3.connect(path or EMBEDDING_CACHE_CONFIG['path'], check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS embeddings (key TEXT PRIMARY KEY, vector BLOB NOT NULL)")
+        self._lock = threading.Lock()
+
+    def _key(self, text: str) -> str:
+        return hashlib.sha256(f"{self.namespace}\0{normalize_text(text)}".encode()).hexdigest()
+
+    def _lookup(self, keys: Sequence[str]) -> Dict[str, List[float]]:
+        found: Dict[str, List[float]] = {}
+        unique = list(dict.fromkeys(keys))
+        with self._lock:
+            for start in range(0, len(unique), _LOOKUP_CHUNK):
+                chunk = unique[start:start + _LOOKUP_CHUNK]
+                rows = self._conn.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({','.join('?' * len(chunk))})", chunk
+                ).fetchall()
+                for key, blob in rows:
+                    found[key] = np.frombuffer(blob, dtype=np.float32).tolist()
+        return found
+
+    def _store(self, vectors: Dict[str, List[float]]) -> None:
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (key, vector) VALUES (?, ?)",
+                [(key, np.asarray(vector, dtype=np.float32).tobytes()) for key, vector in vectors.items()]
+            )
+            self._conn.commit()
+
+    def _embed_batch(self, texts: List[str]) -> List[List[float]]:
+        with track_llm_call("embed_documents"):
+            return self.embeddings.embed_documents(texts)
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        keys = [self._key(text) for text in texts]
+        cached = self._lookup(keys)
+        # One provider call per distinct missing text, even if it repeats within the request
+        missing: Dict[str, str] = {}
+        for key, text in zip(keys, texts):
+            if key not in cached and key not in missing:
+                missing[key] = text
+        hits = sum(1 for key in keys if key in cached)
+        record_cache_lookup("embeddings", True, count=hits)
+        record_cache_lookup("embeddings", False, count=len(keys) - hits)
+
+        if missing:
+            missing_keys = list(missing)
+            batches = [missing_keys[i:i + self.batch_size] for i in range(0, len(missing_keys), self.batch_size)]
+            with ThreadPoolExecutor(max_workers=min(self.max_concurrency, len(batches))) as pool:
+                results = pool.map(lambda batch: self._embed_batch([missing[key] for key in batch]), batches)
+                computed = {key: vector for batch, vectors in zip(batches, results) for key, vector in zip(batch, vectors)}
+            self._store(computed)
+            cached.update(computed)
+        return [cached[key] for key in keys]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_documents([text])[0]
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
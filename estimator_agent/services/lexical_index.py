@@ -0,0 +1,360 @@
+"""
+BM25 inverted index over document chunks, sharded per project.
+
+Embeddings rank exact tokens such as "NFPA 72", model numbers and room
+numbers poorly, so chunks are also indexed lexically when a document is
+processed. Each project gets its own shard. A search therefore only reads the
+postings of the query's tokens within one project, and shards are loaded from
+disk the first time they are used. ``fuse_results`` combines the lexical hits
+with vector-store hits into one ranking.
+
+A shard is stored as a pickled snapshot plus an append-only log of the
+chunks added since. Indexing a document appends one record to the log; the
+snapshot is only rewritten when chunks are replaced or deleted, or once the
+log holds more chunks than the snapshot.
+
+A search across all projects scores every shard with IDF computed over the
+combined corpus, so scores from different shards can be ranked together.
+Document lengths are still normalized against each shard's own average.
+"""
+import math
+import os
+import pickle
+import re
+import threading
+from array import array
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+from urllib.parse import quote, unquote
+
+import numpy as np
+
+from ..config import LEXICAL_INDEX_CONFIG
+
+# Keeps joined identifiers such as "fx-2000", "2.1.3" and "b/101" as one token
+_TOKEN = re.compile(r"[a-z0-9]+(?:[-./][a-z0-9]+)*")
+_JOINERS = re.compile(r"[-./]")
+
+# Shard used for chunks that do not belong to a project
+UNASSIGNED = ""
+
+# Chunks added since a shard's last snapshot
+LOG_EXTENSION = ".log"
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase word tokens; joined identifiers also yield their parts."""
+    tokens = []
+    for token in _TOKEN.findall(text.lower()):
+        tokens.append(token)
+        if _JOINERS.search(token):
+            tokens.extend(_JOINERS.split(token))
+    return tokens
+
+
+def _idf(count: int, frequency: int) -> float:
+    return math.log(1 + (count - frequency + 0.5) / (frequency + 0.5))
+
+
+class _Shard:
+    """Postings and chunk data for one project."""
+
+    def __init__(self):
+        self.ids: List[str] = []
+        self.texts: List[str] = []
+        self.metadatas: List[Dict[str, Any]] = []
+        self.lengths: List[int] = []
+        self.total_length = 0
+        self.rows: Dict[str, int] = {}
+        # Chunks in the shard's log file rather than its snapshot
+        self.logged = 0
+        # token -> (rows, term frequencies); rows are appended in increasing order.
+        # Typed arrays keep a posting at 6 bytes instead of two Python ints.
+        self.postings: Dict[str, Tuple[array, array]] = {}
+        # token -> (rows, BM25 term weight); valid for the current corpus and (k1, b)
+        self._impacts: Dict[str, Tuple[np.ndarray, np.ndarray]] = {}
+        self._impact_params: Optional[Tuple[float, float]] = None
+        self._norms: Optional[np.ndarray] = None
+
+    def __getstate__(self) -> Dict[str, Any]:
+        state = self.__dict__.copy()
+        state["_impacts"], state["_impact_params"], state["_norms"] = {}, None, None
+        state["logged"] = 0
+        return state
+
+    def add(self, chunk_id: str, text: str, metadata: Dict[str, Any]) -> None:
+        row = len(self.ids)
+        counts: Dict[str, int] = {}
+        for token in tokenize(text):
+            counts[token] = counts.get(token, 0) + 1
+        for token, count in counts.items():
+            posting = self.postings.get(token)
+            if posting is None:
+                posting = self.postings[token] = (array("I"), array("H"))
+            posting[0].append(row)
+            posting[1].append(min(count, 0xFFFF))
+        length = sum(counts.values())
+        self.ids.append(chunk_id)
+        self.texts.append(text)
+        self.metadatas.append(metadata)
+        self.lengths.append(length)
+        self.total_length += length
+        self.rows[chunk_id] = row
+        # The average length changes, so every cached term weight is stale
+        self._impact_params = None
+
+    def _impact(self, token: str, k1: float, b: float) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+        """Rows containing ``token`` and their length-normalized BM25 term weights."""
+        if self._impact_params != (k1, b):
+            lengths = np.asarray(self.lengths, dtype=np.float32)
+            average = self.total_length / len(self.ids) or 1.0
+            self._norms = k1 * (1 - b + b * lengths / average)
+            self._impacts = {}
+            self._impact_params = (k1, b)
+        impact = self._impacts.get(token)
+        if impact is None:
+            posting = self.postings.get(token)
+            if posting is None:
+                return None
+            rows = np.frombuffer(posting[0], dtype=np.uint32).astype(np.intp)
+            frequencies = np.frombuffer(posting[1], dtype=np.uint16).astype(np.float32)
+            impact = (rows, frequencies * (k1 + 1) / (frequencies + self._norms[rows]))
+            self._impacts[token] = impact
+        return impact
+
+    def document_frequency(self, token: str) -> int:
+        posting = self.postings.get(token)
+        return len(posting[0]) if posting is not None else 0
+
+    def search(self, tokens: Sequence[str], k: int, k1: float, b: float,
+               idf: Optional[Dict[str, float]] = None) -> List[Tuple[int, float]]:
+        """Top ``k`` rows by BM25; ``idf`` overrides this shard's own term weights."""
+        count = len(self.ids)
+        if not count or not tokens:
+            return []
+        accumulated = None
+        for token in set(tokens):
+            impact = self._impact(token, k1, b)
+            if impact is None:
+                continue
+            rows, weights = impact
+            if idf is not None:
+                token_idf = idf[token]
+            else:
+                token_idf = _idf(count, len(rows))
+            if accumulated is None:
+                accumulated = np.zeros(count, dtype=np.float32)
+            accumulated[rows] += np.float32(token_idf) * weights
+        if accumulated is None:
+            return []
+        if count > k:
+            candidates = np.argpartition(-accumulated, k - 1)[:k]
+            candidates = candidates[accumulated[candidates] > 0]
+        else:
+            candidates = np.flatnonzero(accumulated)
+        ranked = candidates[np.argsort(-accumulated[candidates])]
+        return [(int(row), float(accumulated[row])) for row in ranked]
+
+
+class LexicalIndex:
+    """
+    Per-project BM25 index with a snapshot and a log file per shard under ``path``.
+
+    Shards are only read from disk when a project is first searched or
+    written to.
+    """
+
+    def __init__(self, path: Optional[str] = None,
+                 k1: Optional[float] = None,
+                 b: Optional[float] = None):
+        self.path = path if path is not None else LEXICAL_INDEX_CONFIG['path']
+        self.k1 = k1 if k1 is not None else LEXICAL_INDEX_CONFIG['k1']
+        self.b = b if b is not None else LEXICAL_INDEX_CONFIG['b']
+        self._shards: Dict[str, _Shard] = {}
+        self._lock = threading.Lock()
+
+    def _shard_path(self, project_id: str, extension: str = ".pkl") -> str:
+        return os.path.join(self.path, f"{quote(project_id or '_unassigned', safe='')}{extension}")
+
+    def _shard(self, project_id: str) -> _Shard:
+        shard = self._shards.get(project_id)
+        if shard is None:
+            shard = self._load(project_id) if self.path else _Shard()
+            self._shards[project_id] = shard
+        return shard
+
+    def _load(self, project_id: str) -> _Shard:
+        # Shards are written only by this process, never from uploads
+        shard_path = self._shard_path(project_id)
+        shard = _Shard()
+        if os.path.exists(shard_path):
+            with open(shard_path, "rb") as f:
+                shard = pickle.load(f)
+            shard.logged = 0
+        log_path = self._shard_path(project_id, LOG_EXTENSION)
+        if not os.path.exists(log_path):
+            return shard
+        size = os.path.getsize(log_path)
+        torn = False
+        with open(log_path, "rb") as f:
+            while f.tell() < size:
+                try:
+                    ids, texts, metadatas = pickle.load(f)
+                except (EOFError, pickle.UnpicklingError, ValueError):
+                    torn = True
+                    break
+                for chunk_id, text, metadata in zip(ids, texts, metadatas):
+                    shard.add(chunk_id, text, metadata)
+                shard.logged += len(ids)
+        if torn:
+            # A record cut short by a crash mid-append; keep the records before it
+            self._save(project_id, shard)
+        return shard
+
+    def _project_ids(self) -> List[str]:
+        project_ids = set(self._shards)
+        if self.path and os.path.isdir(self.path):
+            for name in os.listdir(self.path):
+                stem, extension = os.path.splitext(name)
+                if extension in (".pkl", LOG_EXTENSION):
+                    project_id = unquote(stem)
+                    project_ids.add(UNASSIGNED if project_id == "_unassigned" else project_id)
+        return sorted(project_ids)
+
+    def add_texts(self, texts: Iterable[str], metadatas: List[Dict[str, Any]], ids: List[str],
+                  project_id: Optional[str] = None) -> None:
+        """Index chunks in the project's shard, replacing chunks with the same ids."""
+        project_id = project_id or UNASSIGNED
+        texts = list(texts)
+        with self._lock:
+            shard = self._shard(project_id)
+            replaced = any(chunk_id in shard.rows for chunk_id in ids)
+            if replaced:
+                shard = self._rebuild(shard, exclude=set(ids))
+                self._shards[project_id] = shard
+            for chunk_id, text, metadata in zip(ids, texts, metadatas):
+                shard.add(chunk_id, text, metadata)
+            # Snapshot once the log would outgrow it, so replaying stays cheap
+            snapshot = len(shard.ids) - shard.logged - len(ids)
+            if replaced or shard.logged + len(ids) > snapshot:
+                self._save(project_id, shard)
+            else:
+                self._append(project_id, shard, ids, texts, metadatas)
+
+    def delete_document(self, document_id: str, project_id: Optional[str] = None) -> int:
+        """Remove every chunk of a document; returns the number removed."""
+        project_id = project_id or UNASSIGNED
+        with self._lock:
+            shard = self._shard(project_id)
+            doomed = {
+                chunk_id for chunk_id, metadata in zip(shard.ids, shard.metadatas)
+                if metadata.get("document_id") == document_id
+            }
+            if doomed:
+                shard = self._rebuild(shard, exclude=doomed)
+                self._shards[project_id] = shard
+                self._save(project_id, shard)
+            return len(doomed)
+
+    @staticmethod
+    def _rebuild(shard: _Shard, exclude: set) -> _Shard:
+        rebuilt = _Shard()
+        for chunk_id, text, metadata in zip(shard.ids, shard.texts, shard.metadatas):
+            if chunk_id not in exclude:
+                rebuilt.add(chunk_id, text, metadata)
+        return rebuilt
+
+    def _save(self, project_id: str, shard: _Shard) -> None:
+        """Write a snapshot of the whole shard and drop its log."""
+        if not self.path:
+            return
+        os.makedirs(self.path, exist_ok=True)
+        shard_path = self._shard_path(project_id)
+        with open(shard_path + ".tmp", "wb") as f:
+            pickle.dump(shard, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(shard_path + ".tmp", shard_path)
+        try:
+            os.remove(self._shard_path(project_id, LOG_EXTENSION))
+        except FileNotFoundError:
+            pass
+        shard.logged = 0
+
+    def _append(self, project_id: str, shard: _Shard, ids: List[str], texts: List[str],
+                metadatas: List[Dict[str, Any]]) -> None:
+        """Append newly added chunks to the shard's log."""
+        if not self.path:
+            return
+        os.makedirs(self.path, exist_ok=True)
+        with open(self._shard_path(project_id, LOG_EXTENSION), "ab") as f:
+            pickle.dump((list(ids), list(texts), list(metadatas)), f, protocol=pickle.HIGHEST_PROTOCOL)
+        shard.logged += len(ids)
+
+    def search(self, query: str, project_id: Optional[str] = None, k: int = 5) -> List[Dict[str, Any]]:
+        """
+        BM25 search within one project, or across all shards when no project is given
+
+        Returns:
+            Matching chunks as dicts with content, metadata and score, best first
+        """
+        tokens = tokenize(query)
+        with self._lock:
+            project_ids = [project_id] if project_id else self._project_ids()
+            shards = [self._shard(pid) for pid in project_ids]
+            idf = None
+            if len(shards) > 1:
+                # Corpus-wide IDF, so every shard weighs a token the same way
+                count = sum(len(shard.ids) for shard in shards)
+                idf = {token: _idf(count, sum(shard.document_frequency(token) for shard in shards))
+                       for token in set(tokens)}
+        hits = []
+        for shard in shards:
+            # Adds grow a shard's postings and reset its term-weight cache in
+            # place, so each shard is searched under the lock
+            with self._lock:
+                for row, score in shard.search(tokens, k, self.k1, self.b, idf):
+                    hits.append({"content": shard.texts[row], "metadata": shard.metadatas[row], "score": score})
+        hits.sort(key=lambda hit: hit["score"], reverse=True)
+        return hits[:k]
+
+
+def _normalized(scores: List[float]) -> List[float]:
+    if not scores:
+        return []
+    low, high = min(scores), max(scores)
+    if high == low:
+        return [1.0] * len(scores)
+    return [(score - low) / (high - low) for score in scores]
+
+
+def fuse_results(vector_hits: List[Dict[str, Any]], lexical_hits: List[Dict[str, Any]],
+                 alpha: Optional[float] = None, limit: int = 5) -> List[Dict[str, Any]]:
+    """
+    Combine vector and BM25 hits into one ranking
+
+    Each list's scores are min-max normalized and summed with weight ``alpha``
+    for the vector score and ``1 - alpha`` for the lexical score. A chunk that
+    only one retriever found gets 0 from the other.
+
+    Args:
+        vector_hits: Dicts with content, metadata and score (higher is more similar)
+        lexical_hits: Dicts with content, metadata and BM25 score
+        alpha: Weight of the vector score; defaults to SEARCH_HYBRID_ALPHA
+        limit: Maximum number of results to return
+
+    Returns:
+        Fused hits with the combined score and both component scores
+    """
+    alpha = LEXICAL_INDEX_CONFIG['hybrid_alpha'] if alpha is None else alpha
+    fused: Dict[Tuple[Any, str], Dict[str, Any]] = {}
+    for hits, weight, field in ((vector_hits, alpha, "vector_score"), (lexical_hits, 1 - alpha, "lexical_score")):
+        for hit, normalized in zip(hits, _normalized([hit["score"] for hit in hits])):
+            key = (hit["metadata"].get("document_id"), hit["content"])
+            entry = fused.setdefault(key, {
+                "content": hit["content"],
+                "metadata": hit["metadata"],
+                "score": 0.0,
+                "vector_score": None,
+                "lexical_score": None,
+            })
+            entry["score"] += weight * normalized
+            entry[field] = hit["score"]
+    return sorted(fused.values(), key=lambda hit: hit["score"], reverse=True)[:limit]
@@ -0,0 +1,548 @@
+"""
+Pluggable LLM backends.
+
+Every LLM call in the package goes through an ``LLMProvider``. Code that used
+the OpenAI SDK directly calls ``complete``/``stream``; chains and agents get
+LangChain models from ``chat_model``, ``completion_model`` and ``embeddings``.
+
+``OpenAIProvider`` talks to OpenAI. ``FakeProvider`` answers offline with
+deterministic synthetic responses: when the prompt asks for JSON, the reply
+has the keys or schema the prompt names. ``ReplayProvider`` serves responses
+recorded from a real run, keyed by a hash of the messages, and can record new
+ones. The offline backends sleep for a delay drawn from a configurable
+distribution, so end-to-end throughput can be measured without a network.
+"""
+import hashlib
+import json
+import math
+import os
+import random
+import re
+import threading
+import time
+from abc import ABC, abstractmethod
+from dataclasses import dataclass, field
+from functools import lru_cache
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+import httpx
+import numpy as np
+import openai
+from langchain_core.embeddings import Embeddings
+from langchain_core.language_models import LLM, BaseChatModel
+from langchain_core.messages import AIMessage, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+from langchain_openai import ChatOpenAI, OpenAI, OpenAIEmbeddings
+
+from ..config import LANGCHAIN_CONFIG, LLM_PROVIDER_CONFIG, OPENAI_CONFIG
+
+Messages = List[Dict[str, Any]]
+
+# Rough token estimate for synthetic usage figures
+CHARS_PER_TOKEN = 4
+
+_ROLES = {"human": "user", "ai": "assistant", "system": "system"}
+
+
+@dataclass
+class LLMResponse:
+    text: str
+    # OpenAI-style usage: prompt_tokens, completion_tokens, total_tokens
+    usage: Dict[str, int] = field(default_factory=dict)
+
+
+@lru_cache(maxsize=1)
+def shared_http_client() -> httpx.Client:
+    """Keep-alive connection pool shared by the LLM clients in this process."""
+    return httpx.Client(
+        limits=httpx.Limits(
+            max_connections=OPENAI_CONFIG['max_connections'],
+            max_keepalive_connections=OPENAI_CONFIG['max_connections']
+        ),
+        timeout=OPENAI_CONFIG['timeout']
+    )
+
+
+def messages_key(messages: Any) -> str:
+    return hashlib.sha256(json.dumps(messages, sort_keys=True, default=str).encode()).hexdigest()
+
+
+def messages_text(messages: Messages) -> str:
+    """Text of all messages; image parts of multimodal messages are skipped."""
+    parts = []
+    for message in messages:
+        content = message.get("content")
+        if isinstance(content, str):
+            parts.append(content)
+        elif isinstance(content, list):
+            parts.extend(part.get("text", "") for part in content if isinstance(part, dict))
+    return "\n".join(parts)
+
+
+def latency_sampler(spec: str) -> Callable[[random.Random], float]:
+    """
+    Parse a latency distribution
+
+    Args:
+        spec: "none", "fixed:MS", "uniform:MIN_MS:MAX_MS", "normal:MEAN_MS:SD_MS"
+            or "lognormal:MEDIAN_MS:SIGMA"
+
+    Returns:
+        Function drawing a delay in seconds from a random generator
+    """
+    name, *args = spec.strip().lower().split(":")
+    try:
+        values = [float(arg) for arg in args]
+    except ValueError:
+        raise ValueError(f"Invalid latency spec: {spec}")
+    distributions = {
+        "none": (0, lambda rng: 0.0),
+        "fixed": (1, lambda rng: values[0]),
+        "uniform": (2, lambda rng: rng.uniform(values[0], values[1])),
+        "normal": (2, lambda rng: rng.gauss(values[0], values[1])),
+        "lognormal": (2, lambda rng: values[0] * math.exp(rng.gauss(0, values[1]))),
+    }
+    if name not in distributions or len(values) != distributions[name][0]:
+        raise ValueError(f"Invalid latency spec: {spec}")
+    draw = distributions[name][1]
+    return lambda rng: max(draw(rng), 0.0) / 1000
+
+
+def estimate_usage(prompt: str, completion: str) -> Dict[str, int]:
+    prompt_tokens = max(1, len(prompt) // CHARS_PER_TOKEN)
+    completion_tokens = max(1, len(completion) // CHARS_PER_TOKEN)
+    return {
+        "prompt_tokens": prompt_tokens,
+        "completion_tokens": completion_tokens,
+        "total_tokens": prompt_tokens + completion_tokens,
+    }
+
+
+_KEYS_PATTERN = re.compile(r"JSON object with (?:these|the following) keys:[ \t]*([\w ,]+)", re.IGNORECASE)
+_SCHEMA_TYPE = re.compile(r'("[\w ]+"\s*:\s*)(list of \w+|string|number|integer|boolean)(?: or null)?')
+_BULLET = re.compile(r"^\s*(?:-|\d+\.)\s+(.+?)\s*$", re.MULTILINE)
+_WORD = re.compile(r"[A-Za-z][A-Za-z0-9-]{3,}")
+
+
+def _schema(prompt: str) -> Optional[Dict[str, Any]]:
+    """First ``{...}`` block in the prompt that declares field types, as a dict of type placeholders."""
+    start = prompt.find("{")
+    while start != -1:
+        depth = 0
+        for end in range(start, len(prompt)):
+            if prompt[end] == "{":
+                depth += 1
+            elif prompt[end] == "}":
+                depth -= 1
+                if depth == 0:
+                    break
+        else:
+            return None
+        candidate, typed = _SCHEMA_TYPE.subn(lambda m: f'{m.group(1)}"<{m.group(2)}>"', prompt[start:end + 1])
+        if typed:
+            try:
+                schema = json.loads(candidate)
+            except json.JSONDecodeError:
+                schema = None
+            if isinstance(schema, dict):
+                return schema
+        start = prompt.find("{", end + 1)
+    return None
+
+
+def _phrase(words: List[str], rng: random.Random) -> str:
+    return " ".join(rng.sample(words, min(len(words), rng.randint(1, 3))))
+
+
+def _phrases(words: List[str], rng: random.Random) -> List[str]:
+    return [_phrase(words, rng) for _ in range(rng.randint(1, 4))]
+
+
+def _fill(schema: Any, words: List[str], rng: random.Random) -> Any:
+    if isinstance(schema, dict):
+        return {key: _fill(value, words, rng) for key, value in schema.items()}
+    if schema in ("<number>", "<integer>"):
+        return rng.randint(1, 100)
+    if schema == "<boolean>":
+        return rng.random() < 0.5
+    if isinstance(schema, str) and schema.startswith("<list of"):
+        return _phrases(words, rng)
+    return _phrase(words, rng)
+
+
+def synthetic_response(prompt: str, rng: random.Random) -> str:
+    """
+    Deterministic stand-in answer shaped like what the prompt asks for
+
+    A schema written out in the prompt (``{"key": list of strings or null}``)
+    is filled with values of the declared types, "JSON object with these keys:
+    a, b" gives an object of string lists, and "JSON array" gives some of the
+    prompt's bullet items. Anything else gets a few lines of prose. Values are
+    drawn from the prompt's own words.
+
+    Args:
+        prompt: Text of the request messages
+        rng: Generator seeded for this request
+
+    Returns:
+        Response text
+    """
+    words = list(dict.fromkeys(_WORD.findall(prompt))) or ["item"]
+    schema = _schema(prompt)
+    if schema is not None:
+        return json.dumps(_fill(schema, words, rng))
+    match = _KEYS_PATTERN.search(prompt)
+    if match:
+        keys = [key.strip() for key in match.group(1).split(",") if key.strip()]
+        return json.dumps({key: _phrases(words, rng) for key in keys})
+    if re.search(r"JSON array", prompt, re.IGNORECASE):
+        bullets = _BULLET.findall(prompt)
+        if not bullets:
+            return json.dumps(_phrases(words, rng))
+        chosen = sorted(rng.sample(range(len(bullets)), rng.randint(1, len(bullets))))
+        return json.dumps([bullets[i] for i in chosen])
+    lines = []
+    for _ in range(rng.randint(3, 6)):
+        sentence = " ".join(rng.choice(words) for _ in range(rng.randint(8, 16)))
+        lines.append(sentence[0].upper() + sentence[1:] + ".")
+    return "\n".join(lines)
+
+
+class LLMProvider(ABC):
+    name = "base"
+
+    def __init__(self, seed: int = 0):
+        self.seed = seed
+        self._seen: Dict[str, int] = {}
+        self._seen_lock = threading.Lock()
+
+    def _rng(self, key: str) -> random.Random:
+        # Seeded by the request and how often it was made before, so a run
+        # repeats exactly whatever order threads issue their calls in
+        with self._seen_lock:
+            count = self._seen.get(key, 0)
+            self._seen[key] = count + 1
+        return random.Random(f"{self.seed}:{key}:{count}")
+
+    @abstractmethod
+    def complete(self, messages: Messages, model: Optional[str] = None,
+                 temperature: Optional[float] = None,
+                 max_tokens: Optional[int] = None) -> LLMResponse:
+        """
+        Chat completion of OpenAI-style messages
+
+        Args:
+            messages: ``{"role", "content"}`` dicts
+            model: Model name; offline backends ignore it
+            temperature: Sampling temperature
+            max_tokens: Completion length limit
+
+        Returns:
+            The response text and token usage
+        """
+        raise NotImplementedError
+
+    def stream(self, messages: Messages, model: Optional[str] = None,
+               temperature: Optional[float] = None,
+               max_tokens: Optional[int] = None) -> Iterator[str]:
+        """Yield the completion in word-sized chunks."""
+        text = self.complete(messages, model, temperature, max_tokens).text
+        yield from re.findall(r"\s*\S+", text)
+
+    @abstractmethod
+    def embed(self, texts: List[str], model: Optional[str] = None) -> List[List[float]]:
+        raise NotImplementedError
+
+    def chat_model(self, model: str, temperature: float = 0,
+                   max_tokens: Optional[int] = None) -> BaseChatModel:
+        return ProviderChatModel(provider=self, model=model, temperature=temperature, max_tokens=max_tokens)
+
+    def completion_model(self, model: str, temperature: float = 0) -> LLM:
+        return ProviderLLM(provider=self, model=model, temperature=temperature)
+
+    def embeddings(self, model: str) -> Embeddings:
+        return ProviderEmbeddings(self, model)
+
+
+class OpenAIProvider(LLMProvider):
+    name = "openai"
+
+    def __init__(self, api_key: Optional[str] = None):
+        super().__init__()
+        self.api_key = api_key or OPENAI_CONFIG['api_key']
+        self._client: Optional[openai.OpenAI] = None
+
+    @property
+    def client(self) -> openai.OpenAI:
+        # Built on first use, so a missing key fails the call rather than the import
+        if self._client is None:
+            self._client = openai.OpenAI(api_key=self.api_key, http_client=shared_http_client())
+        return self._client
+
+    def _create(self, messages: Messages, model: Optional[str], temperature: Optional[float],
+                max_tokens: Optional[int], **kwargs) -> Any:
+        options = {"temperature": temperature, "max_tokens": max_tokens}
+        kwargs.update({key: value for key, value in options.items() if value is not None})
+        return self.client.chat.completions.create(
+            model=model or OPENAI_CONFIG['model'],
+            messages=messages,
+            **kwargs
+        )
+
+    def complete(self, messages: Messages, model: Optional[str] = None,
+                 temperature: Optional[float] = None,
+                 max_tokens: Optional[int] = None) -> LLMResponse:
+        response = self._create(messages, model, temperature, max_tokens)
+        usage = {}
+        if response.usage is not None:
+            usage = {
+                "prompt_tokens": response.usage.prompt_tokens,
+                "completion_tokens": response.usage.completion_tokens,
+                "total_tokens": response.usage.total_tokens,
+            }
+        return LLMResponse(response.choices[0].message.content or "", usage)
+
+    def stream(self, messages: Messages, model: Optional[str] = None,
+               temperature: Optional[float] = None,
+               max_tokens: Optional[int] = None) -> Iterator[str]:
+        for chunk in self._create(messages, model, temperature, max_tokens, stream=True):
+            token = chunk.choices[0].delta.content if chunk.choices else None
+            if token:
+                yield token
+
+    def embed(self, texts: List[str], model: Optional[str] = None) -> List[List[float]]:
+        response = self.client.embeddings.create(
+            model=model or LANGCHAIN_CONFIG['embeddings_model'],
+            input=texts
+        )
+        return [item.embedding for item in sorted(response.data, key=lambda item: item.index)]
+
+    def chat_model(self, model: str, temperature: float = 0,
+                   max_tokens: Optional[int] = None) -> BaseChatModel:
+        return ChatOpenAI(
+            model_name=model,
+            temperature=temperature,
+            max_tokens=max_tokens,
+            openai_api_key=self.api_key,
+            http_client=shared_http_client()
+        )
+
+    def completion_model(self, model: str, temperature: float = 0) -> LLM:
+        return OpenAI(
+            model_name=model,
+            temperature=temperature,
+            openai_api_key=self.api_key,
+            http_client=shared_http_client()
+        )
+
+    def embeddings(self, model: str) -> Embeddings:
+        return OpenAIEmbeddings(model=model, openai_api_key=self.api_key)
+
+
+class FakeProvider(LLMProvider):
+    """
+    Offline backend with synthetic responses and sampled latencies.
+
+    Embeddings are unit vectors seeded by a hash of the text, so identical
+    texts get identical vectors. ``calls`` and ``latency_seconds`` total the
+    completions served and the delay injected into them.
+    """
+    name = "fake"
+
+    def __init__(self, latency: str = "none", embedding_latency: str = "none",
+                 dimension: int = 1536, seed: int = 0):
+        super().__init__(seed)
+        self._latency = latency_sampler(latency)
+        self._embedding_latency = latency_sampler(embedding_latency)
+        self.dimension = dimension
+        self.calls = 0
+        self.latency_seconds = 0.0
+
+    def complete(self, messages: Messages, model: Optional[str] = None,
+                 temperature: Optional[float] = None,
+                 max_tokens: Optional[int] = None) -> LLMResponse:
+        rng = self._rng(messages_key(messages))
+        delay = self._latency(rng)
+        with self._seen_lock:
+            self.calls += 1
+            self.latency_seconds += delay
+        time.sleep(delay)
+        prompt = messages_text(messages)
+        text = synthetic_response(prompt, rng)
+        return LLMResponse(text, estimate_usage(prompt, text))
+
+    def _vector(self, text: str) -> List[float]:
+        digest = hashlib.sha256(f"{self.seed}:{text}".encode()).digest()
+        vector = np.random.default_rng(int.from_bytes(digest[:8], "little")).standard_normal(self.dimension)
+        return (vector / np.linalg.norm(vector)).astype(np.float32).tolist()
+
+    def embed(self, texts: List[str], model: Optional[str] = None) -> List[List[float]]:
+        time.sleep(self._embedding_latency(self._rng(messages_key(texts))))
+        return [self._vector(text) for text in texts]
+
+
+class ReplayProvider(LLMProvider):
+    """
+    Responses recorded in a JSONL file, one ``{"key", "response", "usage", "latency"}`` per line.
+
+    A request not in the file is answered by ``fallback``; with ``record`` the
+    answer is appended to the file. Without a fallback a miss raises KeyError,
+    so a stale recording fails loudly. Embeddings are not recorded and come
+    from ``embedding_provider``.
+    """
+    name = "replay"
+
+    def __init__(self, path: str, fallback: Optional[LLMProvider] = None,
+                 embedding_provider: Optional[LLMProvider] = None,
+                 record: bool = False, latency: str = "recorded", seed: int = 0):
+        super().__init__(seed)
+        self.path = path
+        self.fallback = fallback
+        self.embedding_provider = embedding_provider or FakeProvider(seed=seed)
+        self.record = record
+        # None replays the latency measured when the response was recorded
+        self._latency = None if latency == "recorded" else latency_sampler(latency)
+        self._responses = self._load()
+        self._write_lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _load(self) -> Dict[str, Dict[str, Any]]:
+        responses = {}
+        if os.path.exists(self.path):
+            with open(self.path) as f:
+                for line in f:
+                    if line.strip():
+                        entry = json.loads(line)
+                        responses[entry["key"]] = entry
+        return responses
+
+    def complete(self, messages: Messages, model: Optional[str] = None,
+                 temperature: Optional[float] = None,
+                 max_tokens: Optional[int] = None) -> LLMResponse:
+        key = messages_key(messages)
+        entry = self._responses.get(key)
+        if entry is None:
+            self.misses += 1
+            return self._miss(key, messages, model, temperature, max_tokens)
+        self.hits += 1
+        delay = entry.get("latency", 0.0) if self._latency is None else self._latency(self._rng(key))
+        time.sleep(delay)
+        return LLMResponse(entry["response"], entry.get("usage") or {})
+
+    def _miss(self, key: str, messages: Messages, model: Optional[str],
+              temperature: Optional[float], max_tokens: Optional[int]) -> LLMResponse:
+        if self.fallback is None:
+            raise KeyError(f"No recorded LLM response for request {key[:12]} in {self.path}")
+        start = time.perf_counter()
+        response = self.fallback.complete(messages, model, temperature, max_tokens)
+        if self.record:
+            entry = {
+                "key": key,
+                "response": response.text,
+                "usage": response.usage,
+                "latency": time.perf_counter() - start,
+            }
+            with self._write_lock:
+                self._responses[key] = entry
+                with open(self.path, "a") as f:
+                    f.write(json.dumps(entry) + "\n")
+        return response
+
+    def embed(self, texts: List[str], model: Optional[str] = None) -> List[List[float]]:
+        return self.embedding_provider.embed(texts, model)
+
+    def embeddings(self, model: str) -> Embeddings:
+        return self.embedding_provider.embeddings(model)
+
+
+class ProviderChatModel(BaseChatModel):
+    """LangChain chat model backed by an LLMProvider."""
+    provider: Any
+    model: str
+    temperature: float = 0
+    max_tokens: Optional[int] = None
+
+    @property
+    def _llm_type(self) -> str:
+        return f"{self.provider.name}-chat"
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                  run_manager: Any = None, **kwargs: Any) -> ChatResult:
+        request = [{"role": _ROLES.get(message.type, message.type), "content": message.content} for message in messages]
+        response = self.provider.complete(request, self.model, self.temperature, self.max_tokens)
+        metadata = {"token_usage": response.usage, "model_name": self.model}
+        message = AIMessage(content=response.text, response_metadata=metadata)
+        return ChatResult(generations=[ChatGeneration(message=message)], llm_output=metadata)
+
+
+class ProviderLLM(LLM):
+    """LangChain completion model backed by an LLMProvider."""
+    provider: Any
+    model: str
+    temperature: float = 0
+
+    @property
+    def _llm_type(self) -> str:
+        return self.provider.name
+
+    def _call(self, prompt: str, stop: Optional[List[str]] = None,
+              run_manager: Any = None, **kwargs: Any) -> str:
+        return self.provider.complete([{"role": "user", "content": prompt}], self.model, self.temperature).text
+
+
+class ProviderEmbeddings(Embeddings):
+    """LangChain embeddings backed by an LLMProvider."""
+
+    def __init__(self, provider: LLMProvider, model: str):
+        self.provider = provider
+        self.model = model
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.provider.embed(texts, self.model)
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.provider.embed([text], self.model)[0]
+
+
+def get_llm_provider(api_key: Optional[str] = None) -> LLMProvider:
+    """
+    Backend selected by LLM_PROVIDER
+
+    OpenAI backends are shared per API key; offline backends ignore the key,
+    so every service in the process shares one and its counters see all calls.
+
+    Args:
+        api_key: OpenAI key; defaults to OPENAI_API_KEY
+
+    Returns:
+        The provider for this process
+    """
+    if LLM_PROVIDER_CONFIG['provider'] not in ("openai", "record"):
+        api_key = None
+    return _create_provider(LLM_PROVIDER_CONFIG['provider'], api_key)
+
+
+@lru_cache(maxsize=None)
+def _create_provider(kind: str, api_key: Optional[str]) -> LLMProvider:
+    config = LLM_PROVIDER_CONFIG
+    if kind == "openai":
+        return OpenAIProvider(api_key)
+    if kind == "record":
+        live = OpenAIProvider(api_key)
+        return ReplayProvider(config['replay_path'], fallback=live, embedding_provider=live, record=True)
+    # A replay that reuses recorded latencies answers misses without delay
+    latency = "none" if config['latency'] == "recorded" else config['latency']
+    fake = FakeProvider(latency, config['embedding_latency'],
+                        config['embedding_dimension'], config['seed'])
+    if kind == "fake":
+        return fake
+    if kind == "replay":
+        return ReplayProvider(
+            config['replay_path'],
+            fallback=None if config['strict'] else fake,
+            embedding_provider=fake,
+            latency=config['latency'],
+            seed=config['seed']
+        )
+    raise ValueError(f"Unknown LLM provider: {kind}")
@@ -1,27 +1,37 @@
-import openai
+import json
 from typing import Optional, Dict, Any
+from .llm_provider import get_llm_provider
 # from ..config import OpenAIConfig  # Removed, as OpenAIConfig does not exist
 
 class OpenAIService:
     def __init__(self, config: dict):
         self.config = config
-        openai.api_key = config['api_key']
+        self.provider = get_llm_provider(config['api_key'])
+
+    def _chat(self, system: Optional[str], prompt: str) -> str:
+        messages = [{"role": "system", "content": system}] if system else []
+        messages.append({"role": "user", "content": prompt})
+        response = self.provider.complete(
+            messages,
+            model=self.config['model'],
+            temperature=self.config['temperature'],
+            max_tokens=self.config['max_tokens']
+        )
+        return response.text
+
+    def generate_completion(self, prompt: str) -> str:
+        """Completion of a single user prompt."""
+        return self._chat(None, prompt)
 
     def generate_estimate(self, project_data: Dict[str, Any]) -> Optional[Dict[str, Any]]:
         try:
-            response = openai.ChatCompletion.create(
-                model=self.config['model'],
-                messages=[
-                    {"role": "system", "content": "You are an expert construction estimator."},
-                    {"role": "user", "content": f"Generate an estimate for this project: {project_data}"}
-                ],
-                temperature=self.config['temperature'],
-                max_tokens=self.config['max_tokens']
+            response = self._chat(
+                "You are an expert construction estimator.",
+                f"Generate an estimate for this project: {project_data}"
             )
-            
+
             # Parse the response content as JSON
-            import json
-            estimate_data = json.loads(response.choices[0].message.content)
+            estimate_data = json.loads(response)
             return estimate_data
         except Exception as e:
             print(f"Error generating estimate: {str(e)}")
@@ -29,20 +39,14 @@ class OpenAIService:
 
     def generate_proposal(self, estimate_data: Dict[str, Any]) -> Optional[Dict[str, Any]]:
         try:
-            response = openai.ChatCompletion.create(
-                model=self.config['model'],
-                messages=[
-                    {"role": "system", "content": "You are an expert proposal writer."},
-                    {"role": "user", "content": f"Generate a proposal based on this estimate: {estimate_data}"}
-                ],
-                temperature=self.config['temperature'],
-                max_tokens=self.config['max_tokens']
+            response = self._chat(
+                "You are an expert proposal writer.",
+                f"Generate a proposal based on this estimate: {estimate_data}"
             )
-            
+
             # Parse the response content as JSON
-            import json
-            proposal_data = json.loads(response.choices[0].message.content)
+            proposal_data = json.loads(response)
             return proposal_data
         except Exception as e:
             print(f"Error generating proposal: {str(e)}")
-            return None 
\ No newline at end of file
+            return None
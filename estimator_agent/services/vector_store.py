@@ -0,0 +1,566 @@
+"""
+Vector store backends for DocumentService.
+
+``LocalVectorStore`` is an in-process index over NumPy arrays with the
+subset of the LangChain vector store interface that DocumentService uses.
+It needs no network, persists to a directory and memory-maps the vectors
+when reopened. It supports exact (flat) search and an IVF index that only
+scans the clusters nearest the query. The Pinecone backend is created only
+when it is selected.
+
+Each indexed document also gets a centroid entry: the normalized mean of its
+chunk vectors, stored as ``<document_id>-centroid`` with ``kind: "centroid"``.
+Related documents are then found with one query by vector.
+
+Writes only mark the index dirty. Once ``start()`` has been called, a
+background thread saves it every ``save_interval`` seconds while it has
+unsaved changes, and once more at exit, so indexing a document never
+rewrites the whole index on the request path.
+
+Each save writes a complete new generation directory and then switches the
+``CURRENT`` pointer file to it with one atomic rename, so a crash mid-save
+leaves the previous generation in place rather than files that disagree.
+"""
+import atexit
+import json
+import logging
+import os
+import shutil
+import threading
+import time
+from collections import defaultdict
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Set, Tuple
+
+import numpy as np
+from langchain_core.documents import Document
+
+from ..config import VECTOR_DB_CONFIG
+
+logger = logging.getLogger(__name__)
+
+VECTORS_FILE = "vectors.npy"
+DOCUMENTS_FILE = "documents.jsonl"
+CENTROIDS_FILE = "centroids.npy"
+ASSIGNMENTS_FILE = "assignments.npy"
+# Names the generation directory holding the saved index
+CURRENT_FILE = "CURRENT"
+GENERATION_PREFIX = "gen-"
+
+# Metadata fields with an inverted index, so filters on them skip a full scan
+INDEXED_FIELDS = ("project_id", "document_id", "kind")
+
+# Metadata kind of document-level centroid entries; chunks carry no kind
+CENTROID_KIND = "centroid"
+
+# Pinecone accepts at most this many vectors per upsert request
+PINECONE_UPSERT_BATCH = 100
+
+# IVF needs enough vectors per cluster to train useful centroids
+IVF_MIN_POINTS_PER_LIST = 39
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+def _condition(value: Any) -> Tuple[str, Any]:
+    """Split a filter value into an operator and operand; bare values mean equality."""
+    if isinstance(value, dict):
+        return next(iter(value.items()))
+    return "$eq", value
+
+
+class LocalVectorStore:
+    """
+    In-process cosine-similarity index with metadata filtering.
+
+    Filters use the Pinecone syntax: ``{"project_id": "p1"}``, or operators
+    such as ``{"document_id": {"$ne": "d1"}}`` and ``{"$in": [...]}``. Equality
+    filters on ``project_id`` and ``document_id`` use inverted indexes.
+    """
+
+    def __init__(self, embedding: Any, path: Optional[str] = None,
+                 index_type: str = "flat", nlist: int = 256, nprobe: int = 8,
+                 save_interval: float = 30.0):
+        self.embedding = embedding
+        self.path = path
+        self.index_type = index_type
+        self.nlist = nlist
+        self.nprobe = nprobe
+        self.save_interval = save_interval
+        self._vectors: Optional[np.ndarray] = None
+        self._alive = np.zeros(0, dtype=bool)
+        self._size = 0
+        self._ids: List[str] = []
+        self._texts: List[str] = []
+        self._metadatas: List[Dict[str, Any]] = []
+        self._positions: Dict[str, int] = {}
+        self._postings: Dict[str, Dict[Any, Set[int]]] = {field: defaultdict(set) for field in INDEXED_FIELDS}
+        self._centroids: Optional[np.ndarray] = None
+        self._assignments = np.zeros(0, dtype=np.int32)
+        self._lists: List[np.ndarray] = []
+        self._lock = threading.RLock()
+        self._save_lock = threading.Lock()
+        # Bumped by every write; the index has unsaved changes while they differ
+        self._version = 0
+        self._saved_version = 0
+        self._stopped = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        directory = _index_dir(path) if path else None
+        if directory:
+            self._load(directory)
+
+    def __len__(self) -> int:
+        return int(self._alive[:self._size].sum())
+
+    # Writes
+
+    def _reserve(self, count: int, dimension: int) -> None:
+        needed = self._size + count
+        if self._vectors is not None and self._vectors.shape[0] >= needed and self._vectors.flags.writeable:
+            return
+        capacity = max(needed, 2 * (self._vectors.shape[0] if self._vectors is not None else 0), 1024)
+        vectors = np.empty((capacity, dimension), dtype=np.float32)
+        alive = np.zeros(capacity, dtype=bool)
+        assignments = np.full(capacity, -1, dtype=np.int32)
+        if self._size:
+            vectors[:self._size] = self._vectors[:self._size]
+            alive[:self._size] = self._alive[:self._size]
+            assignments[:self._size] = self._assignments[:self._size]
+        self._vectors, self._alive, self._assignments = vectors, alive, assignments
+
+    def _unindex(self, row: int) -> None:
+        for field in INDEXED_FIELDS:
+            value = self._metadatas[row].get(field)
+            if value is not None:
+                self._postings[field][value].discard(row)
+
+    def add_vectors(self, vectors: Sequence[Sequence[float]], texts: Sequence[str],
+                    metadatas: Optional[Sequence[Dict[str, Any]]] = None,
+                    ids: Optional[Sequence[str]] = None) -> List[str]:
+        """
+        Add precomputed embeddings, replacing existing entries with the same ids
+
+        Returns:
+            Ids of the added entries
+        """
+        matrix = _normalize(np.asarray(vectors, dtype=np.float32))
+        metadatas = list(metadatas) if metadatas is not None else [{} for _ in texts]
+        ids = list(ids) if ids is not None else [f"{len(self._ids) + i}" for i in range(len(texts))]
+        with self._lock:
+            self._reserve(len(ids), matrix.shape[1])
+            new_rows = []
+            for vector, text, metadata, id_ in zip(matrix, texts, metadatas, ids):
+                row = self._positions.get(id_)
+                if row is None:
+                    row = self._size
+                    self._size += 1
+                    self._ids.append(id_)
+                    self._texts.append(text)
+                    self._metadatas.append(dict(metadata))
+                    self._positions[id_] = row
+                else:
+                    if not self._alive[row]:
+                        self._assignments[row] = -1  # Deleted rows are in no IVF list
+                    self._unindex(row)
+                    self._texts[row] = text
+                    self._metadatas[row] = dict(metadata)
+                self._vectors[row] = vector
+                self._alive[row] = True
+                for field in INDEXED_FIELDS:
+                    value = metadata.get(field)
+                    if value is not None:
+                        self._postings[field][value].add(row)
+                new_rows.append(row)
+            self._version += 1
+            if self._centroids is not None:
+                rows = np.unique(new_rows)
+                previous = self._assignments[rows].copy()
+                self._assign(rows)
+                self._update_lists(rows, previous)
+            elif self.index_type == "ivf" and self._size >= self.nlist * IVF_MIN_POINTS_PER_LIST:
+                self.train()
+        return ids
+
+    def add_texts(self, texts: Iterable[str], metadatas: Optional[List[Dict[str, Any]]] = None,
+                  ids: Optional[List[str]] = None, **kwargs: Any) -> List[str]:
+        texts = list(texts)
+        if not texts:
+            return []
+        return self.add_vectors(self.embedding.embed_documents(texts), texts, metadatas, ids)
+
+    def delete(self, ids: Optional[List[str]] = None, filter: Optional[Dict[str, Any]] = None) -> int:
+        """Remove entries by id or by metadata filter; returns the number removed."""
+        with self._lock:
+            rows = [self._positions[id_] for id_ in ids or [] if id_ in self._positions]
+            if filter:
+                rows.extend(np.flatnonzero(self._filter_mask(filter)).tolist())
+            removed = []
+            for row in set(rows):
+                if self._alive[row]:
+                    self._alive[row] = False
+                    self._unindex(row)
+                    removed.append(row)
+            if removed:
+                self._version += 1
+                if self._centroids is not None:
+                    self._prune_lists(np.unique(self._assignments[removed]))
+            return len(removed)
+
+    # IVF
+
+    def train(self, iterations: int = 10, sample_size: int = 100_000, seed: int = 0) -> None:
+        """Cluster the stored vectors into ``nlist`` lists with spherical k-means."""
+        with self._lock:
+            rows = np.flatnonzero(self._alive[:self._size])
+            nlist = min(self.nlist, len(rows))
+            if nlist == 0:
+                return
+            rng = np.random.default_rng(seed)
+            sample = self._vectors[rng.choice(rows, size=min(sample_size, len(rows)), replace=False)]
+            centroids = sample[rng.choice(len(sample), size=nlist, replace=False)].copy()
+            for _ in range(iterations):
+                labels = np.argmax(sample @ centroids.T, axis=1)
+                for cluster in range(nlist):
+                    members = sample[labels == cluster]
+                    if len(members):
+                        centroids[cluster] = members.mean(axis=0)
+                centroids = _normalize(centroids)
+            self._centroids = centroids
+            self._assign(np.arange(self._size))
+            self._rebuild_lists()
+
+    def _assign(self, rows: np.ndarray, batch: int = 65536) -> None:
+        if self._assignments.shape[0] < self._vectors.shape[0] or not self._assignments.flags.writeable:
+            assignments = np.full(self._vectors.shape[0], -1, dtype=np.int32)
+            assignments[:len(self._assignments)] = self._assignments[:self._vectors.shape[0]]
+            self._assignments = assignments
+        for start in range(0, len(rows), batch):
+            chunk = rows[start:start + batch]
+            self._assignments[chunk] = np.argmax(self._vectors[chunk] @ self._centroids.T, axis=1)
+
+    def _prune_lists(self, clusters: Iterable[int]) -> None:
+        """Drop deleted rows and rows assigned elsewhere from the given lists."""
+        for cluster in clusters:
+            members = self._lists[cluster]
+            self._lists[cluster] = members[self._alive[members] & (self._assignments[members] == cluster)]
+
+    def _update_lists(self, rows: np.ndarray, previous: np.ndarray) -> None:
+        """Move newly assigned rows into their lists; only the lists they leave or join are touched."""
+        labels = self._assignments[rows]
+        moved = previous != labels
+        self._prune_lists(np.unique(previous[moved & (previous >= 0)]))
+        for cluster in np.unique(labels[moved]):
+            self._lists[cluster] = np.concatenate([self._lists[cluster], rows[moved & (labels == cluster)]])
+
+    def _rebuild_lists(self) -> None:
+        assignments = self._assignments[:self._size]
+        alive = self._alive[:self._size]
+        order = np.argsort(assignments, kind="stable")
+        order = order[alive[order]]
+        bounds = np.searchsorted(assignments[order], np.arange(len(self._centroids) + 1))
+        self._lists = [order[bounds[i]:bounds[i + 1]] for i in range(len(self._centroids))]
+
+    # Reads
+
+    def _filter_mask(self, filter: Optional[Dict[str, Any]]) -> np.ndarray:
+        size = self._size
+        mask = self._alive[:size].copy()
+        for field, value in (filter or {}).items():
+            operator, operand = _condition(value)
+            values = operand if operator in ("$in", "$nin") else [operand]
+            hit = np.zeros(size, dtype=bool)
+            if field in self._postings:
+                for v in values:
+                    hit[list(self._postings[field].get(v, ()))] = True
+            else:
+                hit = np.fromiter((m.get(field) in values for m in self._metadatas), dtype=bool, count=size)
+            if operator in ("$eq", "$in"):
+                mask &= hit
+            elif operator in ("$ne", "$nin"):
+                mask &= ~hit
+            else:
+                raise ValueError(f"Unsupported filter operator: {operator}")
+        return mask
+
+    def _indexed_rows(self, filter: Optional[Dict[str, Any]]) -> Optional[np.ndarray]:
+        """
+        Candidate rows straight from the inverted indexes when the filter allows it
+
+        Needs at least one equality condition; ``$ne``/``$nin`` conditions on
+        indexed fields are then subtracted from its rows.
+        """
+        if not filter:
+            return None
+        rows: Optional[Set[int]] = None
+        excluded: Set[int] = set()
+        for field, value in filter.items():
+            operator, operand = _condition(value)
+            if field not in self._postings:
+                return None
+            if operator == "$eq":
+                matches = self._postings[field].get(operand, set())
+                rows = set(matches) if rows is None else rows & matches
+            elif operator in ("$ne", "$nin"):
+                for v in operand if operator == "$nin" else [operand]:
+                    excluded |= self._postings[field].get(v, set())
+            else:
+                return None
+        if rows is None:
+            return None
+        rows -= excluded
+        return np.fromiter(sorted(rows), dtype=np.int64, count=len(rows))
+
+    def _probe(self, query: np.ndarray) -> np.ndarray:
+        nprobe = min(self.nprobe, len(self._centroids))
+        nearest = np.argpartition(-(self._centroids @ query), nprobe - 1)[:nprobe]
+        return np.concatenate([self._lists[i] for i in nearest])
+
+    def _search(self, query: np.ndarray, k: int, filter: Optional[Dict[str, Any]]) -> List[Tuple[int, float]]:
+        with self._lock:
+            if not self._size:
+                return []
+            rows = self._indexed_rows(filter)
+            if rows is not None:
+                rows = rows[self._alive[rows]]
+            elif self._centroids is not None:
+                rows = self._probe(query)
+                if filter:
+                    rows = rows[self._filter_mask(filter)[rows]]
+            elif filter:
+                rows = np.flatnonzero(self._filter_mask(filter))
+            if rows is None:
+                scores = self._vectors[:self._size] @ query
+                scores[~self._alive[:self._size]] = -np.inf
+                candidates = np.arange(self._size)
+            else:
+                if not len(rows):
+                    return []
+                scores = self._vectors[rows] @ query
+                candidates = rows
+            k = min(k, len(scores))
+            top = np.argpartition(-scores, k - 1)[:k]
+            top = top[np.argsort(-scores[top])]
+            return [(int(candidates[i]), float(scores[i])) for i in top if np.isfinite(scores[i])]
+
+    def get_vectors(self, ids: Optional[Sequence[str]] = None,
+                    filter: Optional[Dict[str, Any]] = None) -> Tuple[List[str], np.ndarray]:
+        """
+        Stored (normalized) vectors by id or by metadata filter
+
+        Returns:
+            Ids of the entries found and their vectors, one row each
+        """
+        with self._lock:
+            if ids is not None:
+                rows = np.asarray([self._positions[id_] for id_ in ids if id_ in self._positions], dtype=np.int64)
+            else:
+                rows = self._indexed_rows(filter)
+                if rows is None:
+                    rows = np.flatnonzero(self._filter_mask(filter))
+            rows = rows[self._alive[rows]] if len(rows) else rows
+            if not len(rows):
+                return [], np.zeros((0, self._vectors.shape[1] if self._vectors is not None else 0), np.float32)
+            return [self._ids[row] for row in rows], np.asarray(self._vectors[rows])
+
+    def _document(self, row: int) -> Document:
+        return Document(page_content=self._texts[row], metadata=self._metadatas[row])
+
+    def similarity_search_by_vector_with_score(self, embedding: Sequence[float], k: int = 4,
+                                               filter: Optional[Dict[str, Any]] = None) -> List[Tuple[Document, float]]:
+        query = _normalize(np.asarray(embedding, dtype=np.float32))
+        return [(self._document(row), score) for row, score in self._search(query, k, filter)]
+
+    def similarity_search_with_score(self, query: str, k: int = 4,
+                                     filter: Optional[Dict[str, Any]] = None, **kwargs: Any) -> List[Tuple[Document, float]]:
+        return self.similarity_search_by_vector_with_score(self.embedding.embed_query(query), k, filter)
+
+    def similarity_search(self, query: str, k: int = 4,
+                          filter: Optional[Dict[str, Any]] = None, **kwargs: Any) -> List[Document]:
+        return [document for document, _ in self.similarity_search_with_score(query, k, filter)]
+
+    # Persistence
+
+    def save(self, path: Optional[str] = None) -> None:
+        """
+        Write the index to ``path`` (default: the store's path); vectors are memory-mapped on load
+
+        The index is copied under the lock and written outside it, so searches
+        and writes are not blocked while the files are written.
+        """
+        path = path or self.path
+        if not path:
+            raise ValueError("No path to save the vector store to")
+        with self._save_lock:
+            with self._lock:
+                rows = np.flatnonzero(self._alive[:self._size])
+                vectors = self._vectors[rows] if self._vectors is not None else np.zeros((0, 0), np.float32)
+                entries = [(self._ids[row], self._texts[row], self._metadatas[row]) for row in rows]
+                centroids = self._centroids
+                assignments = self._assignments[rows] if centroids is not None else None
+                version = self._version
+            generation = f"{GENERATION_PREFIX}{time.time_ns()}"
+            directory = os.path.join(path, generation)
+            os.makedirs(directory)
+            try:
+                np.save(os.path.join(directory, VECTORS_FILE), vectors)
+                with open(os.path.join(directory, DOCUMENTS_FILE), "w") as f:
+                    for id_, text, metadata in entries:
+                        f.write(json.dumps({"id": id_, "text": text, "metadata": metadata}, default=str) + "\n")
+                if centroids is not None:
+                    np.save(os.path.join(directory, CENTROIDS_FILE), centroids)
+                    np.save(os.path.join(directory, ASSIGNMENTS_FILE), assignments)
+                tmp = os.path.join(path, CURRENT_FILE + ".tmp")
+                with open(tmp, "w") as f:
+                    f.write(generation)
+                os.replace(tmp, os.path.join(path, CURRENT_FILE))
+            except BaseException:
+                shutil.rmtree(directory, ignore_errors=True)
+                raise
+            if path == self.path:
+                self._saved_version = version
+            _remove_old_generations(path, generation)
+
+    def flush(self) -> bool:
+        """Save if there are unsaved changes; returns whether it saved."""
+        if self._version == self._saved_version or not self.path:
+            return False
+        self.save()
+        return True
+
+    def _run(self) -> None:
+        while not self._stopped.wait(self.save_interval):
+            try:
+                self.flush()
+            except Exception:
+                logger.warning("Failed to save the vector store to %s", self.path, exc_info=True)
+
+    def start(self) -> "LocalVectorStore":
+        """Save periodically from a background thread and once more at exit."""
+        if self._thread is None and self.path:
+            self._thread = threading.Thread(target=self._run, name="vector-store-saver", daemon=True)
+            self._thread.start()
+            atexit.register(self.close)
+        return self
+
+    def close(self) -> None:
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self.flush()
+
+    def _load(self, directory: str) -> None:
+        self._vectors = np.load(os.path.join(directory, VECTORS_FILE), mmap_mode="r")
+        self._size = self._vectors.shape[0]
+        self._alive = np.ones(self._size, dtype=bool)
+        self._assignments = np.full(self._size, -1, dtype=np.int32)
+        with open(os.path.join(directory, DOCUMENTS_FILE)) as f:
+            for row, line in enumerate(f):
+                entry = json.loads(line)
+                self._ids.append(entry["id"])
+                self._texts.append(entry["text"])
+                self._metadatas.append(entry["metadata"])
+                self._positions[entry["id"]] = row
+                for field in INDEXED_FIELDS:
+                    value = entry["metadata"].get(field)
+                    if value is not None:
+                        self._postings[field][value].add(row)
+        if len(self._ids) != self._size:
+            raise ValueError(f"Vector index in {directory} has {self._size} vectors but {len(self._ids)} documents")
+        centroids = os.path.join(directory, CENTROIDS_FILE)
+        if os.path.exists(centroids):
+            self._centroids = np.load(centroids)
+            self._assignments = np.load(os.path.join(directory, ASSIGNMENTS_FILE))
+            if len(self._assignments) != self._size:
+                raise ValueError(f"Vector index in {directory} has {len(self._assignments)} IVF assignments "
+                                 f"for {self._size} vectors")
+            self._rebuild_lists()
+
+
+def _index_dir(path: str) -> Optional[str]:
+    """Directory of the saved generation under ``path``, or None when nothing was saved."""
+    try:
+        with open(os.path.join(path, CURRENT_FILE)) as f:
+            return os.path.join(path, f.read().strip())
+    except FileNotFoundError:
+        # Indexes saved before generations kept their files directly in ``path``
+        return path if os.path.exists(os.path.join(path, VECTORS_FILE)) else None
+
+
+def _remove_old_generations(path: str, current: str) -> None:
+    """Delete superseded generations and files of the pre-generation layout."""
+    for name in os.listdir(path):
+        target = os.path.join(path, name)
+        if name.startswith(GENERATION_PREFIX) and name != current:
+            shutil.rmtree(target, ignore_errors=True)
+        elif name in (VECTORS_FILE, DOCUMENTS_FILE, CENTROIDS_FILE, ASSIGNMENTS_FILE):
+            os.remove(target)
+
+
+def centroid_id(document_id: str) -> str:
+    return f"{document_id}-centroid"
+
+
+def document_centroid(vectors: Sequence[Sequence[float]]) -> List[float]:
+    """Normalized mean of a document's chunk vectors."""
+    matrix = _normalize(np.asarray(vectors, dtype=np.float32))
+    return _normalize(matrix.mean(axis=0)).tolist()
+
+
+def add_embeddings(store: Any, vectors: Sequence[Sequence[float]], texts: Sequence[str],
+                   metadatas: Sequence[Dict[str, Any]], ids: Sequence[str]) -> None:
+    """Store precomputed vectors in either backend without embedding the texts again."""
+    if isinstance(store, LocalVectorStore):
+        store.add_vectors(vectors, texts, metadatas, ids)
+        return
+    # The LangChain Pinecone wrapper only upserts texts it embeds itself
+    records = [
+        (id_, list(vector), {**metadata, store._text_key: text})
+        for id_, vector, text, metadata in zip(ids, vectors, texts, metadatas)
+    ]
+    for start in range(0, len(records), PINECONE_UPSERT_BATCH):
+        store._index.upsert(vectors=records[start:start + PINECONE_UPSERT_BATCH])
+
+
+def fetch_vectors(store: Any, ids: Sequence[str]) -> Dict[str, List[float]]:
+    """Stored vectors by id from either backend; missing ids are left out."""
+    if isinstance(store, LocalVectorStore):
+        found, vectors = store.get_vectors(ids=ids)
+        return dict(zip(found, vectors.tolist()))
+    response = store._index.fetch(ids=list(ids))
+    return {id_: list(vector["values"]) for id_, vector in response["vectors"].items()}
+
+
+def create_vector_store(embeddings: Any, provider: Optional[str] = None) -> Any:
+    """Build the vector store selected by VECTOR_DB_PROVIDER ("local" or "pinecone")."""
+    provider = provider or VECTOR_DB_CONFIG.get('provider', 'pinecone')
+    if provider == "local":
+        return LocalVectorStore(
+            embeddings,
+            path=VECTOR_DB_CONFIG.get('path'),
+            index_type=VECTOR_DB_CONFIG.get('index_type', 'flat'),
+            nlist=VECTOR_DB_CONFIG.get('nlist', 256),
+            nprobe=VECTOR_DB_CONFIG.get('nprobe', 8),
+            save_interval=VECTOR_DB_CONFIG.get('save_interval', 30.0),
+        ).start()
+    if provider == "pinecone":
+        import pinecone
+        from langchain_community.vectorstores import Pinecone
+
+        pinecone.init(
+            api_key=VECTOR_DB_CONFIG.get('api_key', ''),
+            environment=VECTOR_DB_CONFIG.get('environment', '')
+        )
+        # Create index if it doesn't exist
+        index_name = VECTOR_DB_CONFIG.get('index_name', 'estimator-ai')
+        if index_name not in pinecone.list_indexes():
+            pinecone.create_index(
+                name=index_name,
+                dimension=VECTOR_DB_CONFIG.get('dimension', 1536),  # OpenAI embeddings dimension
+                metric="cosine"
+            )
+        return Pinecone.from_existing_index(index_name=index_name, embedding=embeddings)
+    raise ValueError(f"Unknown vector store provider: {provider}")
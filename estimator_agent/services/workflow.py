@@ -0,0 +1,141 @@
+"""
+Dependency-aware execution of workflow steps.
+
+A workflow is a DAG of named steps. Each step's function receives the
+outputs of the steps it depends on. A step runs as soon as all of its
+dependencies have finished, so independent steps (such as parsing each
+document of a project) run concurrently while dependent ones wait. With a
+checkpoint store, each step's output is saved when it finishes, and a rerun
+skips every step whose inputs are unchanged.
+"""
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+from .checkpoints import CheckpointStore, input_hash
+
+
+class WorkflowError(Exception):
+    """A workflow step failed; the steps that had not started were not run."""
+
+    def __init__(self, step: str, cause: BaseException):
+        super().__init__(f"Workflow step '{step}' failed: {cause}")
+        self.step = step
+        self.cause = cause
+
+
+@dataclass
+class WorkflowStep:
+    name: str
+    run: Callable[[Dict[str, Any]], Any]
+    depends_on: List[str] = field(default_factory=list)
+    # The step's own input (beyond dependency outputs), part of its checkpoint hash
+    key: Any = None
+
+
+class WorkflowExecutor:
+    """
+    Run a DAG of steps on a thread pool.
+
+    Example:
+        executor = WorkflowExecutor(max_workers=4)
+        executor.add("parse:a", lambda deps: parse(a))
+        executor.add("parse:b", lambda deps: parse(b))
+        executor.add("requirements", lambda deps: analyze(deps), depends_on=["parse:a", "parse:b"])
+        outputs = executor.run()
+    """
+
+    def __init__(self, max_workers: int = 4,
+                 checkpoints: Optional[CheckpointStore] = None,
+                 workflow_id: Optional[str] = None):
+        if checkpoints is not None and not workflow_id:
+            raise ValueError("Checkpointed workflows need a workflow_id")
+        self.max_workers = max_workers
+        self.checkpoints = checkpoints
+        self.workflow_id = workflow_id
+        self.steps: Dict[str, WorkflowStep] = {}
+        # Filled by run(): step names in completion order, steps restored from
+        # checkpoints instead of run, and seconds per step
+        self.completed: List[str] = []
+        self.resumed: List[str] = []
+        self.timings: Dict[str, float] = {}
+
+    def add(self, name: str, run: Callable[[Dict[str, Any]], Any],
+            depends_on: Sequence[str] = (), key: Any = None) -> "WorkflowExecutor":
+        if name in self.steps:
+            raise ValueError(f"Duplicate workflow step: {name}")
+        self.steps[name] = WorkflowStep(name, run, list(depends_on), key)
+        return self
+
+    def _check(self) -> None:
+        for step in self.steps.values():
+            for dependency in step.depends_on:
+                if dependency not in self.steps:
+                    raise ValueError(f"Step '{step.name}' depends on unknown step '{dependency}'")
+        # Kahn's algorithm; anything left unvisited is on a cycle
+        remaining = {name: len(step.depends_on) for name, step in self.steps.items()}
+        ready = [name for name, count in remaining.items() if count == 0]
+        visited = 0
+        while ready:
+            name = ready.pop()
+            visited += 1
+            for step in self.steps.values():
+                if name in step.depends_on:
+                    remaining[step.name] -= 1
+                    if remaining[step.name] == 0:
+                        ready.append(step.name)
+        if visited != len(self.steps):
+            raise ValueError("Workflow steps contain a dependency cycle")
+
+    def _execute(self, step: WorkflowStep, inputs: Dict[str, Any]) -> Any:
+        start = time.perf_counter()
+        try:
+            if self.checkpoints is None:
+                return step.run(inputs)
+            digest = input_hash({"key": step.key, "inputs": inputs})
+            record = self.checkpoints.get(self.workflow_id, step.name, digest)
+            if record is not None:
+                self.resumed.append(step.name)
+                return record["output"]
+            output = step.run(inputs)
+            self.checkpoints.put(self.workflow_id, step.name, digest, output)
+            return output
+        finally:
+            self.timings[step.name] = time.perf_counter() - start
+
+    def run(self, outputs: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """
+        Execute every step whose output is not already known
+
+        Args:
+            outputs: Outputs of steps that should not be run again
+
+        Returns:
+            Output of every step by name
+
+        Raises:
+            WorkflowError: When a step raises; running steps finish, pending ones are skipped
+        """
+        self._check()
+        outputs = dict(outputs or {})
+        pending = {name: step for name, step in self.steps.items() if name not in outputs}
+        running: Dict[Future, str] = {}
+        with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="workflow") as pool:
+            while pending or running:
+                for name, step in list(pending.items()):
+                    if all(dependency in outputs for dependency in step.depends_on):
+                        inputs = {dependency: outputs[dependency] for dependency in step.depends_on}
+                        running[pool.submit(self._execute, step, inputs)] = name
+                        del pending[name]
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    name = running.pop(future)
+                    error = future.exception()
+                    if error is not None:
+                        for other in running:
+                            other.cancel()
+                        raise WorkflowError(name, error) from error
+                    outputs[name] = future.result()
+                    self.completed.append(name)
+        return outputs
@@ -0,0 +1,18 @@
+import os
+
+# The application modules create their engines at import time
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+
+import pytest
+from sqlalchemy import create_engine
+
+
+@pytest.fixture
+def sqlite_engine(tmp_path):
+    """File-backed SQLite database with the application tables."""
+    from estimator_agent.database import Base
+
+    engine = create_engine(f"sqlite:///{tmp_path / 'test.db'}")
+    Base.metadata.create_all(engine)
+    yield engine
+    engine.dispose()
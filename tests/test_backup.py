@@ -0,0 +1,63 @@
+import gzip
+import json
+import os
+from datetime import datetime
+from decimal import Decimal
+
+from sqlalchemy import create_engine, insert, select
+
+from estimator_agent.backup import create_backup, read_manifest, restore_backup, verify_backup
+from estimator_agent.database import Base, Estimate, Project
+
+
+def add_project(engine, project_id, updated_at):
+    with engine.begin() as conn:
+        conn.execute(insert(Project), [{
+            "id": project_id, "project_name": "Tower", "client_name": "Acme",
+            "status": "draft", "created_at": updated_at, "updated_at": updated_at,
+        }])
+
+
+def exported_ids(path, table):
+    with gzip.open(os.path.join(path, f"{table}.ndjson.gz"), "rt") as f:
+        return {json.loads(line)["id"] for line in f if line.strip()}
+
+
+def test_backup_restores_into_an_empty_database(sqlite_engine, tmp_path):
+    add_project(sqlite_engine, "p1", datetime(2024, 1, 1, 9, 30))
+    with sqlite_engine.begin() as conn:
+        conn.execute(insert(Estimate), [{
+            "id": "e1", "project_id": "p1", "total_cost": Decimal("1234.56"), "breakdown": {"labor": 1},
+        }])
+
+    path = create_backup(bind=sqlite_engine, backup_dir=str(tmp_path / "backups"))
+    assert verify_backup(path)
+
+    target = create_engine(f"sqlite:///{tmp_path / 'restored.db'}")
+    Base.metadata.create_all(target)
+    restored = restore_backup(path, bind=target)
+    assert restored["projects"] == 1 and restored["estimates"] == 1
+    with target.connect() as conn:
+        assert conn.execute(select(Estimate.total_cost)).scalar() == Decimal("1234.56")
+        assert conn.execute(select(Project.updated_at)).scalar() == datetime(2024, 1, 1, 9, 30)
+
+
+def test_incremental_backup_uses_the_data_watermark(sqlite_engine, tmp_path):
+    backups = str(tmp_path / "backups")
+    # Timestamps far behind the UTC clock, as local time is on hosts west of UTC
+    add_project(sqlite_engine, "p1", datetime(2020, 1, 1))
+    full = create_backup(bind=sqlite_engine, backup_dir=backups)
+    assert read_manifest(full)["tables"]["projects"]["watermark"] == "2020-01-01T00:00:00"
+
+    add_project(sqlite_engine, "p2", datetime(2020, 1, 2))
+    incremental = create_backup(bind=sqlite_engine, backup_dir=backups, incremental=True)
+    assert "p2" in exported_ids(incremental, "projects")
+    assert read_manifest(incremental)["tables"]["projects"]["watermark"] == "2020-01-02T00:00:00"
+
+
+def test_tampered_backup_fails_verification(sqlite_engine, tmp_path):
+    add_project(sqlite_engine, "p1", datetime(2024, 1, 1))
+    path = create_backup(bind=sqlite_engine, backup_dir=str(tmp_path / "backups"))
+    with open(os.path.join(path, "projects.ndjson.gz"), "ab") as f:
+        f.write(b"x")
+    assert not verify_backup(path)
@@ -0,0 +1,31 @@
+import io
+import os
+
+from estimator_agent.blob_store import LocalBlobStore, content_disposition
+
+
+def test_identical_content_is_stored_once(tmp_path):
+    store = LocalBlobStore(str(tmp_path / "blobs"))
+    first = store.put(io.BytesIO(b"drawing"))
+    second = store.put_bytes(b"drawing")
+    assert first.sha256 == second.sha256
+    assert first.created and not second.created
+    assert b"".join(store.iter_chunks(first.sha256)) == b"drawing"
+
+
+def test_store_creates_no_directories_until_written(tmp_path):
+    LocalBlobStore(str(tmp_path / "blobs"))
+    assert not os.path.exists(tmp_path / "blobs")
+
+
+def test_content_disposition_escapes_filenames():
+    header = content_disposition('plan "A"\r\n.pdf')
+    assert '\r' not in header and '\n' not in header
+    assert 'filename="plan _A___.pdf"' in header
+    assert "filename*=UTF-8''plan%20%22A%22%0D%0A.pdf" in header
+
+
+def test_content_disposition_keeps_unicode_in_extended_name():
+    header = content_disposition("plan-é.pdf")
+    assert 'filename="plan-_.pdf"' in header
+    assert "filename*=UTF-8''plan-%C3%A9.pdf" in header
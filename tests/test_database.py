@@ -0,0 +1,83 @@
+import asyncio
+import base64
+
+from sqlalchemy import create_engine, insert, inspect, select, text
+from sqlalchemy.orm import Session
+
+from estimator_agent import database
+from estimator_agent.blob_store import LocalBlobStore
+from estimator_agent.database import (
+    Base,
+    File,
+    Project,
+    move_file_contents_to_blob_store,
+    shared_memory_url,
+    upgrade_schema,
+)
+
+
+def legacy_engine(tmp_path):
+    """Database with the files table as it was before the blob store."""
+    engine = create_engine(f"sqlite:///{tmp_path / 'legacy.db'}")
+    with engine.begin() as conn:
+        conn.execute(text(
+            "CREATE TABLE files (id VARCHAR PRIMARY KEY, project_id VARCHAR, filename VARCHAR NOT NULL, "
+            "content_type VARCHAR NOT NULL, content TEXT NOT NULL, created_at DATETIME)"
+        ))
+        conn.execute(text(
+            "INSERT INTO files (id, filename, content_type, content) VALUES ('f1', 'a.txt', 'text/plain', :body)"
+        ), {"body": base64.b64encode(b"legacy body").decode()})
+    return engine
+
+
+def test_upgrade_adds_file_columns_before_their_indexes(tmp_path):
+    engine = legacy_engine(tmp_path)
+    created = upgrade_schema(engine)
+    assert "ix_files_sha256" in created
+    columns = {column["name"] for column in inspect(engine).get_columns("files")}
+    assert {"sha256", "size", "storage_key"} <= columns
+    assert upgrade_schema(engine) == []
+
+
+def test_migration_moves_bodies_and_allows_new_files(tmp_path):
+    engine = legacy_engine(tmp_path)
+    upgrade_schema(engine)
+    store = LocalBlobStore(str(tmp_path / "blobs"))
+
+    assert move_file_contents_to_blob_store(store, bind=engine) == 1
+    with engine.connect() as conn:
+        sha256 = conn.execute(text("SELECT sha256 FROM files WHERE id = 'f1'")).scalar()
+    assert b"".join(store.iter_chunks(sha256)) == b"legacy body"
+
+    blob = store.put_bytes(b"new body")
+    with Session(engine) as session:
+        session.add(File(id="f2", filename="b.txt", content_type="text/plain",
+                         sha256=blob.sha256, size=blob.size, storage_key=blob.key))
+        session.commit()
+    assert move_file_contents_to_blob_store(store, bind=engine) == 0
+
+
+
+def test_in_memory_sqlite_is_shared_by_the_sync_and_async_engines():
+    # conftest sets DATABASE_URL=sqlite://, which used to give each engine its own database
+    Base.metadata.create_all(database.engine)
+    try:
+        with database.engine.begin() as conn:
+            conn.execute(insert(Project), [{"id": "p1", "project_name": "Tower", "client_name": "Acme", "status": "draft"}])
+
+        async def read():
+            async with database.async_engine.connect() as conn:
+                return (await conn.execute(select(Project.id))).scalars().all()
+
+        assert asyncio.run(read()) == ["p1"]
+    finally:
+        Base.metadata.drop_all(database.engine)
+        asyncio.run(database.async_engine.dispose())
+
+
+def test_shared_memory_url():
+    url = shared_memory_url("sqlite://")
+    assert "mode=memory" in url and "cache=shared" in url
+    assert shared_memory_url("sqlite:///:memory:") == shared_memory_url(url) == url
+    assert shared_memory_url("sqlite:///estimator.db") == "sqlite:///estimator.db"
+    assert shared_memory_url("postgresql://db/estimator") == "postgresql://db/estimator"
@@ -0,0 +1,80 @@
+import io
+
+from estimator_agent.config import DOCUMENT_LOADER_CONFIG
+from estimator_agent.services.document_loaders import S3RangeReader, load_s3_document, open_seekable
+
+
+class FakeS3:
+    """In-memory stand-in for the boto3 calls the loaders make."""
+
+    def __init__(self, objects):
+        self.objects = objects
+        self.ranges = []
+
+    def head_object(self, Bucket, Key):
+        return {"ContentLength": len(self.objects[Key])}
+
+    def get_object(self, Bucket, Key, Range=None):
+        data = self.objects[Key]
+        if Range is not None:
+            start, end = map(int, Range[len("bytes="):].split("-"))
+            self.ranges.append((start, end))
+            data = data[start:end + 1]
+        return {"Body": io.BytesIO(data)}
+
+
+class PlainS3:
+    """Client without head_object, so seekable reads fall back to a spool."""
+
+    def __init__(self, objects):
+        self.objects = objects
+
+    def get_object(self, Bucket, Key):
+        return {"Body": io.BytesIO(self.objects[Key])}
+
+
+def test_text_is_decoded_across_blocks(monkeypatch):
+    monkeypatch.setitem(DOCUMENT_LOADER_CONFIG, "block_size", 3)
+    body = "Fire alarm – zone B\n".encode("utf-8")
+    documents, size = load_s3_document(FakeS3({"spec.txt": body}), "bucket", "spec.txt", "text/plain")
+    assert size == len(body)
+    assert documents[0].page_content == "Fire alarm – zone B\n"
+    assert documents[0].metadata == {"source": "s3://bucket/spec.txt"}
+
+
+def test_csv_rows_become_documents():
+    body = b"item, qty\nsmoke detector, 12\nhorn strobe,\n"
+    documents, _ = load_s3_document(FakeS3({"bom.csv": body}), "bucket", "bom.csv", "text/csv")
+    assert [d.page_content for d in documents] == ["item: smoke detector\nqty: 12", "item: horn strobe\nqty: "]
+    assert documents[1].metadata == {"source": "s3://bucket/bom.csv", "row": 1}
+
+
+def test_csv_extra_and_missing_fields():
+    body = b"a,b\n1,2,3, 4\n5\n"
+    documents, _ = load_s3_document(FakeS3({"x.csv": body}), "bucket", "x.csv", "text/csv")
+    assert documents[0].page_content == "a: 1\nb: 2\nNone: 3,4"
+    assert documents[1].page_content == "a: 5\nb: "
+
+
+def test_range_reader_fetches_and_caches_blocks():
+    data = bytes(range(256)) * 4
+    client = FakeS3({"drawing.pdf": data})
+    reader = S3RangeReader(client, "bucket", "drawing.pdf", block_size=100, cache_blocks=2)
+    assert reader.size == len(data)
+
+    reader.seek(-10, io.SEEK_END)
+    assert reader.read(10) == data[-10:]
+    reader.seek(95)
+    assert reader.read(10) == data[95:105]
+    reader.seek(0)
+    assert reader.read(5) == data[:5]
+    assert client.ranges == [(1000, 1023), (0, 99), (100, 199)]
+    assert reader.requests == 3
+
+
+def test_open_seekable_spools_without_head_object():
+    stream, size = open_seekable(PlainS3({"a.docx": b"PK\x03\x04rest"}), "bucket", "a.docx")
+    with stream:
+        assert size == 8
+        stream.seek(4)
+        assert stream.read() == b"rest"
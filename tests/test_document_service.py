@@ -0,0 +1,37 @@
+from estimator_agent.services.document_service import merge_extracted_entities
+
+
+def test_lists_are_unioned_in_segment_order():
+    merged = merge_extracted_entities([
+        {"system_types": ["Fire Alarm", "CCTV"], "equipment": [{"type": "smoke detector", "quantity": 12}]},
+        {"system_types": ["fire  alarm", "Access Control"], "equipment": [{"quantity": 12, "type": "smoke detector"}]},
+        {"system_types": [], "equipment": [{"type": "horn strobe", "quantity": 4}]},
+    ])
+    assert merged == {
+        "system_types": ["Fire Alarm", "CCTV", "Access Control"],
+        "equipment": [{"type": "smoke detector", "quantity": 12}, {"type": "horn strobe", "quantity": 4}],
+    }
+
+
+def test_scalars_stay_scalar_unless_segments_disagree():
+    merged = merge_extracted_entities([
+        {"project_name": "Tower", "building_size": "12 floors"},
+        {"project_name": "tower", "building_size": "14 floors"},
+        {"project_name": None, "building_size": ""},
+    ])
+    assert merged == {"project_name": "Tower", "building_size": ["12 floors", "14 floors"]}
+
+
+def test_failed_segments_are_skipped():
+    merged = merge_extracted_entities([
+        {"error": "Could not parse response", "raw": "..."},
+        {"requirements": ["NFPA 72"]},
+        "not an object",
+    ])
+    assert merged == {"requirements": ["NFPA 72"]}
+
+
+def test_all_failed_returns_the_first_error():
+    failure = {"error": "Could not parse response", "raw": "..."}
+    assert merge_extracted_entities([failure, {"error": "timeout"}]) is failure
+    assert merge_extracted_entities([]) == {}
@@ -0,0 +1,88 @@
+import threading
+
+import pytest
+
+from estimator_agent.services.embedding_cache import CachedEmbeddings
+
+
+class CountingEmbeddings:
+    """Fake provider that records every batch it is asked to embed."""
+
+    def __init__(self):
+        self.batches = []
+        self._lock = threading.Lock()
+
+    def embed_documents(self, texts):
+        with self._lock:
+            self.batches.append(list(texts))
+        return [[float(len(text)), float(sum(map(ord, text)) % 97), 0.5] for text in texts]
+
+    @property
+    def texts(self):
+        return [text for batch in self.batches for text in batch]
+
+
+@pytest.fixture
+def provider():
+    return CountingEmbeddings()
+
+
+@pytest.fixture
+def cache_path(tmp_path):
+    return str(tmp_path / "embeddings.db")
+
+
+def test_cached_texts_skip_the_provider(provider, cache_path):
+    cache = CachedEmbeddings(provider, "ada", path=cache_path)
+    first = cache.embed_documents(["general conditions", "scope of work"])
+    second = cache.embed_documents(["scope of work", "general conditions", "schedule"])
+
+    assert second[:2] == [first[1], first[0]]
+    assert provider.texts == ["general conditions", "scope of work", "schedule"]
+    assert cache.embed_query("schedule") == second[2]
+    assert len(provider.batches) == 2
+
+
+def test_repeated_texts_in_one_call_are_embedded_once(provider, cache_path):
+    cache = CachedEmbeddings(provider, "ada", path=cache_path)
+    vectors = cache.embed_documents(["NFPA 13", "NFPA 13", "division 01", "NFPA 13"])
+
+    assert provider.texts == ["NFPA 13", "division 01"]
+    assert vectors[0] == vectors[1] == vectors[3]
+
+
+def test_whitespace_differences_share_an_entry(provider, cache_path):
+    cache = CachedEmbeddings(provider, "ada", path=cache_path)
+    cache.embed_documents(["general  conditions\n"])
+    cache.embed_documents(["  general conditions", "general\tconditions"])
+
+    assert provider.texts == ["general  conditions\n"]
+
+
+def test_misses_are_sent_in_batches(provider, cache_path):
+    cache = CachedEmbeddings(provider, "ada", path=cache_path, batch_size=3, max_concurrency=2)
+    texts = [f"chunk {i}" for i in range(8)]
+    vectors = cache.embed_documents(texts)
+
+    assert sorted(len(batch) for batch in provider.batches) == [2, 3, 3]
+    assert sorted(provider.texts) == sorted(texts)
+    assert vectors == provider.embed_documents(texts)
+
+
+def test_vectors_survive_reopening_the_cache(provider, cache_path):
+    cache = CachedEmbeddings(provider, "ada", path=cache_path)
+    vectors = cache.embed_documents(["scope of work", "schedule"])
+    cache.close()
+
+    reopened = CachedEmbeddings(provider, "ada", path=cache_path)
+    assert reopened.embed_documents(["scope of work", "schedule"]) == vectors
+    assert len(provider.batches) == 1
+
+
+def test_namespaces_do_not_share_entries(provider, cache_path):
+    ada = CachedEmbeddings(provider, "text-embedding-ada-002", path=cache_path)
+    small = CachedEmbeddings(provider, "text-embedding-3-small", path=cache_path)
+    ada.embed_documents(["scope of work"])
+    small.embed_documents(["scope of work"])
+
+    assert provider.texts == ["scope of work", "scope of work"]
@@ -0,0 +1,67 @@
+from datetime import datetime, timedelta
+
+from sqlalchemy import create_engine, func, select
+
+from estimator_agent.database import Message, Project, ProjectHistory
+from estimator_agent.events import EventWriter
+
+
+def count(engine, model):
+    with engine.connect() as conn:
+        return conn.execute(select(func.count()).select_from(model)).scalar()
+
+
+def test_flush_writes_events_and_latest_status(sqlite_engine):
+    writer = EventWriter(bind=sqlite_engine, batch_size=100)
+    start = datetime(2024, 1, 1)
+    writer.project_created("p1", "Tower", "Acme", timestamp=start)
+    writer.status_changed("p1", "in_review", timestamp=start + timedelta(minutes=1))
+    writer.status_changed("p1", "approved", timestamp=start + timedelta(minutes=2))
+    writer.message_added("p1", "client", "Hello")
+
+    assert writer.flush() == 4
+    assert count(sqlite_engine, ProjectHistory) == 2
+    assert count(sqlite_engine, Message) == 1
+    with sqlite_engine.connect() as conn:
+        assert conn.execute(select(Project.status)).scalar() == "approved"
+
+
+def test_recording_an_event_does_not_write(sqlite_engine):
+    writer = EventWriter(bind=sqlite_engine, batch_size=1)
+    writer.project_created("p1", "Tower", "Acme")
+    assert count(sqlite_engine, Project) == 0
+    assert writer.flush() == 1
+
+
+def test_bad_row_is_dead_lettered_and_the_rest_written(sqlite_engine, caplog):
+    writer = EventWriter(bind=sqlite_engine, batch_size=100)
+    writer.project_created("p1", "Tower", "Acme")
+    writer.message_added("p1", "client", None)  # content is NOT NULL
+    writer.message_added("p1", "client", "Hello")
+
+    assert writer.flush() == 2
+    assert writer.dead_lettered == 1
+    assert count(sqlite_engine, Message) == 1
+    assert any(r.name == "estimator_agent.events.dead_letter" for r in caplog.records)
+
+    # The bad row is gone, so later batches go through in one transaction
+    writer.message_added("p1", "client", "Again")
+    assert writer.flush() == 1
+    assert writer.flush() == 0
+
+
+def test_unavailable_database_keeps_events_up_to_the_cap(tmp_path):
+    offline = create_engine(f"sqlite:///{tmp_path / 'missing' / 'test.db'}")
+    writer = EventWriter(bind=offline, batch_size=100, max_buffer=3)
+    for i in range(3):
+        writer.message_added("p1", "client", f"m{i}")
+    try:
+        writer.flush()
+    except Exception:
+        pass
+    assert writer._pending() == 3
+    assert writer.dead_lettered == 0
+
+    writer.message_added("p1", "client", "overflow")
+    assert writer._pending() == 3
+    assert writer.dead_lettered == 1
@@ -0,0 +1,121 @@
+import asyncio
+
+import pytest
+from starlette.requests import ClientDisconnect
+
+from estimator_agent.idempotency import (
+    IdempotencyConflict,
+    IdempotentRequest,
+    InMemoryIdempotencyStore,
+)
+from estimator_agent.responses import ClosingStreamingResponse
+
+
+@pytest.fixture
+def store():
+    return InMemoryIdempotencyStore(max_entries=100, ttl_seconds=60, lock_seconds=60)
+
+
+def test_completed_request_is_replayed(store):
+    first = IdempotentRequest(store, "key-1", "proposal:p1", {"a": 1})
+    assert first.replay() is None
+    first.complete({"id": "proposal-1"})
+
+    retry = IdempotentRequest(store, "key-1", "proposal:p1", {"a": 1})
+    assert retry.replay() == {"id": "proposal-1"}
+
+
+def test_request_in_progress_conflicts(store):
+    IdempotentRequest(store, "key-1", "proposal:p1").replay()
+    with pytest.raises(IdempotencyConflict):
+        IdempotentRequest(store, "key-1", "proposal:p1").replay()
+
+
+def test_abort_releases_the_key_for_a_retry(store):
+    first = IdempotentRequest(store, "key-1", "negotiate:p1", {"content": "hi"})
+    first.replay()
+    first.abort()
+
+    retry = IdempotentRequest(store, "key-1", "negotiate:p1", {"content": "hi"})
+    assert retry.replay() is None
+
+
+def test_different_body_conflicts(store):
+    first = IdempotentRequest(store, "key-1", "negotiate:p1", {"content": "hi"})
+    first.replay()
+    first.complete({"status": "ok"})
+    with pytest.raises(IdempotencyConflict):
+        IdempotentRequest(store, "key-1", "negotiate:p1", {"content": "other"}).replay()
+
+
+def test_keys_are_scoped_per_endpoint(store):
+    IdempotentRequest(store, "key-1", "proposal:p1").replay()
+    assert IdempotentRequest(store, "key-1", "negotiate:p1").replay() is None
+
+
+def test_without_a_key_nothing_is_stored(store):
+    request = IdempotentRequest(store, None, "proposal:p1")
+    assert request.replay() is None
+    request.complete({"id": "x"})
+    assert IdempotentRequest(store, None, "proposal:p1").replay() is None
+
+
+def test_store_is_bounded():
+    store = InMemoryIdempotencyStore(max_entries=2, ttl_seconds=60, lock_seconds=60)
+    for key in ("a", "b", "c"):
+        IdempotentRequest(store, key, "s").replay()
+    assert IdempotentRequest(store, "a", "s").replay() is None
+
+
+def test_abort_after_complete_keeps_the_stored_response(store):
+    first = IdempotentRequest(store, "key-1", "proposal:p1")
+    first.replay()
+    first.complete({"id": "proposal-1"})
+    first.abort()
+
+    assert IdempotentRequest(store, "key-1", "proposal:p1").replay() == {"id": "proposal-1"}
+
+
+def test_abort_after_a_side_effect_keeps_the_key(store):
+    first = IdempotentRequest(store, "key-1", "negotiate:p1")
+    first.replay()
+    first.side_effect()
+    first.abort()
+
+    with pytest.raises(IdempotencyConflict):
+        IdempotentRequest(store, "key-1", "negotiate:p1").replay()
+
+
+def test_second_abort_does_not_release_a_retry(store):
+    first = IdempotentRequest(store, "key-1", "negotiate:p1")
+    first.replay()
+    first.abort()
+    IdempotentRequest(store, "key-1", "negotiate:p1").replay()
+
+    first.abort()
+    with pytest.raises(IdempotencyConflict):
+        IdempotentRequest(store, "key-1", "negotiate:p1").replay()
+
+
+def test_stream_releases_the_key_when_the_client_leaves_before_the_first_chunk(store):
+    request = IdempotentRequest(store, "key-1", "proposal:p1")
+    request.replay()
+    advanced = []
+
+    def body():
+        advanced.append(True)
+        yield "data: token\n\n"
+
+    async def receive():
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        raise OSError("connection reset")
+
+    response = ClosingStreamingResponse(body(), on_close=request.abort, media_type="text/event-stream")
+    scope = {"type": "http", "asgi": {"spec_version": "2.4"}}
+    with pytest.raises(ClientDisconnect):
+        asyncio.run(response(scope, receive, send))
+
+    assert advanced == []
+    assert IdempotentRequest(store, "key-1", "proposal:p1").replay() is None
@@ -0,0 +1,127 @@
+import os
+import threading
+
+import pytest
+
+from estimator_agent.services.lexical_index import LexicalIndex, fuse_results, tokenize
+
+
+def chunks(prefix, texts, document_id="d1"):
+    return {
+        "texts": texts,
+        "ids": [f"{prefix}-{i}" for i in range(len(texts))],
+        "metadatas": [{"document_id": document_id} for _ in texts],
+    }
+
+
+def test_tokenize_keeps_identifiers_and_their_parts():
+    assert tokenize("Provide FX-2000 per NFPA 72, section 2.1.3 in room B/101.") == [
+        "provide", "fx-2000", "fx", "2000", "per", "nfpa", "72", "section",
+        "2.1.3", "2", "1", "3", "in", "room", "b/101", "b", "101",
+    ]
+
+
+def test_fuse_results_combines_normalized_scores():
+    vector = [
+        {"content": "a", "metadata": {"document_id": "d1"}, "score": 0.9},
+        {"content": "b", "metadata": {"document_id": "d1"}, "score": 0.5},
+    ]
+    lexical = [
+        {"content": "b", "metadata": {"document_id": "d1"}, "score": 12.0},
+        {"content": "c", "metadata": {"document_id": "d2"}, "score": 3.0},
+    ]
+    fused = fuse_results(vector, lexical, alpha=0.25, limit=3)
+    assert [hit["content"] for hit in fused] == ["b", "a", "c"]
+    assert fused[0]["score"] == pytest.approx(0.75)
+    assert (fused[0]["vector_score"], fused[0]["lexical_score"]) == (0.5, 12.0)
+    assert fused[2]["vector_score"] is None
+    assert len(fuse_results(vector, lexical, alpha=0.5, limit=1)) == 1
+
+
+def test_search_ranks_exact_identifiers(tmp_path):
+    index = LexicalIndex(path=str(tmp_path))
+    index.add_texts(**chunks("c", [
+        "Fire alarm control panel FX-2000 per NFPA 72",
+        "Horn strobes in every corridor",
+        "Fire alarm panels are addressable",
+    ]), project_id="p1")
+    hits = index.search("FX-2000", project_id="p1", k=2)
+    assert [hit["content"] for hit in hits] == ["Fire alarm control panel FX-2000 per NFPA 72"]
+    assert index.search("fire alarm", project_id="p2") == []
+
+
+def test_additions_are_appended_to_a_log(tmp_path):
+    index = LexicalIndex(path=str(tmp_path))
+    index.add_texts(**chunks("a", ["smoke detector"] * 4), project_id="p1")
+    assert sorted(os.listdir(tmp_path)) == ["p1.pkl"]
+
+    snapshot = os.path.getmtime(tmp_path / "p1.pkl"), os.path.getsize(tmp_path / "p1.pkl")
+    index.add_texts(**chunks("b", ["heat detector"] * 2, "d2"), project_id="p1")
+    index.add_texts(**chunks("c", ["pull station"] * 2, "d3"), project_id="p1")
+    assert (os.path.getmtime(tmp_path / "p1.pkl"), os.path.getsize(tmp_path / "p1.pkl")) == snapshot
+    assert os.path.exists(tmp_path / "p1.log")
+
+    reopened = LexicalIndex(path=str(tmp_path))
+    assert len(reopened.search("detector", project_id="p1", k=10)) == 6
+
+    # The log now holds as many chunks as the snapshot, so the next add compacts
+    index.add_texts(**chunks("d", ["strobe"], "d4"), project_id="p1")
+    assert sorted(os.listdir(tmp_path)) == ["p1.pkl"]
+    assert len(LexicalIndex(path=str(tmp_path)).search("station strobe", project_id="p1", k=10)) == 3
+
+
+def test_torn_log_record_is_dropped(tmp_path):
+    index = LexicalIndex(path=str(tmp_path))
+    index.add_texts(**chunks("a", ["smoke detector"] * 4), project_id="p1")
+    index.add_texts(**chunks("b", ["heat detector"], "d2"), project_id="p1")
+    with open(tmp_path / "p1.log", "ab") as f:
+        f.write(b"\x80\x05\x95 torn")
+
+    reopened = LexicalIndex(path=str(tmp_path))
+    assert len(reopened.search("detector", project_id="p1", k=10)) == 5
+    assert not os.path.exists(tmp_path / "p1.log")
+
+
+def test_replacing_and_deleting_chunks(tmp_path):
+    index = LexicalIndex(path=str(tmp_path))
+    index.add_texts(**chunks("a", ["smoke detector", "heat detector"]), project_id="p1")
+    index.add_texts(texts=["beam detector"], metadatas=[{"document_id": "d1"}], ids=["a-0"], project_id="p1")
+    assert {hit["content"] for hit in index.search("detector", project_id="p1")} == {"heat detector", "beam detector"}
+    assert index.delete_document("d1", project_id="p1") == 2
+    assert LexicalIndex(path=str(tmp_path)).search("detector", project_id="p1") == []
+
+
+def test_cross_project_search_uses_corpus_wide_idf(tmp_path):
+    index = LexicalIndex(path=str(tmp_path))
+    # "cctv" is rare in p1 but in every chunk of p2; per-shard IDF ranked p2's hit lowest
+    index.add_texts(**chunks("a", ["cctv camera"] + ["fire alarm"] * 9), project_id="p1")
+    index.add_texts(**chunks("b", ["cctv camera", "cctv camera"]), project_id="p2")
+    scores = [hit["score"] for hit in index.search("cctv camera", k=3)]
+    assert len(scores) == 3
+    assert min(scores) == pytest.approx(max(scores))
+
+
+def test_search_while_chunks_are_added():
+    index = LexicalIndex(path="")
+    index.add_texts(**chunks("seed", ["smoke detector"]), project_id="p1")
+    errors = []
+    done = threading.Event()
+
+    def search():
+        try:
+            while not done.is_set():
+                index.search("smoke detector zone", project_id="p1")
+        except Exception as e:
+            errors.append(e)
+
+    searchers = [threading.Thread(target=search) for _ in range(4)]
+    for thread in searchers:
+        thread.start()
+    for i in range(300):
+        index.add_texts(**chunks(f"c{i}", [f"smoke detector zone {i}", "heat detector"]), project_id="p1")
+    done.set()
+    for thread in searchers:
+        thread.join()
+
+    assert errors == []
+    assert len(index.search("zone", project_id="p1", k=1000)) == 300
@@ -0,0 +1,186 @@
+import json
+import random
+import threading
+
+import httpx
+import pytest
+
+from estimator_agent.services import llm_provider
+from estimator_agent.services.llm_provider import (
+    FakeProvider,
+    OpenAIProvider,
+    ReplayProvider,
+    latency_sampler,
+    messages_key,
+    synthetic_response,
+)
+
+
+def test_latency_sampler_parses_specs():
+    rng = random.Random(0)
+    assert latency_sampler("none")(rng) == 0.0
+    assert latency_sampler("fixed:250")(rng) == 0.25
+    assert 0.1 <= latency_sampler("uniform:100:200")(rng) <= 0.2
+    assert latency_sampler("Normal:-500:1")(rng) == 0.0  # Negative draws are clamped
+    assert latency_sampler("lognormal:100:0")(rng) == pytest.approx(0.1)
+
+
+@pytest.mark.parametrize("spec", ["gamma:1:2", "fixed", "uniform:100", "fixed:fast", "none:5"])
+def test_latency_sampler_rejects_bad_specs(spec):
+    with pytest.raises(ValueError):
+        latency_sampler(spec)
+
+
+def test_synthetic_response_fills_a_typed_schema():
+    prompt = """Extract the requirements. Return JSON:
+    {"title": string, "features": list of strings, "hours": number or null, "urgent": boolean}"""
+    response = json.loads(synthetic_response(prompt, random.Random(0)))
+
+    assert set(response) == {"title", "features", "hours", "urgent"}
+    assert isinstance(response["title"], str)
+    assert isinstance(response["features"], list) and all(isinstance(f, str) for f in response["features"])
+    assert isinstance(response["hours"], int)
+    assert isinstance(response["urgent"], bool)
+
+
+def test_synthetic_response_uses_named_keys():
+    prompt = "Respond with a JSON object with these keys: risks, assumptions"
+    response = json.loads(synthetic_response(prompt, random.Random(0)))
+
+    assert set(response) == {"risks", "assumptions"}
+    assert all(isinstance(value, list) for value in response.values())
+
+
+def test_synthetic_response_picks_bullets_for_a_json_array():
+    prompt = "Which of these apply? Answer with a JSON array.\n- Login page\n- Payments\n- Admin dashboard"
+    response = json.loads(synthetic_response(prompt, random.Random(0)))
+
+    assert response
+    assert set(response) <= {"Login page", "Payments", "Admin dashboard"}
+
+
+def test_synthetic_response_is_deterministic():
+    prompt = "Describe the project scope for the mobile banking application"
+    assert synthetic_response(prompt, random.Random(3)) == synthetic_response(prompt, random.Random(3))
+
+
+def _messages(text):
+    return [{"role": "user", "content": text}]
+
+
+def _record(path, text, response, latency=0.0):
+    entry = {"key": messages_key(_messages(text)), "response": response,
+             "usage": {"total_tokens": 3}, "latency": latency}
+    with open(path, "a") as f:
+        f.write(json.dumps(entry) + "\n")
+
+
+def test_replay_serves_recorded_responses(tmp_path):
+    path = str(tmp_path / "replay.jsonl")
+    _record(path, "hello", "recorded answer")
+    provider = ReplayProvider(path)
+
+    response = provider.complete(_messages("hello"))
+    assert response.text == "recorded answer"
+    assert response.usage == {"total_tokens": 3}
+    assert (provider.hits, provider.misses) == (1, 0)
+
+
+def test_strict_replay_miss_raises(tmp_path):
+    provider = ReplayProvider(str(tmp_path / "replay.jsonl"))
+    with pytest.raises(KeyError):
+        provider.complete(_messages("not recorded"))
+    assert provider.misses == 1
+
+
+def test_replay_records_fallback_answers(tmp_path):
+    path = str(tmp_path / "replay.jsonl")
+    _record(path, "hello", "recorded answer")
+    fallback = FakeProvider()
+    recorder = ReplayProvider(path, fallback=fallback, record=True)
+
+    answer = recorder.complete(_messages("new question")).text
+    assert fallback.calls == 1
+    with open(path) as f:
+        assert len(f.readlines()) == 2
+
+    strict = ReplayProvider(path)
+    assert strict.complete(_messages("new question")).text == answer
+    assert strict.complete(_messages("hello")).text == "recorded answer"
+
+
+def test_replay_sleeps_for_the_recorded_latency(tmp_path, monkeypatch):
+    path = str(tmp_path / "replay.jsonl")
+    _record(path, "hello", "answer", latency=0.4)
+    sleeps = []
+    monkeypatch.setattr(llm_provider.time, "sleep", sleeps.append)
+
+    ReplayProvider(path).complete(_messages("hello"))
+    ReplayProvider(path, latency="fixed:50").complete(_messages("hello"))
+    assert sleeps == [0.4, 0.05]
+
+
+def test_fake_provider_is_deterministic_under_concurrency():
+    prompts = [f"Estimate the cost of feature {i % 5}" for i in range(40)]
+
+    def run():
+        provider = FakeProvider(latency="uniform:0:2", seed=7)
+        results = {}
+
+        def call(i):
+            results[i] = (prompts[i], provider.complete(_messages(prompts[i])).text)
+
+        threads = [threading.Thread(target=call, args=(i,)) for i in range(len(prompts))]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        # Answers to the n-th repeat of a prompt do not depend on thread order
+        answers = {}
+        for prompt, text in results.values():
+            answers.setdefault(prompt, []).append(text)
+        return {prompt: sorted(texts) for prompt, texts in answers.items()}, provider.latency_seconds
+
+    first, second = run(), run()
+    assert first[0] == second[0]
+    assert first[1] == pytest.approx(second[1])
+
+
+def test_fake_embeddings_are_unit_vectors_per_text():
+    provider = FakeProvider(dimension=8)
+    a, b, again = provider.embed(["alpha", "beta", "alpha"])
+    assert a == again and a != b
+    assert sum(x * x for x in a) == pytest.approx(1.0, abs=1e-5)
+
+
+def test_openai_provider_uses_the_shared_http_client(monkeypatch):
+    requests = []
+
+    def handler(request):
+        requests.append(request)
+        if request.url.path.endswith("/embeddings"):
+            return httpx.Response(200, json={
+                "object": "list", "model": "text-embedding-ada-002",
+                "data": [{"object": "embedding", "index": 1, "embedding": [0.0, 1.0]},
+                         {"object": "embedding", "index": 0, "embedding": [1.0, 0.0]}],
+                "usage": {"prompt_tokens": 2, "total_tokens": 2},
+            })
+        return httpx.Response(200, json={
+            "id": "chatcmpl-1", "object": "chat.completion", "created": 0, "model": "gpt-4o",
+            "choices": [{"index": 0, "finish_reason": "stop",
+                         "message": {"role": "assistant", "content": "An estimate"}}],
+            "usage": {"prompt_tokens": 5, "completion_tokens": 2, "total_tokens": 7},
+        })
+
+    client = httpx.Client(transport=httpx.MockTransport(handler))
+    monkeypatch.setattr(llm_provider, "shared_http_client", lambda: client)
+    provider = OpenAIProvider(api_key="sk-test")
+
+    response = provider.complete(_messages("hello"), model="gpt-4o", temperature=0)
+    assert response.text == "An estimate"
+    assert response.usage == {"prompt_tokens": 5, "completion_tokens": 2, "total_tokens": 7}
+    assert provider.embed(["a", "b"]) == [[1.0, 0.0], [0.0, 1.0]]
+
+    body = json.loads(requests[0].content)
+    assert body["model"] == "gpt-4o" and body["temperature"] == 0 and "max_tokens" not in body
+    assert requests[0].headers["Authorization"] == "Bearer sk-test"
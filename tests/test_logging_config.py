@@ -0,0 +1,29 @@
+import logging
+import queue
+
+from estimator_agent.logging_config import LOG_FORMAT, DeferredFormatQueueHandler
+
+
+def test_records_are_rendered_before_enqueueing():
+    log_queue = queue.SimpleQueue()
+    logger = logging.getLogger("tests.logging_config")
+    logger.propagate = False
+    logger.addHandler(DeferredFormatQueueHandler(log_queue))
+    try:
+        payload = {"status": "draft"}
+        logger.warning("project %s", payload)
+        payload["status"] = "finalized"
+        try:
+            raise ValueError("bad estimate")
+        except ValueError:
+            logger.exception("failed")
+    finally:
+        logger.handlers.clear()
+        logger.propagate = True
+
+    first, second = log_queue.get_nowait(), log_queue.get_nowait()
+    assert (first.msg, first.args) == ("project {'status': 'draft'}", None)
+    assert second.exc_info is None
+    line = logging.Formatter(LOG_FORMAT).format(second)
+    assert line.endswith("ValueError: bad estimate")
+    assert "tests.logging_config: failed\nTraceback" in line
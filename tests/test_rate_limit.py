@@ -0,0 +1,66 @@
+from starlette.requests import Request
+
+from estimator_agent import rate_limit
+from estimator_agent.rate_limit import BatchedStorage, rate_limit_key
+
+
+def make_request(api_key=None, client="10.0.0.7"):
+    headers = [(b"x-api-key", api_key.encode())] if api_key else []
+    return Request({"type": "http", "headers": headers, "client": (client, 1234)})
+
+
+def test_only_valid_api_keys_get_their_own_bucket(monkeypatch):
+    monkeypatch.setenv("API_KEY", "server-key")
+    monkeypatch.setitem(rate_limit.API_KEY_LIMITS, rate_limit._api_key_id("partner-key"), "100/minute")
+
+    assert rate_limit_key(make_request("server-key")) == rate_limit._api_key_id("server-key")
+    assert rate_limit_key(make_request("partner-key")) == rate_limit._api_key_id("partner-key")
+    assert rate_limit_key(make_request("made-up-key")) == "10.0.0.7"
+    assert rate_limit_key(make_request()) == "10.0.0.7"
+
+
+def test_batched_storage_flushes_pending_hits():
+    storage = BatchedStorage("batched+memory://")
+    storage.batch_size = 10
+    storage.sync_interval = 3600
+    for _ in range(3):
+        storage.incr("hits", 60)
+    assert storage.get("hits") == 3
+    assert storage._shared.get("hits") == 0
+
+    storage.flush()
+    assert storage._shared.get("hits") == 3
+
+
+def test_pending_hits_survive_the_end_of_their_window(monkeypatch):
+    clock = [1000.0]
+    monkeypatch.setattr(rate_limit.time, "time", lambda: clock[0])
+    storage = BatchedStorage("batched+memory://")
+    storage.batch_size = 10
+    storage.sync_interval = 3600
+
+    for _ in range(3):
+        storage.incr("hits", 60)
+    clock[0] += 61
+    assert storage.incr("hits", 60) == 4
+    storage.flush()
+    assert storage._shared.get("hits") == 4
+
+
+def test_expired_windows_are_swept(monkeypatch):
+    clock = [1000.0]
+    monkeypatch.setattr(rate_limit.time, "time", lambda: clock[0])
+    storage = BatchedStorage("batched+memory://")
+    storage.sync_interval = 1
+    for client in range(100):
+        storage.incr(f"client-{client}", 60)
+    assert len(storage._windows) == 100
+
+    clock[0] += 61
+    storage.incr("client-new", 60)
+    assert list(storage._windows) == ["client-new"]
+    assert storage._shared.get("client-7") == 1
+
+    clock[0] += 61
+    storage.flush()
+    assert storage._windows == {}
@@ -0,0 +1,107 @@
+import json
+import os
+
+import numpy as np
+import pytest
+
+from estimator_agent.services.vector_store import LocalVectorStore
+
+
+def random_vectors(rng, count, dimension=8):
+    return rng.normal(size=(count, dimension)).astype(np.float32)
+
+
+def list_members(store):
+    return [set(members.tolist()) for members in store._lists]
+
+
+def test_ivf_lists_are_updated_incrementally():
+    rng = np.random.default_rng(0)
+    store = LocalVectorStore(embedding=None, index_type="ivf", nlist=4, nprobe=4)
+    store.add_vectors(random_vectors(rng, 200), [f"t{i}" for i in range(200)], ids=[f"c{i}" for i in range(200)])
+    assert store._centroids is not None
+
+    store.add_vectors(random_vectors(rng, 30), [f"n{i}" for i in range(30)], ids=[f"n{i}" for i in range(30)])
+    store.add_vectors(random_vectors(rng, 20), ["moved"] * 20, ids=[f"c{i}" for i in range(20)])
+    store.delete(ids=[f"c{i}" for i in range(10, 40)])
+    store.add_vectors(random_vectors(rng, 5), ["back"] * 5, ids=[f"c{i}" for i in range(10, 15)])
+
+    incremental = list_members(store)
+    store._rebuild_lists()
+    assert incremental == list_members(store)
+    assert sum(len(members) for members in incremental) == len(store) == 205
+
+    document, score = store.similarity_search_by_vector_with_score(store.get_vectors(ids=["n3"])[1][0], k=1)[0]
+    assert document.page_content == "n3" and score > 0.99
+
+
+def test_flush_saves_only_unsaved_changes(tmp_path):
+    rng = np.random.default_rng(1)
+    store = LocalVectorStore(embedding=None, path=str(tmp_path))
+    assert not store.flush()
+
+    store.add_vectors(random_vectors(rng, 3), ["a", "b", "c"], [{"project_id": "p1"}] * 3, ["a", "b", "c"])
+    store.delete(ids=["b"])
+    assert store.flush()
+    assert not store.flush()
+
+    reopened = LocalVectorStore(embedding=None, path=str(tmp_path))
+    assert len(reopened) == 2
+    ids, _ = reopened.get_vectors(filter={"project_id": "p1"})
+    assert ids == ["a", "c"]
+
+    reopened.add_vectors(random_vectors(rng, 1), ["d"], [{"project_id": "p1"}], ["d"])
+    reopened.close()
+    assert len(LocalVectorStore(embedding=None, path=str(tmp_path))) == 3
+
+
+def test_failed_save_keeps_the_previous_index_and_is_retried(tmp_path, monkeypatch):
+    rng = np.random.default_rng(2)
+    store = LocalVectorStore(embedding=None, path=str(tmp_path))
+    store.add_vectors(random_vectors(rng, 2), ["a", "b"], ids=["a", "b"])
+    assert store.flush()
+
+    store.add_vectors(random_vectors(rng, 1), ["c"], ids=["c"])
+    real_dumps = json.dumps
+    calls = []
+
+    def failing_dumps(*args, **kwargs):
+        calls.append(1)
+        if len(calls) == 2:  # After vectors.npy and one document line are written
+            raise OSError("disk full")
+        return real_dumps(*args, **kwargs)
+
+    monkeypatch.setattr(json, "dumps", failing_dumps)
+    with pytest.raises(OSError):
+        store.flush()
+    monkeypatch.setattr(json, "dumps", real_dumps)
+
+    assert len(LocalVectorStore(embedding=None, path=str(tmp_path))) == 2
+    assert store.flush()
+    assert len(LocalVectorStore(embedding=None, path=str(tmp_path))) == 3
+    assert len([name for name in os.listdir(tmp_path) if name.startswith("gen-")]) == 1
+
+
+def test_mismatched_files_are_rejected(tmp_path):
+    rng = np.random.default_rng(3)
+    store = LocalVectorStore(embedding=None, path=str(tmp_path))
+    store.add_vectors(random_vectors(rng, 2), ["a", "b"], ids=["a", "b"])
+    store.save()
+    with open(tmp_path / open(tmp_path / "CURRENT").read() / "documents.jsonl", "a") as f:
+        f.write(json.dumps({"id": "x", "text": "x", "metadata": {}}) + "\n")
+    with pytest.raises(ValueError, match="2 vectors but 3 documents"):
+        LocalVectorStore(embedding=None, path=str(tmp_path))
+
+
+def test_index_saved_without_generations_still_loads(tmp_path):
+    np.save(tmp_path / "vectors.npy", np.eye(2, dtype=np.float32))
+    with open(tmp_path / "documents.jsonl", "w") as f:
+        for id_ in ("a", "b"):
+            f.write(json.dumps({"id": id_, "text": id_, "metadata": {}}) + "\n")
+    store = LocalVectorStore(embedding=None, path=str(tmp_path))
+    assert len(store) == 2
+
+    store.add_vectors(np.ones((1, 2), np.float32), ["c"], ids=["c"])
+    store.save()
+    assert sorted(name for name in os.listdir(tmp_path) if not name.startswith("gen-")) == ["CURRENT"]
+    assert len(LocalVectorStore(embedding=None, path=str(tmp_path))) == 3
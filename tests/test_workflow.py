@@ -0,0 +1,172 @@
+import fnmatch
+import json
+import os
+import threading
+
+import pytest
+
+from estimator_agent.services.checkpoints import LocalCheckpointStore, RedisCheckpointStore
+from estimator_agent.services.workflow import WorkflowError, WorkflowExecutor
+
+
+def test_steps_run_after_their_dependencies():
+    both_started = threading.Barrier(2, timeout=5)
+
+    def parse(name):
+        both_started.wait()  # Deadlocks unless the parse steps run concurrently
+        return name.upper()
+
+    executor = WorkflowExecutor(max_workers=2)
+    executor.add("parse:a", lambda deps: parse("a"))
+    executor.add("parse:b", lambda deps: parse("b"))
+    executor.add("merge", lambda deps: deps["parse:a"] + deps["parse:b"], depends_on=["parse:a", "parse:b"])
+    executor.add("report", lambda deps: f"report {deps['merge']}", depends_on=["merge"])
+
+    outputs = executor.run()
+    assert outputs["report"] == "report AB"
+    assert set(executor.completed[:2]) == {"parse:a", "parse:b"}
+    assert executor.completed[2:] == ["merge", "report"]
+
+
+def test_invalid_graphs_are_rejected():
+    executor = WorkflowExecutor()
+    executor.add("a", lambda deps: 1, depends_on=["b"])
+    executor.add("b", lambda deps: 2, depends_on=["a"])
+    with pytest.raises(ValueError, match="cycle"):
+        executor.run()
+
+    executor = WorkflowExecutor().add("a", lambda deps: 1, depends_on=["missing"])
+    with pytest.raises(ValueError, match="unknown step"):
+        executor.run()
+
+
+def test_failure_skips_dependent_steps():
+    ran = []
+
+    def fail(deps):
+        raise RuntimeError("LLM timeout")
+
+    executor = WorkflowExecutor()
+    executor.add("parse", fail)
+    executor.add("estimate", lambda deps: ran.append("estimate"), depends_on=["parse"])
+
+    with pytest.raises(WorkflowError) as error:
+        executor.run()
+    assert error.value.step == "parse"
+    assert isinstance(error.value.cause, RuntimeError)
+    assert ran == []
+
+
+def test_rerun_resumes_from_checkpoints(tmp_path):
+    store = LocalCheckpointStore(str(tmp_path), ttl_seconds=60)
+    calls = []
+    fail_estimate = True
+
+    def build(document):
+        def estimate(deps):
+            calls.append("estimate")
+            if fail_estimate:
+                raise RuntimeError("rate limited")
+            return deps["parse"] * 2
+
+        executor = WorkflowExecutor(checkpoints=store, workflow_id="wf-1")
+        executor.add("parse", lambda deps: calls.append("parse") or len(document), key=document)
+        executor.add("estimate", estimate, depends_on=["parse"])
+        return executor
+
+    with pytest.raises(WorkflowError):
+        build("spec").run()
+
+    fail_estimate = False
+    executor = build("spec")
+    assert executor.run()["estimate"] == 8
+    assert executor.resumed == ["parse"]
+    assert calls == ["parse", "estimate", "estimate"]
+
+    # A changed input invalidates the step and everything after it
+    executor = build("longer spec")
+    executor.run()
+    assert executor.resumed == []
+
+
+def test_checkpointed_workflow_needs_an_id(tmp_path):
+    with pytest.raises(ValueError):
+        WorkflowExecutor(checkpoints=LocalCheckpointStore(str(tmp_path), 60))
+
+
+def test_local_store_removes_expired_and_superseded_checkpoints(tmp_path):
+    store = LocalCheckpointStore(str(tmp_path), ttl_seconds=60)
+    directory = store._dir("wf-1")
+
+    store.put("wf-1", "document_parsing:0", "a" * 64, "old")
+    store.put("wf-1", "document_parsing:0", "b" * 64, "new")
+    store.put("wf-1", "document_parsing:1", "c" * 64, "other")
+    assert len(os.listdir(directory)) == 2
+    assert store.get("wf-1", "document_parsing:0", "a" * 64) is None
+    assert store.get("wf-1", "document_parsing:0", "b" * 64)["output"] == "new"
+
+    path = store._path("wf-1", "document_parsing:1", "c" * 64)
+    with open(path, "w") as f:
+        json.dump({"output": "other", "created_at": 0}, f)
+    assert store.get("wf-1", "document_parsing:1", "c" * 64) is None
+    assert not os.path.exists(path)
+
+    store.clear("wf-1")
+    assert not os.path.exists(directory)
+
+
+def test_local_store_keeps_client_workflow_ids_inside_its_root(tmp_path):
+    store = LocalCheckpointStore(str(tmp_path / "checkpoints"), ttl_seconds=60)
+    (tmp_path / ".env").write_text("SECRET=1")
+
+    store.put("..", "proposal_generation", "a" * 64, "proposal")
+    assert os.path.dirname(store._dir("..")) == str(tmp_path / "checkpoints")
+    assert store.get("..", "proposal_generation", "a" * 64)["output"] == "proposal"
+
+    store.clear("..")
+    assert (tmp_path / ".env").read_text() == "SECRET=1"
+    assert os.listdir(tmp_path / "checkpoints") == []
+
+
+def test_local_store_clear_only_removes_checkpoint_files(tmp_path):
+    store = LocalCheckpointStore(str(tmp_path), ttl_seconds=60)
+    store.put("wf-1", "cost_estimation", "a" * 64, 1)
+    stray = os.path.join(store._dir("wf-1"), "notes.txt")
+    with open(stray, "w") as f:
+        f.write("keep")
+
+    store.clear("wf-1")
+    assert os.listdir(store._dir("wf-1")) == ["notes.txt"]
+
+
+class FakeRedis:
+    def __init__(self):
+        self.values = {}
+
+    def set(self, key, value, ex=None):
+        self.values[key] = value
+
+    def get(self, key):
+        return self.values.get(key)
+
+    def scan_iter(self, match):
+        return [key for key in list(self.values) if fnmatch.fnmatchcase(key, match)]
+
+    def delete(self, *keys):
+        for key in keys:
+            self.values.pop(key, None)
+
+
+def test_redis_store_clear_does_not_match_other_workflows():
+    store = RedisCheckpointStore.__new__(RedisCheckpointStore)
+    store.client, store.ttl_seconds, store.prefix = FakeRedis(), 60, "checkpoint:"
+    store.put("wf-1", "cost_estimation", "a" * 64, 1)
+    store.put("wf-2", "cost_estimation", "a" * 64, 2)
+
+    for pattern in ("*", "wf-?", "wf-[12]"):
+        store.clear(pattern)
+    assert store.get("wf-1", "cost_estimation", "a" * 64)["output"] == 1
+
+    store.clear("wf-1")
+    assert store.get("wf-1", "cost_estimation", "a" * 64) is None
+    assert store.get("wf-2", "cost_estimation", "a" * 64)["output"] == 2